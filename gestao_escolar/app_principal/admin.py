@@ -4,10 +4,23 @@ from django.utils.html import format_html
 from django.db.models import Sum, Count
 from django.utils import timezone
 from .models import *
-from django.db.models import Sum, Avg, Count
+from .exportacao import resposta_csv
+from .forms import ImportacaoAlunosForm
+from .importacao import ErroArquivo, importar_alunos
+from .tarefas import enfileirar
+from django.db.models import Sum, Avg, Count, Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
 from django.contrib import messages
+from django.core.cache import cache
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 import json
 
+# Segundos que o payload dos gráficos fica em cache. A chave já muda a cada
+# alteração nos dados; o prazo só limita a vida de entradas órfãs.
+TEMPO_CACHE_DASHBOARD = 60 * 60
+
 class AdminSistemaSite(admin.AdminSite):
     site_header = "🏫 Sistema de Gestão Educacional - Painel Administrativo"
     site_title = "Painel do Administrador"
@@ -30,6 +43,15 @@ class AdminSistemaSite(admin.AdminSite):
 
 admin_sistema = AdminSistemaSite(name='admin_sistema')
 
+# ========== EXPORTAÇÃO ==========
+class ExportacaoCSVMixin:
+    """Action que exporta os registros selecionados em CSV (streaming)"""
+    tipo_exportacao = None
+
+    def exportar_csv(self, request, queryset):
+        return resposta_csv(self.tipo_exportacao, queryset)
+    exportar_csv.short_description = "Exportar selecionados em CSV"
+
 # ========== INLINES ==========
 class ItemComboInline(admin.TabularInline):
     model = ItemCombo
@@ -97,7 +119,14 @@ class CompetenciaAdmin(admin.ModelAdmin):
     list_display = ('ano', 'mes_display', 'status_badge', 'total_lancamentos', 'periodo', 'aberta')
     list_filter = ('ano', 'mes')
     list_editable = ('aberta',)
+    list_select_related = ('fechamento',)
     ordering = ('-ano', '-mes')
+    actions = ['fechar_competencias', 'reabrir_competencias', 'detectar_anomalias']
+
+    def save_model(self, request, obj, form, change):
+        # Registrado no retrato quando a edição fecha a competência
+        obj._usuario_fechamento = request.user
+        super().save_model(request, obj, form, change)
     
     def mes_display(self, obj):
         return obj.get_mes_display()
@@ -110,10 +139,45 @@ class CompetenciaAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
 
     def total_lancamentos(self, obj):
-        count = LancamentoGasto.objects.filter(competencia=obj).count()
-        return format_html(f'<b>{count}</b> lançamentos')
+        fechamento = getattr(obj, 'fechamento', None)
+        if fechamento is not None:
+            count = fechamento.quantidade_lancamentos
+        else:
+            count = LancamentoGasto.objects.filter(competencia=obj).count()
+        return format_html('<b>{}</b> lançamentos', count)
     total_lancamentos.short_description = 'Lançamentos'
 
+    def fechar_competencias(self, request, queryset):
+        """Fecha as competências selecionadas; cada uma é recalculada e congelada após o commit"""
+        fechadas = 0
+        for competencia in queryset.filter(aberta=True):
+            competencia.aberta = False
+            competencia._usuario_fechamento = request.user
+            competencia.save(update_fields=['aberta'])
+            fechadas += 1
+        self.message_user(request, f"🔒 {fechadas} competência(s) fechada(s).", messages.SUCCESS)
+    fechar_competencias.short_description = "Fechar competências selecionadas"
+
+    def reabrir_competencias(self, request, queryset):
+        reabertas = 0
+        for competencia in queryset.filter(aberta=False):
+            competencia.aberta = True
+            competencia.save(update_fields=['aberta'])
+            reabertas += 1
+        self.message_user(request, f"🔓 {reabertas} competência(s) reaberta(s).", messages.SUCCESS)
+    reabrir_competencias.short_description = "Reabrir competências selecionadas"
+
+    def detectar_anomalias(self, request, queryset):
+        """Agenda a detecção de anomalias nos lançamentos das competências selecionadas"""
+        tarefa = enfileirar(
+            'detectar_anomalias',
+            usuario=request.user,
+            unica=True,
+            competencias=sorted(queryset.values_list('id', flat=True)),
+        )
+        self.message_user(request, f"🔎 Detecção de anomalias agendada (tarefa #{tarefa.id}).", messages.SUCCESS)
+    detectar_anomalias.short_description = "Detectar anomalias nos lançamentos"
+
 @admin.register(ComboGasto, site=admin_sistema)
 class ComboGastoAdmin(admin.ModelAdmin):
     list_display = ('nome', 'competencia', 'status_badge', 'total_combo', 'data_criacao', 'ativo')
@@ -213,7 +277,7 @@ class SolicitacaoCadastroAdmin(admin.ModelAdmin):
     reprovar_solicitacoes.short_description = "❌ Reprovar solicitações selecionadas"
 
 @admin.register(DashboardCustoAluno, site=admin_sistema)
-class DashboardCustoAlunoAdmin(admin.ModelAdmin):
+class DashboardCustoAlunoAdmin(ExportacaoCSVMixin, admin.ModelAdmin):
     list_display = [
         'instituicao', 
         'competencia', 
@@ -225,185 +289,178 @@ class DashboardCustoAlunoAdmin(admin.ModelAdmin):
         'data_calculo_formatada'
     ]
     
-    list_filter = ['competencia', 'instituicao__municipio', 'instituicao__tipo']
+    list_filter = ['competencia', 'instituicao__municipio', 'instituicao__tipo', 'quartil_custo', 'faixa_eficiencia']
     search_fields = ['instituicao__nome']
-    readonly_fields = ['data_calculo', 'data_atualizacao', 'eficiencia_custo']
-    actions = ['calcular_dashboard_action']
+    readonly_fields = [
+        'data_calculo', 'data_atualizacao', 'eficiencia_custo', 'zscore_custo', 'quartil_custo',
+        'faixa_eficiencia', 'grupo_comparacao', 'quantidade_grupo', 'mediana_grupo', 'percentil_grupo',
+        'distancia_mediana',
+    ]
+    actions = ['calcular_dashboard_action', 'exportar_csv']
+    tipo_exportacao = 'dashboards'
     
     change_list_template = 'admin/dashboard_change_list.html'
 
     def changelist_view(self, request, extra_context=None):
-        # Calcular dashboard automaticamente se não houver dados recentes
-        self.calcular_dashboard_automatico(request)
+        # Agendar recálculo apenas se os dados mudaram desde o último cálculo
+        ultima_atualizacao = self.calcular_dashboard_automatico(request)
         
         # Preparar dados para os gráficos
         extra_context = extra_context or {}
+        extra_context['ultima_atualizacao'] = ultima_atualizacao
         self.preparar_dados_dashboard(extra_context)
         
         return super().changelist_view(request, extra_context=extra_context)
 
     def calcular_dashboard_automatico(self, request):
-        """Calcula o dashboard automaticamente se necessário"""
-        # Verificar se existe alguma competência aberta
-        competencias_abertas = Competencia.objects.filter(aberta=True)
+        """
+        Agenda o recálculo apenas das competências abertas alteradas desde o
+        último cálculo e retorna a data do cálculo mais recente
+        """
+        competencias_abertas = list(
+            Competencia.objects.filter(aberta=True).only('versao_dados', 'versao_calculada', 'data_ultimo_calculo')
+        )
         
-        if not competencias_abertas.exists():
+        if not competencias_abertas:
             messages.warning(request, "Não há competências abertas para cálculo.")
-            return
+            return None
         
-        # Para cada competência aberta, calcular dashboard
-        for competencia in competencias_abertas:
-            # Verificar se já existe dashboard para esta competência
-            dashboard_existente = DashboardCustoAluno.objects.filter(
-                competencia=competencia
-            ).exists()
-            
-            if not dashboard_existente:
-                self.calcular_para_competencia(competencia, request)
+        desatualizadas = [competencia.id for competencia in competencias_abertas if competencia.desatualizada]
+        
+        if desatualizadas:
+            self.agendar_calculo(request, desatualizadas)
+        
+        return max(
+            (competencia.data_ultimo_calculo for competencia in competencias_abertas if competencia.data_ultimo_calculo),
+            default=None
+        )
     
-    def calcular_para_competencia(self, competencia, request):
-        """Calcula dashboard para uma competência específica"""
-        try:
-            instituicoes = Instituicao.objects.all()
-            dashboards_criados = 0
-            
-            for instituicao in instituicoes:
-                # Gastos operacionais
-                gastos_operacionais = LancamentoGasto.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
-                
-                # Folha de pagamento
-                folha_pagamento = FolhaPagamento.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
-                
-                # Dados de alunos
-                dados_alunos = DadosAlunos.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).first()
-                
-                if dados_alunos:
-                    quantidade_alunos = dados_alunos.quantidade_alunos
-                    
-                    # Criar ou atualizar dashboard
-                    dashboard, created = DashboardCustoAluno.objects.update_or_create(
-                        instituicao=instituicao,
-                        competencia=competencia,
-                        defaults={
-                            'total_gastos_operacionais': gastos_operacionais,
-                            'total_folha_pagamento': folha_pagamento,
-                            'quantidade_alunos': quantidade_alunos
-                        }
-                    )
-                    
-                    if created:
-                        dashboards_criados += 1
-            
-            if dashboards_criados > 0:
-                messages.success(
-                    request, 
-                    f'Dashboard calculado automaticamente para {competencia}. '
-                    f'{dashboards_criados} instituições processadas.'
-                )
-                
-        except Exception as e:
-            messages.error(
-                request, 
-                f'Erro ao calcular dashboard automaticamente: {str(e)}'
-            )
+    def agendar_calculo(self, request, competencias):
+        """Enfileira o recálculo das competências para o worker de tarefas"""
+        tarefa = enfileirar(
+            'recalcular_dashboards',
+            usuario=request.user,
+            unica=True,
+            competencias=list(competencias)
+        )
+        messages.info(
+            request,
+            f'Cálculo do dashboard agendado (tarefa #{tarefa.id}, {tarefa.get_status_display().lower()}). '
+            f'Os dados serão atualizados assim que o processamento terminar.'
+        )
+        return tarefa
 
     def preparar_dados_dashboard(self, extra_context):
-        """Prepara dados para os gráficos do dashboard"""
-        # Última competência com dados
-        ultima_competencia = Competencia.objects.filter(
-            dashboardcustoaluno__isnull=False
-        ).order_by('-ano', '-mes').first()
+        """
+        Prepara dados para os gráficos do dashboard.
+        O payload fica em cache por versão dos dados das competências exibidas.
+        """
+        # Últimas 6 competências com dados: a primeira é a exibida nos cards e
+        # as versões de todas (que também regravam a série) compõem a chave do cache
+        ultimas_competencias = list(
+            Competencia.objects.filter(
+                Exists(DashboardCustoAluno.objects.filter(competencia=OuterRef('pk')))
+            ).order_by('-ano', '-mes').only('ano', 'mes', 'versao_dados', 'data_ultimo_calculo')[:6]
+        )
         
-        if not ultima_competencia:
+        if ultimas_competencias:
+            ultima_competencia = ultimas_competencias[0]
+        else:
             # Se não há dados, usar última competência aberta
             ultima_competencia = Competencia.objects.filter(aberta=True).order_by('-ano', '-mes').first()
         
-        if ultima_competencia:
-            dados_ultima_competencia = DashboardCustoAluno.objects.filter(
-                competencia=ultima_competencia
-            )
-            
-            # Métricas gerais
-            total_instituicoes = dados_ultima_competencia.count()
-            media_custo_aluno = dados_ultima_competencia.aggregate(
-                avg=Avg('custo_por_aluno')
-            )['avg'] or Decimal('0.00')
-            
-            total_alunos = dados_ultima_competencia.aggregate(
-                total=Sum('quantidade_alunos')
-            )['total'] or 0
-            
-            total_investido = dados_ultima_competencia.aggregate(
-                total=Sum('total_geral')
-            )['total'] or Decimal('0.00')
-            
-            # Dados para gráficos
-            grafico_custo_por_instituicao = list(
-                dados_ultima_competencia.values('instituicao__nome').annotate(
-                    custo=Avg('custo_por_aluno')
-                ).order_by('-custo')[:10]
-            )
-            
-            grafico_composicao_custos = {
-                'folha': float(dados_ultima_competencia.aggregate(
-                    total=Sum('total_folha_pagamento')
-                )['total'] or 0),
-                'operacionais': float(dados_ultima_competencia.aggregate(
-                    total=Sum('total_gastos_operacionais')
-                )['total'] or 0)
-            }
-            
-            grafico_eficiencia = list(
-                dados_ultima_competencia.values('instituicao__nome').annotate(
-                    eficiencia=Avg('eficiencia_custo')
-                ).order_by('-eficiencia')[:10]
-            )
-            
-            # Evolução temporal (últimos 6 meses)
-            ultimas_competencias = Competencia.objects.filter(
-                dashboardcustoaluno__isnull=False
-            ).distinct().order_by('-ano', '-mes')[:6]
-            
-            evolucao_temporal = []
-            for comp in ultimas_competencias:
-                dados_mes = DashboardCustoAluno.objects.filter(competencia=comp)
-                media_mes = dados_mes.aggregate(avg=Avg('custo_por_aluno'))['avg'] or Decimal('0.00')
-                evolucao_temporal.append({
-                    'periodo': str(comp),
-                    'media_custo': float(media_mes)
-                })
-            
-            evolucao_temporal.reverse()
-            
-            extra_context.update({
-                'ultima_competencia': ultima_competencia,
-                'total_instituicoes': total_instituicoes,
-                'media_custo_aluno': float(media_custo_aluno),
-                'total_alunos': total_alunos,
-                'total_investido': float(total_investido),
-                'grafico_custo_por_instituicao': json.dumps(grafico_custo_por_instituicao),
-                'grafico_composicao_custos': grafico_composicao_custos,
-                'grafico_eficiencia': json.dumps(grafico_eficiencia),
-                'evolucao_temporal': json.dumps(evolucao_temporal),
-                'metricas_gerais': {
-                    'instituicoes_eficientes': dados_ultima_competencia.filter(eficiencia_custo__gte=80).count(),
-                    'instituicoes_medias': dados_ultima_competencia.filter(eficiencia_custo__gte=60, eficiencia_custo__lt=80).count(),
-                    'instituicoes_baixas': dados_ultima_competencia.filter(eficiencia_custo__lt=60).count(),
-                }
-            })
-        else:
+        if not ultima_competencia:
             extra_context.update({
                 'sem_dados': True
             })
+            return
+        
+        # Nomes de instituições e municípios aparecem no ranking: a versão dos cadastros também entra
+        chave_cache = f'dashboard_admin:{VersaoCadastro.atual()[0]}:' + ':'.join(
+            f'{competencia.id}.{competencia.versao_dados}.'
+            f'{competencia.data_ultimo_calculo.timestamp() if competencia.data_ultimo_calculo else 0}'
+            for competencia in ultimas_competencias or [ultima_competencia]
+        )
+        dados = cache.get(chave_cache)
+        if dados is None:
+            dados = self.calcular_dados_dashboard(ultima_competencia)
+            cache.set(chave_cache, dados, TEMPO_CACHE_DASHBOARD)
+        
+        extra_context.update(dados, ultima_competencia=ultima_competencia)
+
+    def calcular_dados_dashboard(self, ultima_competencia):
+        """Calcula o payload dos gráficos com uma agregação condicional, um ranking e a série da rede"""
+        da_ultima = Q(competencia_id=ultima_competencia.id)
+        
+        # Métricas da última competência em uma única passada
+        agregados = DashboardCustoAluno.objects.filter(da_ultima).aggregate(
+            total_instituicoes=Count('id', filter=da_ultima),
+            media_custo_aluno=Avg('custo_por_aluno', filter=da_ultima),
+            total_alunos=Sum('quantidade_alunos', filter=da_ultima),
+            total_investido=Sum('total_geral', filter=da_ultima),
+            total_folha=Sum('total_folha_pagamento', filter=da_ultima),
+            total_operacionais=Sum('total_gastos_operacionais', filter=da_ultima),
+            instituicoes_eficientes=Count('id', filter=da_ultima & Q(faixa_eficiencia='alta')),
+            instituicoes_medias=Count('id', filter=da_ultima & Q(faixa_eficiencia='media')),
+            instituicoes_baixas=Count('id', filter=da_ultima & Q(faixa_eficiencia='baixa')),
+        )
+        
+        # Top 10 por custo e por eficiência na mesma consulta
+        ranking = list(
+            DashboardCustoAluno.objects.filter(da_ultima).annotate(
+                posicao_custo=Window(RowNumber(), order_by=[F('custo_por_aluno').desc(), F('id').asc()]),
+                posicao_eficiencia=Window(RowNumber(), order_by=[F('eficiencia_custo').desc(nulls_last=True), F('id').asc()]),
+            ).filter(
+                Q(posicao_custo__lte=10) | Q(posicao_eficiencia__lte=10)
+            ).values(
+                'instituicao__nome', 'custo_por_aluno', 'eficiencia_custo', 'faixa_eficiencia',
+                'posicao_custo', 'posicao_eficiencia',
+            )
+        )
+        
+        grafico_custo_por_instituicao = [
+            {'instituicao__nome': linha['instituicao__nome'], 'custo': float(linha['custo_por_aluno'])}
+            for linha in sorted(ranking, key=lambda linha: linha['posicao_custo'])
+            if linha['posicao_custo'] <= 10
+        ]
+        grafico_eficiencia = [
+            {
+                'instituicao__nome': linha['instituicao__nome'],
+                'eficiencia': float(linha['eficiencia_custo']),
+                'faixa': linha['faixa_eficiencia'],
+            }
+            for linha in sorted(ranking, key=lambda linha: linha['posicao_eficiencia'])
+            if linha['posicao_eficiencia'] <= 10 and linha['eficiencia_custo'] is not None
+        ]
+        
+        # Evolução temporal (últimos 6 meses) lida da série da rede
+        serie_rede = SerieTemporalCusto.objects.filter(nivel='REDE', referencia_id=0).order_by('-periodo')[:6]
+        evolucao_temporal = [
+            {
+                'periodo': f'{ponto.periodo % 100:02d}/{ponto.periodo // 100}',
+                'media_custo': float(ponto.media_custo_aluno)
+            }
+            for ponto in reversed(list(serie_rede))
+        ]
+        
+        return {
+            'total_instituicoes': agregados['total_instituicoes'],
+            'media_custo_aluno': float(agregados['media_custo_aluno'] or 0),
+            'total_alunos': agregados['total_alunos'] or 0,
+            'total_investido': float(agregados['total_investido'] or 0),
+            'grafico_custo_por_instituicao': json.dumps(grafico_custo_por_instituicao),
+            'grafico_composicao_custos': {
+                'folha': float(agregados['total_folha'] or 0),
+                'operacionais': float(agregados['total_operacionais'] or 0),
+            },
+            'grafico_eficiencia': json.dumps(grafico_eficiencia),
+            'evolucao_temporal': json.dumps(evolucao_temporal),
+            'metricas_gerais': {
+                'instituicoes_eficientes': agregados['instituicoes_eficientes'],
+                'instituicoes_medias': agregados['instituicoes_medias'],
+                'instituicoes_baixas': agregados['instituicoes_baixas'],
+            }
+        }
 
     def calcular_dashboard_action(self, request, queryset):
         """Action para calcular dashboard manualmente"""
@@ -413,17 +470,7 @@ class DashboardCustoAlunoAdmin(admin.ModelAdmin):
             self.message_user(request, "Não há competências abertas para cálculo.", messages.WARNING)
             return
         
-        dashboards_criados = 0
-        
-        for competencia in competencias:
-            dashboards_criados += self.calcular_para_competencia(competencia, request, silent=True)
-        
-        self.message_user(
-            request, 
-            f'Dashboard calculado para {competencias.count()} competências. '
-            f'{dashboards_criados} registros criados/atualizados.', 
-            messages.SUCCESS
-        )
+        self.agendar_calculo(request, competencias.values_list('id', flat=True))
     
     calcular_dashboard_action.short_description = "Calcular dashboard para competências abertas"
 
@@ -460,79 +507,38 @@ class DashboardCustoAlunoAdmin(admin.ModelAdmin):
             color = 'green' if variacao <= 0 else 'red'
             icon = '↘' if variacao <= 0 else '↗'
             return format_html(
-                '<span style="color: {};">{} {:.1f}%</span>',
-                color, icon, abs(variacao)
+                '<span style="color: {};">{} {}%</span>',
+                color, icon, f'{abs(variacao):.1f}'
             )
         return '-'
     variacao_display.short_description = 'Variação'
+
+@admin.register(Tarefa, site=admin_sistema)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'status_badge', 'progresso_display', 'usuario', 'worker', 'data_criacao', 'data_fim')
+    list_filter = ('status', 'tipo')
+    readonly_fields = ('tipo', 'parametros', 'status', 'progresso', 'resultado', 'erro', 'worker',
+                       'usuario', 'data_criacao', 'data_inicio', 'data_fim')
     
-    def calcular_para_competencia(self, competencia, request):
-        """Calcula dashboard para uma competência específica"""
-        try:
-            instituicoes = Instituicao.objects.all()
-            dashboards_criados = 0
-            
-            for instituicao in instituicoes:
-                # Gastos operacionais - Soma manual dos valores totais
-                lancamentos = LancamentoGasto.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                )
-                
-                gastos_operacionais = Decimal('0.00')
-                for lancamento in lancamentos:
-                    gastos_operacionais += lancamento.valor_total
-                
-                # Folha de pagamento - Soma manual dos valores totais
-                folhas = FolhaPagamento.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                )
-                
-                folha_pagamento = Decimal('0.00')
-                for folha in folhas:
-                    folha_pagamento += folha.valor_total
-                
-                # Dados de alunos
-                dados_alunos = DadosAlunos.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).first()
-                
-                if dados_alunos:
-                    quantidade_alunos = dados_alunos.quantidade_alunos
-                    
-                    # Criar ou atualizar dashboard
-                    dashboard, created = DashboardCustoAluno.objects.update_or_create(
-                        instituicao=instituicao,
-                        competencia=competencia,
-                        defaults={
-                            'total_gastos_operacionais': gastos_operacionais,
-                            'total_folha_pagamento': folha_pagamento,
-                            'quantidade_alunos': quantidade_alunos
-                        }
-                    )
-                    
-                    if created:
-                        dashboards_criados += 1
-            
-            if dashboards_criados > 0:
-                messages.success(
-                    request, 
-                    f'Dashboard calculado automaticamente para {competencia}. '
-                    f'{dashboards_criados} instituições processadas.'
-                )
-            else:
-                messages.info(
-                    request,
-                    f'Dashboard já está atualizado para {competencia}.'
-                )
-                
-        except Exception as e:
-            messages.error(
-                request, 
-                f'Erro ao calcular dashboard automaticamente: {str(e)}'
-            )
+    def has_add_permission(self, request):
+        return False
+    
+    def status_badge(self, obj):
+        cores = {
+            'PENDENTE': 'orange',
+            'EXECUTANDO': '#3498db',
+            'CONCLUIDA': 'green',
+            'ERRO': 'red'
+        }
+        return format_html(
+            '<span style="color: {}; font-weight: bold;">● {}</span>',
+            cores.get(obj.status, 'gray'), obj.get_status_display().upper()
+        )
+    status_badge.short_description = 'Status'
+    
+    def progresso_display(self, obj):
+        return f"{obj.progresso}%"
+    progresso_display.short_description = 'Progresso'
 
 # ========== MODELOS BÁSICOS ==========
 @admin.register(UnidadeFederativa, site=admin_sistema)
@@ -552,7 +558,151 @@ class CategoriaGastoAdmin(admin.ModelAdmin):
     search_fields = ('codigo', 'nome')
 
 
+@admin.register(LancamentoGasto, site=admin_sistema)
+class LancamentoGastoAdmin(ExportacaoCSVMixin, admin.ModelAdmin):
+    list_display = ('instituicao', 'competencia', 'item_gasto', 'valor_unitario', 'combo_origem', 'data_lancamento')
+    list_filter = ('competencia', 'instituicao__municipio', 'item_gasto__categoria')
+    search_fields = ('instituicao__nome', 'item_gasto__nome')
+    list_select_related = ('instituicao__municipio__uf', 'competencia', 'item_gasto', 'combo_origem__competencia')
+    actions = ['exportar_csv']
+    tipo_exportacao = 'lancamentos'
+
+@admin.register(LancamentoGastoArquivado, site=admin_sistema)
+class LancamentoGastoArquivadoAdmin(admin.ModelAdmin):
+    """Consulta de auditoria; o arquivo só é alterado pelo arquivamento e pela reabertura"""
+    list_display = ('instituicao', 'competencia', 'item_gasto', 'valor_unitario', 'data_lancamento', 'data_arquivamento')
+    list_filter = ('competencia', 'instituicao__municipio', 'item_gasto__categoria')
+    search_fields = ('instituicao__nome', 'item_gasto__nome')
+    list_select_related = ('instituicao__municipio__uf', 'competencia', 'item_gasto')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AnomaliaLancamento, site=admin_sistema)
+class AnomaliaLancamentoAdmin(admin.ModelAdmin):
+    """Achados da detecção em lote; o auditor só altera a situação"""
+    list_display = (
+        'instituicao', 'item_gasto', 'competencia', 'valor_unitario', 'mediana',
+        'razao_display', 'escore', 'situacao_badge',
+    )
+    list_filter = ('competencia', 'situacao', 'item_gasto__categoria', 'item_gasto', 'instituicao__municipio')
+    search_fields = ('instituicao__nome', 'item_gasto__nome')
+    list_select_related = ('instituicao__municipio__uf', 'competencia', 'item_gasto')
+    readonly_fields = (
+        'lancamento_id', 'competencia', 'item_gasto', 'instituicao', 'valor_unitario', 'mediana',
+        'escore', 'razao_mediana', 'usuario_revisao', 'data_deteccao',
+    )
+    actions = ['confirmar_anomalias', 'descartar_anomalias']
+
+    def has_add_permission(self, request):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.usuario_revisao = request.user
+        super().save_model(request, obj, form, change)
+
+    def razao_display(self, obj):
+        return f"{obj.razao_mediana:.1f}x" if obj.razao_mediana is not None else '-'
+    razao_display.short_description = 'Valor / Mediana'
+
+    def situacao_badge(self, obj):
+        color = {'PENDENTE': 'orange', 'CONFIRMADA': 'red', 'DESCARTADA': 'gray'}.get(obj.situacao, 'gray')
+        return format_html('<span style="color: {}; font-weight: bold;">● {}</span>', color, obj.get_situacao_display().upper())
+    situacao_badge.short_description = 'Situação'
+
+    def _revisar(self, request, queryset, situacao):
+        return queryset.update(situacao=situacao, usuario_revisao=request.user)
+
+    def confirmar_anomalias(self, request, queryset):
+        revisadas = self._revisar(request, queryset, 'CONFIRMADA')
+        self.message_user(request, f"{revisadas} anomalia(s) confirmada(s).", messages.SUCCESS)
+    confirmar_anomalias.short_description = "Confirmar anomalias selecionadas"
+
+    def descartar_anomalias(self, request, queryset):
+        revisadas = self._revisar(request, queryset, 'DESCARTADA')
+        self.message_user(request, f"{revisadas} anomalia(s) descartada(s).", messages.SUCCESS)
+    descartar_anomalias.short_description = "Descartar anomalias selecionadas"
+
+@admin.register(DistribuicaoItemGasto, site=admin_sistema)
+class DistribuicaoItemGastoAdmin(admin.ModelAdmin):
+    """Distribuições gravadas pela detecção de anomalias (somente leitura)"""
+    list_display = (
+        'item_gasto', 'competencia', 'quantidade_lancamentos', 'percentil_5', 'percentil_25',
+        'mediana', 'percentil_75', 'percentil_95', 'mad', 'data_calculo',
+    )
+    list_filter = ('competencia', 'item_gasto__categoria')
+    search_fields = ('item_gasto__nome',)
+    list_select_related = ('competencia', 'item_gasto')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(FolhaPagamento, site=admin_sistema)
+class FolhaPagamentoAdmin(ExportacaoCSVMixin, admin.ModelAdmin):
+    list_display = ('instituicao', 'competencia', 'total_salarios', 'total_encargos', 'data_processamento')
+    list_filter = ('competencia', 'instituicao__municipio')
+    search_fields = ('instituicao__nome',)
+    list_select_related = ('instituicao__municipio__uf', 'competencia')
+    actions = ['exportar_csv']
+    tipo_exportacao = 'folha'
+
 @admin.register(DadosAlunos, site=admin_sistema)
 class DadosAlunosAdmin(admin.ModelAdmin):
     list_display = ('instituicao', 'competencia', 'quantidade_alunos', 'data_informacao')
-    list_filter = ('competencia', 'instituicao')
\ No newline at end of file
+    list_filter = ('competencia', 'instituicao')
+    list_select_related = ('instituicao', 'competencia')
+    change_list_template = 'admin/dados_alunos_change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='app_principal_dadosalunos_importar'),
+        ]
+        return urls + super().get_urls()
+
+    def importar_view(self, request):
+        """Upload do CSV do censo com a quantidade de alunos por código INEP"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            messages.error(request, "Sem permissão para importar dados de alunos.")
+            return redirect('admin:app_principal_dadosalunos_changelist')
+
+        relatorio = None
+        form = ImportacaoAlunosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                relatorio = importar_alunos(
+                    form.cleaned_data['arquivo'],
+                    competencia=form.cleaned_data['competencia'],
+                    usuario=request.user,
+                )
+            except ErroArquivo as erro:
+                form.add_error('arquivo', str(erro))
+            else:
+                mensagem = (
+                    f"{relatorio['total_linhas']} linha(s): {relatorio['criadas']} criada(s), "
+                    f"{relatorio['atualizadas']} atualizada(s), {relatorio['com_erro']} com erro."
+                )
+                if not relatorio['com_erro']:
+                    messages.success(request, f"✅ {mensagem}")
+                    return redirect('admin:app_principal_dadosalunos_changelist')
+                messages.warning(request, f"⚠️ {mensagem}")
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar quantidade de alunos (censo)',
+            'form': form,
+            'relatorio': relatorio,
+        }
+        return TemplateResponse(request, 'admin/dados_alunos_importar.html', context)
\ No newline at end of file
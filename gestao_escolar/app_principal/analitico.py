@@ -0,0 +1,275 @@
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DashboardCustoAluno, limite_decimal
+
+# Lote do bulk_update; cada lote vira um UPDATE com CASE por campo
+TAMANHO_LOTE = 500
+
+# distancia_mediana com mediana de centavos não cabe no campo: é limitada a ele
+LIMITE_DISTANCIA = float(limite_decimal(DashboardCustoAluno, 'distancia_mediana'))
+
+PERCENTIS = {'percentil_25': 0.25, 'mediana': 0.5, 'percentil_75': 0.75, 'percentil_90': 0.9}
+
+# Grupo de comparação da eficiência -> caminho a partir do dashboard (None = rede inteira)
+GRUPOS_COMPARACAO = {
+    'rede': None,
+    'tipo': 'instituicao__tipo',
+    'municipio': 'instituicao__municipio_id',
+}
+GRUPO_COMPARACAO = getattr(settings, 'EFICIENCIA_GRUPO_COMPARACAO', 'rede')
+
+# Array -> campo do dashboard lido por carregar_fatos()
+CAMPOS_FATOS = {
+    'id': 'id',
+    'competencia_id': 'competencia_id',
+    'gastos': 'total_gastos_operacionais',
+    'folha': 'total_folha_pagamento',
+    'alunos': 'quantidade_alunos',
+    'custo_por_aluno': 'custo_por_aluno',
+    'percentual_folha': 'percentual_folha',
+    'percentual_operacionais': 'percentual_operacionais',
+    'zscore_custo': 'zscore_custo',
+    'quartil_custo': 'quartil_custo',
+    'eficiencia_custo': 'eficiencia_custo',
+    'quantidade_grupo': 'quantidade_grupo',
+    'mediana_grupo': 'mediana_grupo',
+    'percentil_grupo': 'percentil_grupo',
+    'distancia_mediana': 'distancia_mediana',
+    'faixa_eficiencia': 'faixa_eficiencia',
+    'grupo_comparacao': 'grupo_comparacao',
+}
+CAMPOS_TEXTO = {'faixa_eficiencia', 'grupo_comparacao'}
+
+# Campos gravados por analisar_competencias()
+CAMPOS_ANALISE = [
+    'custo_por_aluno', 'percentual_folha', 'percentual_operacionais', 'zscore_custo', 'quartil_custo',
+    'eficiencia_custo', 'quantidade_grupo', 'mediana_grupo', 'percentil_grupo', 'distancia_mediana',
+    'faixa_eficiencia', 'grupo_comparacao',
+]
+
+
+def carregar_fatos(competencias=None, grupo='rede'):
+    """
+    Lê os dashboards (uma consulta) em arrays alinhados: id, competência,
+    totais, alunos, as métricas gravadas (mantidas onde não há alunos) e a
+    chave do grupo de comparação de cada dashboard, como inteiro
+    """
+    dashboards = DashboardCustoAluno.objects.order_by()
+    if competencias is not None:
+        dashboards = dashboards.filter(competencia_id__in=competencias)
+    caminho_grupo = GRUPOS_COMPARACAO[grupo]
+    caminhos = list(CAMPOS_FATOS.values()) + ([caminho_grupo] if caminho_grupo else [])
+    linhas = list(dashboards.values_list(*caminhos))
+    colunas = list(zip(*linhas)) or [()] * len(caminhos)
+
+    # float64 converte None (métricas ainda não calculadas) em NaN
+    fatos = {}
+    for nome, valores in zip(CAMPOS_FATOS, colunas):
+        if nome in CAMPOS_TEXTO:
+            fatos[nome] = np.array(valores, dtype=object)
+        elif nome in ('id', 'competencia_id'):
+            fatos[nome] = np.array(valores, dtype=np.int64)
+        else:
+            fatos[nome] = np.array(valores, dtype=np.float64)
+
+    # Tipo é texto: np.unique numera os valores distintos
+    if caminho_grupo:
+        fatos['grupo'] = np.unique(np.array(colunas[-1], dtype=str), return_inverse=True)[1].reshape(-1)
+    else:
+        fatos['grupo'] = np.zeros(len(linhas), dtype=np.int64)
+    return fatos
+
+
+def percentis_por_grupo(valores, grupos, quantidade_grupos, fracoes=PERCENTIS):
+    """
+    Percentis ({nome: fração}) com interpolação linear dentro de cada grupo,
+    como SerieTemporalCusto.percentil, sem laço por grupo: ordena por
+    (grupo, valor) e indexa as posições de cada grupo no array ordenado
+    """
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagens = np.bincount(grupos, minlength=quantidade_grupos)
+    inicios = np.cumsum(contagens) - contagens
+
+    resultado = {}
+    for nome, fracao in fracoes.items():
+        posicao = (contagens - 1) * fracao
+        inferior = np.floor(posicao).astype(np.int64)
+        superior = np.minimum(inferior + 1, contagens - 1)
+        base = ordenados[inicios + inferior]
+        resultado[nome] = base + (ordenados[inicios + superior] - base) * (posicao - inferior)
+    return resultado
+
+
+def _posicao_no_grupo(valores, grupos, quantidade_grupos):
+    """
+    Percentil de cada valor dentro do seu grupo (0-100): a fração do grupo
+    abaixo dele mais metade dos empatados. Cada bloco de valores iguais é
+    delimitado no array ordenado por (grupo, valor).
+    """
+    ordem = np.lexsort((valores, grupos))
+    ordenados, grupos_ordenados = valores[ordem], grupos[ordem]
+    contagens = np.bincount(grupos, minlength=quantidade_grupos)
+    inicios = np.cumsum(contagens) - contagens
+
+    indices = np.arange(len(valores))
+    quebra = np.ones(len(valores), dtype=bool)
+    quebra[1:] = (ordenados[1:] != ordenados[:-1]) | (grupos_ordenados[1:] != grupos_ordenados[:-1])
+    inicio_bloco = np.maximum.accumulate(np.where(quebra, indices, 0))
+    fim = np.ones(len(valores), dtype=bool)
+    fim[:-1] = quebra[1:]
+    fim_bloco = np.minimum.accumulate(np.where(fim, indices, len(valores))[::-1])[::-1]
+
+    abaixo = inicio_bloco - inicios[grupos_ordenados]
+    empatados = fim_bloco - inicio_bloco + 1
+    posicao = np.empty(len(valores))
+    posicao[ordem] = (abaixo + empatados / 2) * 100 / contagens[grupos_ordenados]
+    return posicao
+
+
+def calcular_estatisticas(fatos, grupo='rede'):
+    """
+    Calcula, numa passada vetorizada sobre os arrays de carregar_fatos():
+    custo por aluno e percentuais de folha e operacionais; por competência,
+    média, desvio padrão e percentis do custo por aluno da rede, com o
+    z-score e o quartil de cada dashboard; e, por grupo de comparação, a
+    mediana, o percentil de cada dashboard e a eficiência (100 = o mais
+    barato do grupo). Dashboards sem alunos ficam fora das distribuições
+    (NaN/'') e, como em DashboardCustoAluno.calcular_metricas(), mantêm as
+    métricas gravadas.
+    """
+    gastos, folha, alunos = fatos['gastos'], fatos['folha'], fatos['alunos']
+    total = gastos + folha
+    validos = alunos > 0
+    com_total = validos & (total > 0)
+
+    custo = np.divide(total, alunos, out=fatos['custo_por_aluno'].copy(), where=validos)
+    percentual_folha = np.divide(folha * 100, total, out=fatos['percentual_folha'].copy(), where=com_total)
+    percentual_operacionais = np.divide(
+        gastos * 100, total, out=fatos['percentual_operacionais'].copy(), where=com_total,
+    )
+
+    # Rede: uma distribuição por competência
+    competencias, grupos = np.unique(fatos['competencia_id'][validos], return_inverse=True)
+    grupos = grupos.reshape(-1)
+    custos_validos = custo[validos]
+    quantidade_grupos = len(competencias)
+
+    quantidades = np.bincount(grupos, minlength=quantidade_grupos)
+    medias = np.bincount(grupos, weights=custos_validos, minlength=quantidade_grupos) / np.maximum(quantidades, 1)
+    desvios = np.sqrt(
+        np.bincount(grupos, weights=(custos_validos - medias[grupos]) ** 2, minlength=quantidade_grupos)
+        / np.maximum(quantidades, 1)
+    )
+    percentis = percentis_por_grupo(custos_validos, grupos, quantidade_grupos)
+
+    # Desvio zero (rede com um único custo) não distingue ninguém: z-score 0
+    zscore = np.full_like(custo, np.nan)
+    zscore[validos] = np.divide(
+        custos_validos - medias[grupos], desvios[grupos],
+        out=np.zeros_like(custos_validos), where=desvios[grupos] > 0,
+    )
+    quartil = np.full_like(custo, np.nan)
+    quartil[validos] = (
+        1
+        + (custos_validos > percentis['percentil_25'][grupos]).astype(np.int64)
+        + (custos_validos > percentis['mediana'][grupos])
+        + (custos_validos > percentis['percentil_75'][grupos])
+    )
+
+    # Grupo de comparação: pares (competência, grupo) numerados de 0 a n-1
+    pares = np.stack([fatos['competencia_id'][validos], fatos['grupo'][validos]], axis=1)
+    pares_unicos, pares_grupo = np.unique(pares, axis=0, return_inverse=True)
+    pares_grupo = pares_grupo.reshape(-1)
+    quantidade_pares = len(pares_unicos)
+    medianas = percentis_por_grupo(custos_validos, pares_grupo, quantidade_pares)['mediana'][pares_grupo]
+    posicoes = _posicao_no_grupo(custos_validos, pares_grupo, quantidade_pares)
+
+    def _por_dashboard(valores_validos):
+        resultado = np.full(len(custo), np.nan)
+        resultado[validos] = valores_validos
+        return resultado
+
+    eficiencia = 100 - posicoes
+    faixas = np.full(len(custo), '', dtype=object)
+    faixas[validos] = np.select(
+        [eficiencia >= DashboardCustoAluno.LIMITE_EFICIENCIA_ALTA, eficiencia >= DashboardCustoAluno.LIMITE_EFICIENCIA_MEDIA],
+        [DashboardCustoAluno.FaixasEficiencia.ALTA.value, DashboardCustoAluno.FaixasEficiencia.MEDIA.value],
+        DashboardCustoAluno.FaixasEficiencia.BAIXA.value,
+    )
+    grupos_comparacao = np.full(len(custo), '', dtype=object)
+    grupos_comparacao[validos] = grupo
+
+    rede = {
+        int(competencia_id): {
+            'instituicoes': int(quantidades[indice]),
+            'media': round(float(medias[indice]), 2),
+            'desvio_padrao': round(float(desvios[indice]), 2),
+            **{nome: round(float(valores[indice]), 2) for nome, valores in percentis.items()},
+        }
+        for indice, competencia_id in enumerate(competencias)
+    }
+    return {
+        'custo_por_aluno': custo,
+        'percentual_folha': percentual_folha,
+        'percentual_operacionais': percentual_operacionais,
+        'zscore_custo': zscore,
+        'quartil_custo': quartil,
+        'eficiencia_custo': _por_dashboard(eficiencia),
+        'quantidade_grupo': _por_dashboard(np.bincount(pares_grupo, minlength=quantidade_pares)[pares_grupo]),
+        'mediana_grupo': _por_dashboard(medianas),
+        'percentil_grupo': _por_dashboard(posicoes),
+        'distancia_mediana': _por_dashboard(np.clip(np.divide(
+            (custos_validos - medianas) * 100, medianas,
+            out=np.full_like(custos_validos, np.nan), where=medianas > 0,
+        ), -LIMITE_DISTANCIA, LIMITE_DISTANCIA)),
+        'faixa_eficiencia': faixas,
+        'grupo_comparacao': grupos_comparacao,
+        'rede': rede,
+    }
+
+
+def analisar_competencias(competencias=None, grupo=None):
+    """
+    Recalcula as métricas, a posição na rede e a eficiência dos dashboards
+    das competências informadas (None = todas) a partir dos totais já
+    gravados: uma leitura, o cálculo vetorizado e um bulk_update só das
+    linhas que mudaram. O grupo de comparação da eficiência vem do settings
+    EFICIENCIA_GRUPO_COMPARACAO ('rede', 'tipo' ou 'municipio'). Retorna as
+    estatísticas da rede por competência.
+    """
+    grupo = grupo or GRUPO_COMPARACAO
+    if grupo not in GRUPOS_COMPARACAO:
+        raise ValueError(f"Grupo de comparação desconhecido: {grupo}")
+
+    fatos = carregar_fatos(competencias, grupo)
+    if not len(fatos['id']):
+        return {}
+    estatisticas = calcular_estatisticas(fatos, grupo)
+
+    # Compara já arredondado como o banco grava; NaN (NULL) é igual a NaN
+    novos = {}
+    alterados = np.zeros(len(fatos['id']), dtype=bool)
+    for campo in CAMPOS_ANALISE:
+        if campo in CAMPOS_TEXTO:
+            novos[campo] = estatisticas[campo]
+            alterados |= novos[campo] != fatos[campo]
+        else:
+            novos[campo] = np.round(estatisticas[campo], 2)
+            alterados |= ~np.isclose(novos[campo], fatos[campo], rtol=0, atol=0.001, equal_nan=True)
+
+    colunas = {campo: valores[alterados].tolist() for campo, valores in novos.items()}
+    dashboards = [
+        DashboardCustoAluno(id=dashboard_id, **{
+            campo: None if valores[indice] != valores[indice] else valores[indice]  # NaN -> NULL
+            for campo, valores in colunas.items()
+        })
+        for indice, dashboard_id in enumerate(fatos['id'][alterados].tolist())
+    ]
+
+    with transaction.atomic():
+        DashboardCustoAluno.objects.bulk_update(dashboards, CAMPOS_ANALISE, batch_size=TAMANHO_LOTE)
+    return estatisticas['rede']
@@ -0,0 +1,179 @@
+from collections import Counter
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .analitico import percentis_por_grupo
+from .models import (
+    Competencia, LancamentoGasto, LancamentoGastoArquivado, DistribuicaoItemGasto, AnomaliaLancamento,
+    limite_decimal,
+)
+
+# |escore| a partir do qual o lançamento é anômalo (3,5 é o corte usual do z-score robusto)
+LIMITE_ESCORE = getattr(settings, 'ANOMALIAS_LIMITE_ESCORE', 3.5)
+
+# Itens com menos lançamentos na competência não formam uma distribuição
+MINIMO_LANCAMENTOS = getattr(settings, 'ANOMALIAS_MINIMO_LANCAMENTOS', 5)
+
+# Com MAD de centavos o escore (e a razão com mediana de centavos) passa de
+# milhões: são gravados presos ao maior valor que os campos comportam
+LIMITE_CAMPO_ESCORE = float(limite_decimal(AnomaliaLancamento, 'escore'))
+LIMITE_CAMPO_RAZAO = float(limite_decimal(AnomaliaLancamento, 'razao_mediana'))
+
+TAMANHO_LOTE = 500
+
+FRACOES = {
+    'percentil_5': 0.05, 'percentil_25': 0.25, 'mediana': 0.5, 'percentil_75': 0.75, 'percentil_95': 0.95,
+}
+
+CAMPOS_DISTRIBUICAO = ['quantidade_lancamentos', 'mad', 'data_calculo', *FRACOES]
+
+# Uma nova detecção não altera a situação nem o revisor
+CAMPOS_ANOMALIA = [
+    'competencia', 'item_gasto', 'instituicao', 'valor_unitario', 'mediana', 'escore', 'razao_mediana', 'data_deteccao',
+]
+
+
+def _carregar(competencia_id):
+    """
+    Lançamentos (ativos e arquivados) da competência dos itens com
+    lançamentos suficientes: um GROUP BY por tabela escolhe os itens e só
+    eles são lidos. Retorna arrays id, item_gasto_id, instituicao_id, valor.
+    """
+    fontes = [LancamentoGasto.objects, LancamentoGastoArquivado.objects]
+    quantidades = Counter()
+    for fonte in fontes:
+        for item_gasto_id, quantidade in (
+            fonte.filter(competencia_id=competencia_id).order_by()
+            .values('item_gasto_id').annotate(quantidade=Count('id')).values_list('item_gasto_id', 'quantidade')
+        ):
+            quantidades[item_gasto_id] += quantidade
+    itens = [item_gasto_id for item_gasto_id, quantidade in quantidades.items() if quantidade >= MINIMO_LANCAMENTOS]
+
+    linhas = []
+    for fonte in fontes:
+        linhas.extend(
+            fonte.filter(competencia_id=competencia_id, item_gasto_id__in=itens)
+            .values_list('id', 'item_gasto_id', 'instituicao_id', 'valor_unitario')
+        )
+    colunas = list(zip(*linhas)) or [()] * 4
+    return (
+        np.array(colunas[0], dtype=np.int64),
+        np.array(colunas[1], dtype=np.int64),
+        np.array(colunas[2], dtype=np.int64),
+        np.array(colunas[3], dtype=np.float64),
+    )
+
+
+def calcular_escores(valores, grupos, quantidade_grupos):
+    """
+    Distribuição de cada grupo (percentis, mediana e MAD) e o z-score robusto
+    de cada valor: 0,6745 * (valor - mediana) / MAD. Grupos com MAD zero (a
+    maioria paga o mesmo valor) usam o desvio absoluto médio * 1,2533; se
+    também for zero, todos os valores são iguais e o escore é 0.
+    """
+    percentis = percentis_por_grupo(valores, grupos, quantidade_grupos, FRACOES)
+    desvios = np.abs(valores - percentis['mediana'][grupos])
+    mad = percentis_por_grupo(desvios, grupos, quantidade_grupos, {'mad': 0.5})['mad']
+    desvio_medio = np.bincount(grupos, weights=desvios, minlength=quantidade_grupos) / np.maximum(
+        np.bincount(grupos, minlength=quantidade_grupos), 1
+    )
+    escala = np.where(mad > 0, mad / 0.6745, desvio_medio * 1.2533)
+    escores = np.divide(
+        valores - percentis['mediana'][grupos], escala[grupos],
+        out=np.zeros_like(valores), where=escala[grupos] > 0,
+    )
+    return {**percentis, 'mad': mad}, escores
+
+
+def detectar_competencia(competencia_id):
+    """
+    Regrava as distribuições dos itens da competência e as anomalias
+    encontradas. Anomalias pendentes que deixaram de sê-lo são removidas;
+    as confirmadas ou descartadas ficam como registro da auditoria.
+    """
+    agora = timezone.now()
+    ids, itens, instituicoes, valores = _carregar(competencia_id)
+    itens_unicos, grupos = np.unique(itens, return_inverse=True)
+    grupos = grupos.reshape(-1)
+    distribuicoes, escores = calcular_escores(valores, grupos, len(itens_unicos))
+    quantidades = np.bincount(grupos, minlength=len(itens_unicos))
+    anomalos = np.flatnonzero(np.abs(escores) >= LIMITE_ESCORE)
+
+    colunas = {nome: np.round(valores_grupo, 2).tolist() for nome, valores_grupo in distribuicoes.items()}
+    registros = [
+        DistribuicaoItemGasto(
+            competencia_id=competencia_id,
+            item_gasto_id=item_gasto_id,
+            quantidade_lancamentos=int(quantidades[indice]),
+            data_calculo=agora,
+            **{nome: valores_grupo[indice] for nome, valores_grupo in colunas.items()},
+        )
+        for indice, item_gasto_id in enumerate(itens_unicos.tolist())
+    ]
+    medianas = distribuicoes['mediana'][grupos]
+    anomalias = [
+        AnomaliaLancamento(
+            lancamento_id=int(ids[indice]),
+            competencia_id=competencia_id,
+            item_gasto_id=int(itens[indice]),
+            instituicao_id=int(instituicoes[indice]),
+            valor_unitario=round(float(valores[indice]), 2),
+            mediana=round(float(medianas[indice]), 2),
+            escore=round(float(np.clip(escores[indice], -LIMITE_CAMPO_ESCORE, LIMITE_CAMPO_ESCORE)), 2),
+            razao_mediana=(
+                round(min(float(valores[indice] / medianas[indice]), LIMITE_CAMPO_RAZAO), 2)
+                if medianas[indice] > 0 else None
+            ),
+            data_deteccao=agora,
+        )
+        for indice in anomalos.tolist()
+    ]
+
+    with transaction.atomic():
+        DistribuicaoItemGasto.objects.bulk_create(
+            registros,
+            batch_size=TAMANHO_LOTE,
+            update_conflicts=True,
+            unique_fields=['item_gasto', 'competencia'],
+            update_fields=CAMPOS_DISTRIBUICAO,
+        )
+        # Itens que ficaram sem lançamentos suficientes
+        DistribuicaoItemGasto.objects.filter(competencia_id=competencia_id, data_calculo__lt=agora).delete()
+        AnomaliaLancamento.objects.bulk_create(
+            anomalias,
+            batch_size=TAMANHO_LOTE,
+            update_conflicts=True,
+            unique_fields=['lancamento_id'],
+            update_fields=CAMPOS_ANOMALIA,
+        )
+        AnomaliaLancamento.objects.filter(
+            competencia_id=competencia_id, situacao='PENDENTE', data_deteccao__lt=agora,
+        ).delete()
+
+    return {'itens': len(registros), 'lancamentos': len(ids), 'anomalias': len(anomalias)}
+
+
+def detectar_anomalias(competencias=None, progresso=None):
+    """
+    Executa a detecção competência a competência (None = todas), mantendo a
+    memória limitada a um mês de lançamentos. `progresso(percentual)` é
+    chamado após cada competência. Retorna os totais.
+    """
+    alvo = Competencia.objects.order_by('ano', 'mes')
+    if competencias is not None:
+        alvo = alvo.filter(id__in=competencias)
+    competencia_ids = list(alvo.values_list('id', flat=True))
+
+    resultado = {'competencias': len(competencia_ids), 'itens': 0, 'lancamentos': 0, 'anomalias': 0}
+    for indice, competencia_id in enumerate(competencia_ids, start=1):
+        parcial = detectar_competencia(competencia_id)
+        for chave, valor in parcial.items():
+            resultado[chave] += valor
+        if progresso:
+            progresso(indice * 100 / len(competencia_ids))
+    return resultado
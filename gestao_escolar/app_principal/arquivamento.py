@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Competencia, LancamentoGasto, LancamentoGastoArquivado, FechamentoCompetencia
+
+# Competências fechadas há mais meses que isto têm os lançamentos arquivados
+IDADE_ARQUIVAMENTO_MESES = getattr(settings, 'ARQUIVAMENTO_IDADE_MESES', 24)
+
+# Lançamentos copiados por vez
+TAMANHO_BLOCO = 2000
+
+CAMPOS_LANCAMENTO = [
+    'id', 'instituicao_id', 'competencia_id', 'item_gasto_id', 'combo_origem_id',
+    'valor_unitario', 'valor_total', 'observacao', 'data_lancamento', 'usuario_lancamento_id',
+]
+
+
+def competencias_arquivaveis(meses=IDADE_ARQUIVAMENTO_MESES, hoje=None):
+    """
+    Competências fechadas, com retrato do fechamento e com mais de `meses`
+    meses (em outubro/2026 com 12, setembro/2025 e anteriores). Sem retrato
+    os relatórios dependeriam dos lançamentos, então não entram.
+    """
+    hoje = hoje or timezone.localdate()
+    return Competencia.objects.annotate(indice_mes=F('ano') * 12 + F('mes')).filter(
+        indice_mes__lt=hoje.year * 12 + hoje.month - meses,
+        aberta=False,
+        fechamento__isnull=False,
+        fechamento__data_arquivamento__isnull=True,
+    ).order_by('ano', 'mes')
+
+
+def arquivar_competencia(competencia):
+    """
+    Move os lançamentos da competência para LancamentoGastoArquivado, em
+    blocos, numa transação. A remoção da tabela de trabalho roda com os
+    dashboards suspensos e sem recálculo ao final: os totais, que já somam
+    o arquivo, não mudam e o retrato continua valendo.
+    Retorna a quantidade de lançamentos movidos.
+    """
+    from .signals import dashboards_suspensos  # signals -> calculos -> arquivamento
+
+    competencia_id = getattr(competencia, 'pk', competencia)
+    agora = timezone.now()
+    movidos = 0
+    with transaction.atomic(), dashboards_suspensos(atualizar_ao_final=False):
+        while True:
+            bloco = list(
+                LancamentoGasto.objects.filter(competencia_id=competencia_id)
+                .order_by('id').values(*CAMPOS_LANCAMENTO)[:TAMANHO_BLOCO]
+            )
+            if not bloco:
+                break
+            LancamentoGastoArquivado.objects.bulk_create(
+                [LancamentoGastoArquivado(data_arquivamento=agora, **campos) for campos in bloco]
+            )
+            LancamentoGasto.objects.filter(id__in=[campos['id'] for campos in bloco]).delete()
+            movidos += len(bloco)
+        FechamentoCompetencia.objects.filter(competencia_id=competencia_id).update(data_arquivamento=agora)
+    return movidos
+
+
+def restaurar_competencia(competencia):
+    """Devolve os lançamentos arquivados da competência à tabela de trabalho (reabertura)"""
+    competencia_id = getattr(competencia, 'pk', competencia)
+    arquivados = LancamentoGastoArquivado.objects.filter(competencia_id=competencia_id)
+    restaurados = 0
+    with transaction.atomic():
+        while True:
+            bloco = list(arquivados.order_by('id').values(*CAMPOS_LANCAMENTO)[:TAMANHO_BLOCO])
+            if not bloco:
+                break
+            LancamentoGasto.objects.bulk_create([LancamentoGasto(**campos) for campos in bloco])
+            arquivados.filter(id__in=[campos['id'] for campos in bloco]).delete()
+            restaurados += len(bloco)
+        FechamentoCompetencia.objects.filter(competencia_id=competencia_id).update(data_arquivamento=None)
+    return restaurados
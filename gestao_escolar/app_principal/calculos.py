@@ -0,0 +1,432 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import (
+    Competencia, Instituicao, LancamentoGasto, FolhaPagamento, DadosAlunos, DashboardCustoAluno,
+    ConsolidadoMunicipio, ConsolidadoUF, ConsolidadoTipoInstituicao, SerieTemporalCusto,
+    FechamentoCompetencia, FechamentoInstituicao, FechamentoCategoria, LancamentoGastoArquivado,
+    limitar, limite_decimal,
+)
+from .analitico import analisar_competencias
+from .arquivamento import restaurar_competencia
+
+TAMANHO_LOTE = 500
+
+CAMPOS_ATUALIZADOS = [
+    'total_gastos_operacionais', 'total_folha_pagamento', 'total_geral',
+    'quantidade_alunos', 'custo_por_aluno', 'percentual_folha',
+    'percentual_operacionais', 'data_calculo',
+]
+
+# Nível -> (modelo, campo da chave, atributo da chave, caminho a partir da instituição)
+NIVEIS_CONSOLIDADOS = {
+    'municipio': (ConsolidadoMunicipio, 'municipio', 'municipio_id', 'municipio_id'),
+    'uf': (ConsolidadoUF, 'uf', 'uf_id', 'municipio__uf_id'),
+    'tipo': (ConsolidadoTipoInstituicao, 'tipo', 'tipo', 'tipo'),
+}
+
+CAMPOS_CONSOLIDADOS = [
+    'total_gastos_operacionais', 'total_folha_pagamento', 'total_geral', 'quantidade_alunos',
+    'quantidade_instituicoes', 'custo_por_aluno', 'data_calculo',
+]
+
+CAMPOS_SERIE = [
+    'competencia', 'quantidade_instituicoes', 'quantidade_alunos', 'total_geral',
+    'media_custo_aluno', 'media_ponderada', 'percentil_25', 'mediana',
+    'percentil_75', 'percentil_90', 'data_calculo',
+]
+
+
+def _filtrar(queryset, competencias, instituicoes):
+    if competencias is not None:
+        queryset = queryset.filter(competencia_id__in=competencias)
+    if instituicoes is not None:
+        queryset = queryset.filter(instituicao_id__in=instituicoes)
+    return queryset
+
+
+def _totais_por_chave(queryset, expressao):
+    """Soma a expressão agrupando por (instituicao_id, competencia_id)"""
+    linhas = queryset.values('instituicao_id', 'competencia_id').annotate(total=expressao)
+    return {
+        (linha['instituicao_id'], linha['competencia_id']): linha['total'] or Decimal('0.00')
+        for linha in linhas
+    }
+
+
+def recalcular_dashboards(competencias=None, instituicoes=None):
+    """
+    Recalcula os dashboards das competências/instituições informadas
+    (querysets, instâncias ou ids; None = todas).
+
+    Retorna um dicionário com a quantidade de dashboards criados e atualizados.
+    Quando a competência inteira é recalculada, ela deixa de estar desatualizada
+    e a posição de cada dashboard na rede (z-score, quartil) é refeita.
+    """
+    versoes = {}
+    if instituicoes is None:
+        competencias_alvo = Competencia.objects.all()
+        if competencias is not None:
+            competencias_alvo = competencias_alvo.filter(id__in=competencias)
+        # Lida antes do cálculo: escritas concorrentes deixam a competência desatualizada
+        versoes = dict(competencias_alvo.values_list('id', 'versao_dados'))
+
+    resultado = _recalcular(competencias, instituicoes)
+    if versoes:
+        analisar_competencias(versoes)
+        atualizar_series(versoes)
+    Competencia.registrar_calculo(versoes)
+    return resultado
+
+
+def _recalcular(competencias, instituicoes):
+    alunos = {
+        (instituicao_id, competencia_id): quantidade
+        for instituicao_id, competencia_id, quantidade in _filtrar(
+            DadosAlunos.objects.all(), competencias, instituicoes
+        ).values_list('instituicao_id', 'competencia_id', 'quantidade_alunos')
+    }
+
+    if not alunos:
+        # Sem dados de alunos, não é possível calcular
+        return {'criados': 0, 'atualizados': 0}
+
+    gastos = _totais_por_chave(
+        _filtrar(LancamentoGasto.objects.all(), competencias, instituicoes),
+        Sum('valor_total')
+    )
+    # Competências antigas podem ter os lançamentos no arquivo
+    for chave, total in _totais_por_chave(
+        _filtrar(LancamentoGastoArquivado.objects.all(), competencias, instituicoes),
+        Sum('valor_total')
+    ).items():
+        gastos[chave] = gastos.get(chave, Decimal('0.00')) + total
+    folha = _totais_por_chave(
+        _filtrar(FolhaPagamento.objects.all(), competencias, instituicoes),
+        Sum('valor_total')
+    )
+
+    existentes = set(
+        _filtrar(DashboardCustoAluno.objects.all(), competencias, instituicoes)
+        .values_list('instituicao_id', 'competencia_id')
+    )
+
+    dashboards = []
+    for (instituicao_id, competencia_id), quantidade_alunos in alunos.items():
+        dashboard = DashboardCustoAluno(
+            instituicao_id=instituicao_id,
+            competencia_id=competencia_id,
+            total_gastos_operacionais=gastos.get((instituicao_id, competencia_id), Decimal('0.00')),
+            total_folha_pagamento=folha.get((instituicao_id, competencia_id), Decimal('0.00')),
+            quantidade_alunos=quantidade_alunos,
+        )
+        dashboard.calcular_metricas()
+        dashboards.append(dashboard)
+
+    with transaction.atomic():
+        DashboardCustoAluno.objects.bulk_create(
+            dashboards,
+            batch_size=TAMANHO_LOTE,
+            update_conflicts=True,
+            unique_fields=['instituicao', 'competencia'],
+            update_fields=CAMPOS_ATUALIZADOS,
+        )
+
+    competencias_calculadas = {competencia_id for _, competencia_id in alunos}
+    atualizar_variacoes(competencias_calculadas, instituicoes)
+    atualizar_consolidados(competencias_calculadas)
+
+    atualizados = len(existentes & alunos.keys())
+    return {'criados': len(dashboards) - atualizados, 'atualizados': atualizados}
+
+
+def atualizar_variacoes(competencias, instituicoes=None, incluir_proprias=True):
+    """
+    Atualiza custo_por_aluno_anterior e variacao_mensal dos dashboards das
+    competências informadas e das competências do mês seguinte, que usam
+    estas como referência. Executa um UPDATE por competência alvo.
+    """
+    proprias = {
+        competencia_id: (ano, mes)
+        for competencia_id, ano, mes in Competencia.objects.filter(id__in=competencias).values_list('id', 'ano', 'mes')
+    }
+    if not proprias:
+        return
+
+    vizinhas = Q()
+    for ano, mes in proprias.values():
+        for vizinha_ano, vizinha_mes in (Competencia.mes_anterior(ano, mes), Competencia.mes_seguinte(ano, mes)):
+            vizinhas |= Q(ano=vizinha_ano, mes=vizinha_mes)
+    ids_por_periodo = {
+        (ano, mes): competencia_id
+        for competencia_id, ano, mes in Competencia.objects.filter(vizinhas).values_list('id', 'ano', 'mes')
+    }
+    ids_por_periodo.update({periodo: competencia_id for competencia_id, periodo in proprias.items()})
+
+    # competência alvo -> competência do mês anterior (None se não existir)
+    alvos = {}
+    for competencia_id, (ano, mes) in proprias.items():
+        if incluir_proprias:
+            alvos[competencia_id] = ids_por_periodo.get(Competencia.mes_anterior(ano, mes))
+        seguinte = ids_por_periodo.get(Competencia.mes_seguinte(ano, mes))
+        if seguinte:
+            alvos[seguinte] = competencia_id
+
+    for alvo, anterior in alvos.items():
+        dashboards = _filtrar(DashboardCustoAluno.objects.filter(competencia_id=alvo), None, instituicoes)
+
+        if anterior is None:
+            dashboards.update(custo_por_aluno_anterior=None, variacao_mensal=None)
+            continue
+
+        custo_anterior = Subquery(
+            DashboardCustoAluno.objects.filter(
+                instituicao_id=OuterRef('instituicao_id'),
+                competencia_id=anterior
+            ).values('custo_por_aluno')[:1]
+        )
+        custo_anterior_real = Cast(custo_anterior, FloatField())
+        dashboards.update(
+            custo_por_aluno_anterior=custo_anterior,
+            variacao_mensal=Case(
+                When(GreaterThan(custo_anterior, 0),
+                     then=limitar(
+                         (Cast(F('custo_por_aluno'), FloatField()) - custo_anterior_real) * 100 / custo_anterior_real,
+                         limite_decimal(DashboardCustoAluno, 'variacao_mensal'),
+                     )),
+                default=None,
+                output_field=models.DecimalField(),
+            ),
+        )
+
+
+def atualizar_consolidados(competencias):
+    """
+    Regrava os consolidados por município, UF e tipo de instituição das
+    competências informadas: uma consulta GROUP BY e um upsert por nível.
+    """
+    agora = timezone.now()
+    dashboards = DashboardCustoAluno.objects.filter(competencia_id__in=competencias)
+
+    for modelo, campo, atributo, caminho in NIVEIS_CONSOLIDADOS.values():
+        linhas = dashboards.values(f'instituicao__{caminho}', 'competencia_id').annotate(
+            gastos=Sum('total_gastos_operacionais'),
+            folha=Sum('total_folha_pagamento'),
+            alunos=Sum('quantidade_alunos'),
+            instituicoes=Count('id'),
+        ).order_by()
+
+        consolidados = []
+        for linha in linhas:
+            consolidado = modelo(
+                competencia_id=linha['competencia_id'],
+                total_gastos_operacionais=linha['gastos'] or Decimal('0.00'),
+                total_folha_pagamento=linha['folha'] or Decimal('0.00'),
+                quantidade_alunos=linha['alunos'] or 0,
+                quantidade_instituicoes=linha['instituicoes'],
+                data_calculo=agora,
+            )
+            setattr(consolidado, atributo, linha[f'instituicao__{caminho}'])
+            consolidado.calcular_metricas()
+            consolidados.append(consolidado)
+
+        with transaction.atomic():
+            modelo.objects.bulk_create(
+                consolidados,
+                batch_size=TAMANHO_LOTE,
+                update_conflicts=True,
+                unique_fields=[campo, 'competencia'],
+                update_fields=CAMPOS_CONSOLIDADOS,
+            )
+            # Grupos que ficaram sem nenhum dashboard
+            modelo.objects.filter(competencia_id__in=competencias, data_calculo__lt=agora).delete()
+
+
+def atualizar_series(competencias):
+    """
+    Regrava os pontos da série temporal das competências informadas nos
+    níveis rede, município e instituição: uma leitura dos dashboards e um
+    upsert. Competências sem dashboards ficam sem pontos.
+    """
+    agora = timezone.now()
+    periodos = {
+        competencia_id: SerieTemporalCusto.periodo_de(ano, mes)
+        for competencia_id, ano, mes in Competencia.objects.filter(id__in=competencias).values_list('id', 'ano', 'mes')
+    }
+
+    # (nível, referência, competência) -> linhas (custo_por_aluno, alunos, total_geral)
+    grupos = defaultdict(list)
+    dashboards = DashboardCustoAluno.objects.filter(competencia_id__in=periodos).values_list(
+        'competencia_id', 'instituicao_id', 'instituicao__municipio_id',
+        'custo_por_aluno', 'quantidade_alunos', 'total_geral',
+    )
+    for competencia_id, instituicao_id, municipio_id, custo, alunos, total in dashboards:
+        linha = (custo, alunos, total)
+        grupos[('REDE', 0, competencia_id)].append(linha)
+        grupos[('MUNICIPIO', municipio_id, competencia_id)].append(linha)
+        grupos[('INSTITUICAO', instituicao_id, competencia_id)].append(linha)
+
+    pontos = []
+    for (nivel, referencia_id, competencia_id), linhas in grupos.items():
+        ponto = SerieTemporalCusto(
+            nivel=nivel,
+            referencia_id=referencia_id,
+            periodo=periodos[competencia_id],
+            competencia_id=competencia_id,
+            quantidade_instituicoes=len(linhas),
+            quantidade_alunos=sum(alunos for _, alunos, _ in linhas),
+            total_geral=sum((total for _, _, total in linhas), Decimal('0.00')),
+            data_calculo=agora,
+        )
+        ponto.calcular_metricas([custo for custo, _, _ in linhas])
+        pontos.append(ponto)
+
+    with transaction.atomic():
+        SerieTemporalCusto.objects.bulk_create(
+            pontos,
+            batch_size=TAMANHO_LOTE,
+            update_conflicts=True,
+            unique_fields=['nivel', 'referencia_id', 'periodo'],
+            update_fields=CAMPOS_SERIE,
+        )
+        # Instituições e municípios que deixaram de ter dashboard
+        SerieTemporalCusto.objects.filter(competencia_id__in=periodos, data_calculo__lt=agora).delete()
+
+
+def aplicar_delta_consolidados(instituicao_id, competencia_id, gastos=0, folha=0, alunos=0):
+    """
+    Soma a diferença de um dashboard aos consolidados da instituição.
+    Se algum consolidado ainda não existir, regrava os da competência inteira.
+    """
+    instituicao = Instituicao.objects.filter(id=instituicao_id).values(
+        *[caminho for _, _, _, caminho in NIVEIS_CONSOLIDADOS.values()]
+    ).first()
+    if instituicao is None:
+        return
+
+    expressoes = ConsolidadoMunicipio.expressoes_delta(gastos=gastos, folha=folha, alunos=alunos)
+    for modelo, _, atributo, caminho in NIVEIS_CONSOLIDADOS.values():
+        atualizados = modelo.objects.filter(
+            competencia_id=competencia_id,
+            **{atributo: instituicao[caminho]}
+        ).update(**expressoes)
+        if not atualizados:
+            atualizar_consolidados([competencia_id])
+            return
+
+
+def recalcular_chaves(chaves):
+    """
+    Recalcula somente os dashboards das chaves (instituicao_id, competencia_id)
+    informadas, com uma execução do motor por competência envolvida.
+    """
+    instituicoes_por_competencia = defaultdict(set)
+    for instituicao_id, competencia_id in chaves:
+        instituicoes_por_competencia[competencia_id].add(instituicao_id)
+
+    resultado = {'criados': 0, 'atualizados': 0}
+    for competencia_id, instituicoes in instituicoes_por_competencia.items():
+        parcial = recalcular_dashboards(competencias=[competencia_id], instituicoes=instituicoes)
+        resultado['criados'] += parcial['criados']
+        resultado['atualizados'] += parcial['atualizados']
+    return resultado
+
+
+def fechar_competencia(competencia, usuario=None):
+    """
+    Recalcula a competência uma última vez e grava o retrato do fechamento:
+    totais da rede, por instituição e por categoria de gasto. Chamado na
+    transição aberta -> fechada; um retrato anterior é substituído.
+    """
+    competencia_id = getattr(competencia, 'pk', competencia)
+    recalcular_dashboards(competencias=[competencia_id])
+
+    # Três GROUP BY sobre os dados brutos, os últimos para esta competência
+    lancamentos = LancamentoGasto.objects.filter(competencia_id=competencia_id).order_by()
+    por_categoria = list(
+        lancamentos.values('instituicao_id', 'item_gasto__categoria_id')
+        .annotate(total=Sum('valor_total'), quantidade=Count('id'))
+    )
+    folha = _totais_por_chave(
+        FolhaPagamento.objects.filter(competencia_id=competencia_id).order_by(),
+        Sum('valor_total')
+    )
+    alunos = dict(
+        DadosAlunos.objects.filter(competencia_id=competencia_id)
+        .values_list('instituicao_id', 'quantidade_alunos')
+    )
+
+    instituicoes = {}
+
+    def _instituicao(instituicao_id):
+        if instituicao_id not in instituicoes:
+            instituicoes[instituicao_id] = FechamentoInstituicao(
+                competencia_id=competencia_id,
+                instituicao_id=instituicao_id,
+                total_gastos_operacionais=Decimal('0.00'),
+                total_folha_pagamento=Decimal('0.00'),
+                quantidade_alunos=alunos.get(instituicao_id, 0),
+            )
+        return instituicoes[instituicao_id]
+
+    categorias = []
+    for linha in por_categoria:
+        total = linha['total'] or Decimal('0.00')
+        registro = _instituicao(linha['instituicao_id'])
+        registro.total_gastos_operacionais += total
+        registro.quantidade_lancamentos += linha['quantidade']
+        categorias.append(FechamentoCategoria(
+            competencia_id=competencia_id,
+            instituicao_id=linha['instituicao_id'],
+            categoria_id=linha['item_gasto__categoria_id'],
+            total=total,
+            quantidade_lancamentos=linha['quantidade'],
+        ))
+    for (instituicao_id, _), total in folha.items():
+        _instituicao(instituicao_id).total_folha_pagamento += total
+    for instituicao_id in alunos:
+        _instituicao(instituicao_id)
+
+    fechamento = FechamentoCompetencia(
+        competencia_id=competencia_id,
+        versao_dados=Competencia.objects.values_list('versao_dados', flat=True).get(pk=competencia_id),
+        usuario_fechamento=usuario,
+        total_gastos_operacionais=Decimal('0.00'),
+        total_folha_pagamento=Decimal('0.00'),
+        quantidade_instituicoes=len(instituicoes),
+    )
+    for registro in instituicoes.values():
+        registro.total_geral = registro.total_gastos_operacionais + registro.total_folha_pagamento
+        registro.custo_por_aluno = (
+            registro.total_geral / registro.quantidade_alunos if registro.quantidade_alunos > 0 else 0
+        )
+        fechamento.total_gastos_operacionais += registro.total_gastos_operacionais
+        fechamento.total_folha_pagamento += registro.total_folha_pagamento
+        fechamento.quantidade_alunos += registro.quantidade_alunos
+        fechamento.quantidade_lancamentos += registro.quantidade_lancamentos
+    fechamento.calcular_metricas()
+
+    with transaction.atomic():
+        FechamentoCompetencia.objects.filter(competencia_id=competencia_id).delete()
+        fechamento.save()
+        for registro in list(instituicoes.values()) + categorias:
+            registro.fechamento = fechamento
+        FechamentoInstituicao.objects.bulk_create(instituicoes.values(), batch_size=TAMANHO_LOTE)
+        FechamentoCategoria.objects.bulk_create(categorias, batch_size=TAMANHO_LOTE)
+    return fechamento
+
+
+def reabrir_competencia(competencia):
+    """
+    Descarta o retrato do fechamento: a competência volta a ser lida dos
+    lançamentos, que voltam do arquivo se já tiverem sido arquivados
+    """
+    competencia_id = getattr(competencia, 'pk', competencia)
+    restaurar_competencia(competencia_id)
+    FechamentoCompetencia.objects.filter(competencia_id=competencia_id).delete()
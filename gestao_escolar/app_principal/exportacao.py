@@ -0,0 +1,118 @@
+import csv
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import LancamentoGasto, LancamentoGastoArquivado, FolhaPagamento, DashboardCustoAluno
+
+# Linhas buscadas do banco por vez durante a exportação
+TAMANHO_BLOCO = 2000
+
+# Tipo -> (modelo, [(cabeçalho, campo)])
+EXPORTACOES = {
+    'lancamentos': (LancamentoGasto, [
+        ('id', 'id'),
+        ('codigo_inep', 'instituicao__codigo_inep'),
+        ('instituicao', 'instituicao__nome'),
+        ('municipio', 'instituicao__municipio__nome'),
+        ('ano', 'competencia__ano'),
+        ('mes', 'competencia__mes'),
+        ('categoria', 'item_gasto__categoria__codigo'),
+        ('item_gasto', 'item_gasto__nome'),
+        ('combo', 'combo_origem__nome'),
+        ('valor_unitario', 'valor_unitario'),
+        ('valor_total', 'valor_total'),
+        ('observacao', 'observacao'),
+        ('data_lancamento', 'data_lancamento'),
+        ('usuario', 'usuario_lancamento__username'),
+    ]),
+    'folha': (FolhaPagamento, [
+        ('id', 'id'),
+        ('codigo_inep', 'instituicao__codigo_inep'),
+        ('instituicao', 'instituicao__nome'),
+        ('municipio', 'instituicao__municipio__nome'),
+        ('ano', 'competencia__ano'),
+        ('mes', 'competencia__mes'),
+        ('total_salarios', 'total_salarios'),
+        ('total_encargos', 'total_encargos'),
+        ('valor_total', 'valor_total'),
+        ('observacao', 'observacao'),
+        ('data_processamento', 'data_processamento'),
+        ('usuario', 'usuario_processamento__username'),
+    ]),
+    'dashboards': (DashboardCustoAluno, [
+        ('id', 'id'),
+        ('codigo_inep', 'instituicao__codigo_inep'),
+        ('instituicao', 'instituicao__nome'),
+        ('municipio', 'instituicao__municipio__nome'),
+        ('uf', 'instituicao__municipio__uf__sigla'),
+        ('ano', 'competencia__ano'),
+        ('mes', 'competencia__mes'),
+        ('total_gastos_operacionais', 'total_gastos_operacionais'),
+        ('total_folha_pagamento', 'total_folha_pagamento'),
+        ('total_geral', 'total_geral'),
+        ('quantidade_alunos', 'quantidade_alunos'),
+        ('custo_por_aluno', 'custo_por_aluno'),
+        ('percentual_folha', 'percentual_folha'),
+        ('percentual_operacionais', 'percentual_operacionais'),
+        ('eficiencia_custo', 'eficiencia_custo'),
+        ('faixa_eficiencia', 'faixa_eficiencia'),
+        ('grupo_comparacao', 'grupo_comparacao'),
+        ('mediana_grupo', 'mediana_grupo'),
+        ('percentil_grupo', 'percentil_grupo'),
+        ('distancia_mediana', 'distancia_mediana'),
+        ('zscore_custo', 'zscore_custo'),
+        ('quartil_custo', 'quartil_custo'),
+        ('variacao_mensal', 'variacao_mensal'),
+        ('data_calculo', 'data_calculo'),
+    ]),
+}
+
+
+def filtros_relatorio(instituicao_id=None, competencia_id=None, ano=None):
+    """Filtros de instituição, competência e ano usados pelos relatórios e exportações"""
+    filtros = Q()
+    if instituicao_id:
+        filtros &= Q(instituicao_id=instituicao_id)
+    if competencia_id:
+        filtros &= Q(competencia_id=competencia_id)
+    if ano:
+        filtros &= Q(competencia__ano=ano)
+    return filtros
+
+
+class _Eco:
+    """Buffer que devolve o que recebe, para o csv.writer gerar texto sob demanda"""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(queryset, colunas, adicionais=()):
+    """
+    Gera o CSV linha a linha. As linhas vêm de values_list().iterator(), sem
+    instanciar modelos nem carregar o resultado inteiro na memória. Querysets
+    adicionais com os mesmos campos (ex.: o arquivo) seguem depois, sob o
+    mesmo cabeçalho.
+    """
+    escritor = csv.writer(_Eco())
+    # BOM para o Excel reconhecer o UTF-8 (acentos em nomes de instituições)
+    yield '\ufeff' + escritor.writerow([cabecalho for cabecalho, _ in colunas])
+
+    for consulta in (queryset, *adicionais):
+        linhas = consulta.order_by('id').values_list(*[campo for _, campo in colunas])
+        for linha in linhas.iterator(chunk_size=TAMANHO_BLOCO):
+            yield escritor.writerow(['' if valor is None else valor for valor in linha])
+
+
+def resposta_csv(tipo, queryset=None, adicionais=()):
+    """StreamingHttpResponse com a exportação do tipo informado"""
+    modelo, colunas = EXPORTACOES[tipo]
+    if queryset is None:
+        queryset = modelo.objects.all()
+
+    resposta = StreamingHttpResponse(linhas_csv(queryset, colunas, adicionais), content_type='text/csv; charset=utf-8')
+    nome_arquivo = f"{tipo}_{timezone.localtime():%Y%m%d_%H%M}.csv"
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
@@ -1,12 +1,21 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import CustomUser
+from .models import Competencia, CustomUser
 
 class CustomUserCreationForm(UserCreationForm):
     cpf = forms.CharField(required=True, label="CPF", max_length=11)
     telefone = forms.CharField(required=False, label="Telefone", max_length=20)
-    role = forms.ChoiceField(choices=CustomUser.Roles.choices, label="Tipo de Usuário")
+    role = forms.ChoiceField(choices=CustomUser.Cargos.choices, label="Tipo de Usuário")
 
     class Meta:
         model = CustomUser
         fields = ("username", "email", "cpf", "telefone", "role", "password1", "password2")
+
+class ImportacaoAlunosForm(forms.Form):
+    arquivo = forms.FileField(label="Arquivo CSV", help_text="Colunas: codigo_inep, quantidade_alunos e, opcionalmente, competencia (AAAA-MM)")
+    competencia = forms.ModelChoiceField(
+        queryset=Competencia.objects.filter(aberta=True),
+        required=False,
+        label="Competência",
+        help_text="Deixe em branco se o arquivo tiver a coluna competencia"
+    )
@@ -0,0 +1,291 @@
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .calculos import TAMANHO_LOTE
+from .models import Competencia, Instituicao, FolhaPagamento, DadosAlunos
+from .signals import dashboards_suspensos
+
+COLUNAS_FOLHA = ['codigo_inep', 'competencia', 'total_salarios', 'total_encargos']
+COLUNAS_ALUNOS = ['codigo_inep', 'quantidade_alunos']
+
+# Limite de dígitos de cada valor da folha, o mesmo da coluna no banco
+DIGITOS_FOLHA = {campo: FolhaPagamento._meta.get_field(campo).max_digits for campo in ('total_salarios', 'total_encargos')}
+
+
+class ErroArquivo(ValueError):
+    """O arquivo inteiro é inválido (cabeçalho, codificação)"""
+
+
+def ler_csv(arquivo, colunas_obrigatorias):
+    """
+    Lê o CSV (bytes ou texto, separado por ',' ou ';') e retorna as linhas
+    como dicionários com os nomes de coluna em minúsculas
+    """
+    conteudo = arquivo.read()
+    if isinstance(conteudo, bytes):
+        try:
+            conteudo = conteudo.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # Exportações de sistemas legados costumam vir em Latin-1
+            conteudo = conteudo.decode('latin-1')
+    conteudo = conteudo.lstrip('\ufeff')
+
+    cabecalho = conteudo.split('\n', 1)[0]
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.DictReader(io.StringIO(conteudo), delimiter=delimitador)
+    leitor.fieldnames = [coluna.strip().lower() for coluna in leitor.fieldnames or []]
+
+    faltando = [coluna for coluna in colunas_obrigatorias if coluna not in leitor.fieldnames]
+    if faltando:
+        raise ErroArquivo(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+    return list(leitor)
+
+
+def _decimal(valor, campo, erros, max_digits):
+    """Aceita 1234.56 e 1.234,56, com até max_digits dígitos (2 decimais)"""
+    texto = (valor or '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(texto)
+        # NaN e Infinity passam pelo construtor, mas não podem ser gravados
+        if not numero.is_finite():
+            raise InvalidOperation
+        numero = numero.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        erros.append(f"{campo} inválido: '{valor}'")
+        return None
+    if numero < 0:
+        erros.append(f"{campo} não pode ser negativo")
+        return None
+    if len(numero.as_tuple().digits) > max_digits:
+        erros.append(f"{campo} excede o limite de {max_digits - 2} dígitos antes da vírgula: '{valor}'")
+        return None
+    return numero
+
+
+def _inteiro_positivo(valor, campo, erros):
+    """Aceita 1234 e 1.234"""
+    texto = (valor or '').strip()
+    if re.fullmatch(r'\d{1,3}(\.\d{3})+', texto):
+        texto = texto.replace('.', '')
+    if not texto.isdigit() or int(texto) < 1:
+        erros.append(f"{campo} deve ser um inteiro maior que zero: '{valor}'")
+        return None
+    return int(texto)
+
+
+def _periodo(valor, erros):
+    """Aceita AAAA-MM e MM/AAAA"""
+    texto = (valor or '').strip()
+    encontrado = re.fullmatch(r'(\d{4})-(\d{1,2})', texto)
+    if encontrado:
+        ano, mes = int(encontrado[1]), int(encontrado[2])
+    else:
+        encontrado = re.fullmatch(r'(\d{1,2})/(\d{4})', texto)
+        if not encontrado:
+            erros.append(f"competência inválida: '{valor}' (use AAAA-MM ou MM/AAAA)")
+            return None
+        ano, mes = int(encontrado[2]), int(encontrado[1])
+    if not 1 <= mes <= 12:
+        erros.append(f"mês inválido na competência '{valor}'")
+        return None
+    return ano, mes
+
+
+def _resolver_chaves(linhas):
+    """
+    Resolve codigo_inep e competência de todas as linhas com uma consulta de
+    instituições e uma de competências. Retorna os mapas usados na validação.
+    """
+    codigos = {linha['codigo_inep'] for linha in linhas if linha['codigo_inep']}
+    instituicoes = dict(Instituicao.objects.filter(codigo_inep__in=codigos).values_list('codigo_inep', 'id'))
+
+    periodos = {linha['periodo'] for linha in linhas if linha['periodo']}
+    filtro = Q(pk__in=[])
+    for ano, mes in periodos:
+        filtro |= Q(ano=ano, mes=mes)
+    competencias = {
+        (ano, mes): (competencia_id, aberta)
+        for competencia_id, ano, mes, aberta in Competencia.objects.filter(filtro).values_list('id', 'ano', 'mes', 'aberta')
+    }
+    return instituicoes, competencias
+
+
+def _validar_chaves(linhas):
+    """Preenche instituicao_id/competencia_id e acusa chaves inválidas ou repetidas no arquivo"""
+    instituicoes, competencias = _resolver_chaves(linhas)
+    vistas = {}
+    for linha in linhas:
+        if linha['codigo_inep']:
+            linha['instituicao_id'] = instituicoes.get(linha['codigo_inep'])
+            if linha['instituicao_id'] is None:
+                linha['erros'].append(f"instituição com código INEP {linha['codigo_inep']} não encontrada")
+        else:
+            linha['erros'].append("codigo_inep é obrigatório")
+
+        if linha['periodo']:
+            competencia_id, aberta = competencias.get(linha['periodo'], (None, None))
+            linha['competencia_id'] = competencia_id
+            if competencia_id is None:
+                linha['erros'].append("competência não cadastrada")
+            elif not aberta:
+                linha['erros'].append("competência fechada para lançamentos")
+
+        if not linha['erros']:
+            chave = (linha['instituicao_id'], linha['competencia_id'])
+            if chave in vistas:
+                linha['erros'].append(f"mesma instituição e competência da linha {vistas[chave]}")
+            else:
+                vistas[chave] = linha['numero']
+
+
+def _relatorio(linhas, criadas, atualizadas):
+    erros = [
+        {'linha': linha['numero'], 'codigo_inep': linha['codigo_inep'], 'erros': linha['erros']}
+        for linha in linhas if linha['erros']
+    ]
+    return {
+        'total_linhas': len(linhas),
+        'criadas': criadas,
+        'atualizadas': atualizadas,
+        'com_erro': len(erros),
+        'erros': erros,
+    }
+
+
+def importar_folha(arquivo, usuario=None):
+    """
+    Importa a folha de pagamento a partir de um CSV com as colunas
+    codigo_inep, competencia, total_salarios, total_encargos e, opcionalmente,
+    observacao. Cada (instituição, competência) tem uma folha: linhas de
+    chaves existentes atualizam o registro, as demais criam um novo.
+
+    Linhas inválidas são ignoradas e listadas no relatório retornado; as
+    válidas são gravadas em lote e os dashboards afetados recalculados uma
+    única vez ao final.
+    """
+    linhas = []
+    for numero, registro in enumerate(ler_csv(arquivo, COLUNAS_FOLHA), start=2):
+        erros = []
+        linhas.append({
+            'numero': numero,
+            'codigo_inep': (registro.get('codigo_inep') or '').strip(),
+            'periodo': _periodo(registro.get('competencia'), erros),
+            'total_salarios': _decimal(registro.get('total_salarios'), 'total_salarios', erros, DIGITOS_FOLHA['total_salarios']),
+            'total_encargos': _decimal(registro.get('total_encargos'), 'total_encargos', erros, DIGITOS_FOLHA['total_encargos']),
+            'observacao': (registro.get('observacao') or '').strip() or None,
+            'erros': erros,
+        })
+
+    _validar_chaves(linhas)
+    validas = [linha for linha in linhas if not linha['erros']]
+
+    # Folhas já cadastradas para as chaves do arquivo, em uma consulta
+    existentes = {}
+    duplicadas = set()
+    for folha_id, instituicao_id, competencia_id in FolhaPagamento.objects.filter(
+        instituicao_id__in={linha['instituicao_id'] for linha in validas},
+        competencia_id__in={linha['competencia_id'] for linha in validas},
+    ).values_list('id', 'instituicao_id', 'competencia_id'):
+        chave = (instituicao_id, competencia_id)
+        if chave in existentes:
+            duplicadas.add(chave)
+        existentes[chave] = folha_id
+
+    agora = timezone.now()
+    novas, alteradas = [], []
+    for linha in validas:
+        chave = (linha['instituicao_id'], linha['competencia_id'])
+        if chave in duplicadas:
+            linha['erros'].append("há mais de uma folha cadastrada para esta instituição e competência")
+            continue
+        folha = FolhaPagamento(
+            id=existentes.get(chave),
+            instituicao_id=linha['instituicao_id'],
+            competencia_id=linha['competencia_id'],
+            total_salarios=linha['total_salarios'],
+            total_encargos=linha['total_encargos'],
+            observacao=linha['observacao'],
+            data_processamento=agora,
+            usuario_processamento=usuario,
+        )
+        folha.calcular_valor_total()
+        (alteradas if folha.id else novas).append(folha)
+
+    # Em lote os signals não disparam: as chaves são recalculadas uma vez no commit
+    with transaction.atomic(), dashboards_suspensos() as chaves:
+        FolhaPagamento.objects.bulk_create(novas, batch_size=TAMANHO_LOTE)
+        FolhaPagamento.objects.bulk_update(
+            alteradas,
+            ['total_salarios', 'total_encargos', 'valor_total', 'observacao', 'data_processamento', 'usuario_processamento'],
+            batch_size=TAMANHO_LOTE,
+        )
+        chaves.update((folha.instituicao_id, folha.competencia_id) for folha in novas + alteradas)
+
+    return _relatorio(linhas, len(novas), len(alteradas))
+
+
+def importar_alunos(arquivo, competencia=None, usuario=None):
+    """
+    Importa a quantidade de alunos (censo escolar) de um CSV com as colunas
+    codigo_inep, quantidade_alunos e competencia. Se a competência for
+    informada, vale para todas as linhas e a coluna é dispensada.
+
+    Faz upsert em lote sobre (instituição, competência); linhas inválidas
+    vão para o relatório e os dashboards afetados são recalculados uma vez.
+    """
+    obrigatorias = COLUNAS_ALUNOS if competencia else COLUNAS_ALUNOS + ['competencia']
+    linhas = []
+    for numero, registro in enumerate(ler_csv(arquivo, obrigatorias), start=2):
+        erros = []
+        linhas.append({
+            'numero': numero,
+            'codigo_inep': (registro.get('codigo_inep') or '').strip(),
+            'periodo': (competencia.ano, competencia.mes) if competencia else _periodo(registro.get('competencia'), erros),
+            'quantidade_alunos': _inteiro_positivo(registro.get('quantidade_alunos'), 'quantidade_alunos', erros),
+            'erros': erros,
+        })
+
+    _validar_chaves(linhas)
+    validas = [linha for linha in linhas if not linha['erros']]
+    chaves_arquivo = {(linha['instituicao_id'], linha['competencia_id']) for linha in validas}
+
+    # Só para o relatório distinguir criadas de atualizadas
+    existentes = set(
+        DadosAlunos.objects.filter(
+            instituicao_id__in={instituicao_id for instituicao_id, _ in chaves_arquivo},
+            competencia_id__in={competencia_id for _, competencia_id in chaves_arquivo},
+        ).values_list('instituicao_id', 'competencia_id')
+    ) & chaves_arquivo
+
+    agora = timezone.now()
+    dados = [
+        DadosAlunos(
+            instituicao_id=linha['instituicao_id'],
+            competencia_id=linha['competencia_id'],
+            quantidade_alunos=linha['quantidade_alunos'],
+            data_informacao=agora,
+            usuario_informacao=usuario,
+        )
+        for linha in validas
+    ]
+
+    # Em lote os signals não disparam: as chaves são recalculadas uma vez no commit
+    with transaction.atomic(), dashboards_suspensos() as chaves:
+        DadosAlunos.objects.bulk_create(
+            dados,
+            batch_size=TAMANHO_LOTE,
+            update_conflicts=True,
+            unique_fields=['instituicao', 'competencia'],
+            update_fields=['quantidade_alunos', 'data_informacao', 'usuario_informacao'],
+        )
+        chaves.update(chaves_arquivo)
+
+    return _relatorio(linhas, len(dados) - len(existentes), len(existentes))
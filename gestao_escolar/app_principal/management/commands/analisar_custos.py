@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from app_principal.analitico import GRUPO_COMPARACAO, GRUPOS_COMPARACAO, analisar_competencias
+from app_principal.models import Competencia
+
+
+class Command(BaseCommand):
+    help = 'Recalcula custo por aluno, percentuais, z-score, quartil e eficiência dos dashboards a partir dos totais gravados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competencia', type=int, nargs='*', dest='competencias',
+                            help='Ids das competências (padrão: todas)')
+        parser.add_argument('--grupo', choices=list(GRUPOS_COMPARACAO), default=GRUPO_COMPARACAO,
+                            help=f'Grupo de comparação da eficiência (padrão: {GRUPO_COMPARACAO})')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        rede = analisar_competencias(options['competencias'] or None, options['grupo'])
+        duracao = time.perf_counter() - inicio
+
+        for competencia in Competencia.objects.filter(id__in=rede).order_by('ano', 'mes'):
+            estatisticas = rede[competencia.id]
+            self.stdout.write(
+                f"{competencia}: {estatisticas['instituicoes']} instituição(ões), "
+                f"média R$ {estatisticas['media']:.2f} (dp {estatisticas['desvio_padrao']:.2f}), "
+                f"P25 {estatisticas['percentil_25']:.2f} | mediana {estatisticas['mediana']:.2f} | "
+                f"P75 {estatisticas['percentil_75']:.2f} | P90 {estatisticas['percentil_90']:.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(rede)} competência(s) analisada(s) em {duracao:.2f}s'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app_principal.arquivamento import IDADE_ARQUIVAMENTO_MESES, arquivar_competencia, competencias_arquivaveis
+
+
+class Command(BaseCommand):
+    help = 'Move para o arquivo os lançamentos de competências fechadas mais antigas que o prazo configurado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=IDADE_ARQUIVAMENTO_MESES,
+                            help=f'Arquiva competências com mais que esta idade, em meses (padrão: {IDADE_ARQUIVAMENTO_MESES})')
+        parser.add_argument('--simular', action='store_true', help='Apenas lista as competências que seriam arquivadas')
+
+    def handle(self, *args, **options):
+        total = 0
+        for competencia in competencias_arquivaveis(options['meses']):
+            if options['simular']:
+                self.stdout.write(f'{competencia} seria arquivada')
+                continue
+            movidos = arquivar_competencia(competencia)
+            total += movidos
+            self.stdout.write(f'{competencia}: {movidos} lançamento(s) arquivado(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} lançamento(s) movido(s) para o arquivo'))
@@ -0,0 +1,123 @@
+import json
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from app_principal.models import (
+    Competencia, LancamentoGasto, FolhaPagamento, DadosAlunos, DashboardCustoAluno, ComboGasto,
+)
+
+
+def _contexto():
+    """Competência, instituição, responsável e combo usados como parâmetros das consultas"""
+    lancamento = LancamentoGasto.objects.select_related('instituicao').order_by('-competencia__ano', '-competencia__mes').first()
+    if lancamento is None:
+        raise CommandError("Sem lançamentos no banco: carregue dados antes de medir")
+    combo = ComboGasto.objects.filter(competencia_id=lancamento.competencia_id).first()
+    return {
+        'competencia_id': lancamento.competencia_id,
+        'instituicao_id': lancamento.instituicao_id,
+        'responsavel_id': lancamento.instituicao.responsavel_id,
+        'combo_id': combo.id if combo else 0,
+    }
+
+
+# Nome -> consulta, espelhando os acessos quentes de calculos.py, signals.py, views.py e admin.py
+CONSULTAS = {
+    # Motor de cálculo: somas por (instituição, competência) de uma competência inteira
+    'gastos_por_competencia': lambda c: LancamentoGasto.objects.filter(competencia_id=c['competencia_id'])
+        .order_by().values('instituicao_id', 'competencia_id').annotate(total=Sum('valor_total')),
+    'folha_por_competencia': lambda c: FolhaPagamento.objects.filter(competencia_id=c['competencia_id'])
+        .order_by().values('instituicao_id', 'competencia_id').annotate(total=Sum('valor_total')),
+    'alunos_por_competencia': lambda c: DadosAlunos.objects.filter(competencia_id=c['competencia_id'])
+        .values_list('instituicao_id', 'competencia_id', 'quantidade_alunos'),
+    # Recálculo de uma chave disparado pelos signals
+    'gastos_da_chave': lambda c: LancamentoGasto.objects.filter(
+        instituicao_id=c['instituicao_id'], competencia_id=c['competencia_id'],
+    ).order_by().values('instituicao_id', 'competencia_id').annotate(total=Sum('valor_total')),
+    'folha_da_chave': lambda c: FolhaPagamento.objects.filter(
+        instituicao_id=c['instituicao_id'], competencia_id=c['competencia_id'],
+    ).order_by().values('instituicao_id', 'competencia_id').annotate(total=Sum('valor_total')),
+    # Listagem de lançamentos de um combo (views.ComboLancamentoViewSet)
+    'lancamentos_do_combo': lambda c: LancamentoGasto.objects.filter(
+        combo_origem_id=c['combo_id'], instituicao__responsavel_id=c['responsavel_id'],
+    ).order_by().values('id', 'instituicao_id', 'item_gasto_id', 'valor_unitario'),
+    # Ranking do dashboard (admin)
+    'ranking_dashboards': lambda c: DashboardCustoAluno.objects.filter(competencia_id=c['competencia_id'])
+        .order_by('-custo_por_aluno').values('instituicao_id', 'custo_por_aluno')[:10],
+}
+
+
+def _plano(queryset):
+    """Linhas do EXPLAIN sem os ids de nó, para comparar entre execuções"""
+    return [re.sub(r'^(\d+\s+){3}', '', linha).strip() for linha in queryset.explain().splitlines() if linha.strip()]
+
+
+def _varreduras(plano):
+    """Tabelas lidas por inteiro (SCAN sem índice)"""
+    return {linha for linha in plano if linha.startswith('SCAN') and 'INDEX' not in linha}
+
+
+class Command(BaseCommand):
+    help = 'Mede as consultas mais frequentes (plano de execução e tempo) e compara com uma medição anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help='Execuções de cada consulta (padrão: 20)')
+        parser.add_argument('--saida', help='Grava a medição em JSON, para servir de base depois')
+        parser.add_argument('--comparar', help='JSON de uma medição anterior')
+        parser.add_argument('--tolerancia', type=float, default=1.5,
+                            help='Razão máxima entre a mediana atual e a da base (padrão: 1.5)')
+
+    def handle(self, *args, **options):
+        contexto = _contexto()
+        medicao = {}
+        for nome, consulta in CONSULTAS.items():
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                list(consulta(contexto))
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            plano = _plano(consulta(contexto))
+            medicao[nome] = {
+                'mediana_ms': round(statistics.median(tempos), 3),
+                'minimo_ms': round(min(tempos), 3),
+                'plano': plano,
+            }
+            self.stdout.write(f"{nome:<26} {medicao[nome]['mediana_ms']:>9.3f} ms")
+            for linha in plano:
+                self.stdout.write(f"    {linha}")
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump({'contexto': contexto, 'consultas': medicao}, arquivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Medição gravada em {options['saida']}")
+
+        if options['comparar']:
+            self._comparar(medicao, options['comparar'], options['tolerancia'])
+
+    def _comparar(self, medicao, caminho, tolerancia):
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                base = json.load(arquivo)['consultas']
+        except (OSError, ValueError, KeyError) as erro:
+            raise CommandError(f"Base inválida: {erro}")
+
+        regressoes = []
+        for nome, atual in medicao.items():
+            anterior = base.get(nome)
+            if anterior is None:
+                continue
+            novas_varreduras = _varreduras(atual['plano']) - _varreduras(anterior['plano'])
+            if novas_varreduras:
+                regressoes.append(f"{nome}: passou a varrer a tabela ({'; '.join(sorted(novas_varreduras))})")
+            # Abaixo de 1 ms a diferença é ruído
+            if atual['mediana_ms'] > anterior['mediana_ms'] * tolerancia and atual['mediana_ms'] - anterior['mediana_ms'] > 1:
+                regressoes.append(f"{nome}: {anterior['mediana_ms']:.3f} ms -> {atual['mediana_ms']:.3f} ms")
+
+        if regressoes:
+            for regressao in regressoes:
+                self.stdout.write(self.style.ERROR(regressao))
+            raise CommandError(f"{len(regressoes)} regressão(ões) em relação a {caminho}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Sem regressões em relação a {caminho}"))
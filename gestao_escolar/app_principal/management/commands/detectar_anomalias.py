@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from app_principal.anomalias import LIMITE_ESCORE, detectar_anomalias
+
+
+class Command(BaseCommand):
+    help = 'Detecta lançamentos com valor unitário fora da distribuição do item na competência'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competencia', type=int, nargs='*', dest='competencias',
+                            help='Ids das competências (padrão: todas)')
+
+    def handle(self, *args, **options):
+        resultado = detectar_anomalias(options['competencias'] or None)
+        self.stdout.write(
+            f"{resultado['lancamentos']} lançamento(s) de {resultado['itens']} distribuição(ões) item/competência "
+            f"analisados (|escore| >= {LIMITE_ESCORE})"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['anomalias']} anomalia(s) em {resultado['competencias']} competência(s)"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from app_principal.calculos import atualizar_series
+from app_principal.models import Competencia
+
+
+class Command(BaseCommand):
+    help = 'Gera a série temporal de custo por aluno a partir dos dashboards já calculados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competencia', type=int, nargs='*', dest='competencias',
+                            help='Ids das competências (padrão: todas)')
+
+    def handle(self, *args, **options):
+        competencias = Competencia.objects.order_by('ano', 'mes')
+        if options['competencias']:
+            competencias = competencias.filter(id__in=options['competencias'])
+
+        total = 0
+        for competencia in competencias:
+            # Uma competência por vez mantém a memória limitada em históricos longos
+            atualizar_series([competencia.id])
+            total += 1
+            self.stdout.write(f'Série de {competencia} gerada')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} competência(s) processada(s)'))
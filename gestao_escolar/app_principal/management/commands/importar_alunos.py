@@ -0,0 +1,48 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from app_principal.importacao import ErroArquivo, importar_alunos
+from app_principal.models import Competencia, CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Importa a quantidade de alunos (censo escolar) a partir de um CSV (codigo_inep, quantidade_alunos, competencia)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV')
+        parser.add_argument('--competencia', help='Competência de todas as linhas (AAAA-MM ou id); dispensa a coluna competencia')
+        parser.add_argument('--usuario', help='Username registrado como responsável pela informação')
+
+    def handle(self, *args, **options):
+        competencia = None
+        if options['competencia']:
+            encontrado = re.fullmatch(r'(\d{4})-(\d{1,2})', options['competencia'])
+            if encontrado:
+                filtro = {'ano': int(encontrado[1]), 'mes': int(encontrado[2])}
+            elif options['competencia'].isdigit():
+                filtro = {'pk': int(options['competencia'])}
+            else:
+                raise CommandError("Informe a competência como AAAA-MM ou pelo id")
+            competencia = Competencia.objects.filter(**filtro).first()
+            if competencia is None:
+                raise CommandError(f"Competência {options['competencia']} não encontrada")
+
+        usuario = None
+        if options['usuario']:
+            usuario = CustomUser.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"Usuário {options['usuario']} não encontrado")
+
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importar_alunos(arquivo, competencia=competencia, usuario=usuario)
+        except (OSError, ErroArquivo) as erro:
+            raise CommandError(str(erro))
+
+        for erro in relatorio['erros']:
+            self.stdout.write(self.style.ERROR(f"Linha {erro['linha']} ({erro['codigo_inep']}): {'; '.join(erro['erros'])}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {relatorio['total_linhas']} linha(s): {relatorio['criadas']} criada(s), "
+            f"{relatorio['atualizadas']} atualizada(s), {relatorio['com_erro']} com erro"
+        ))
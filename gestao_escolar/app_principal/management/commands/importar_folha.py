@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from app_principal.importacao import ErroArquivo, importar_folha
+from app_principal.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Importa a folha de pagamento de várias instituições a partir de um CSV (codigo_inep, competencia, total_salarios, total_encargos, observacao)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV')
+        parser.add_argument('--usuario', help='Username registrado como responsável pelo processamento')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            usuario = CustomUser.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"Usuário {options['usuario']} não encontrado")
+
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importar_folha(arquivo, usuario=usuario)
+        except (OSError, ErroArquivo) as erro:
+            raise CommandError(str(erro))
+
+        for erro in relatorio['erros']:
+            self.stdout.write(self.style.ERROR(f"Linha {erro['linha']} ({erro['codigo_inep']}): {'; '.join(erro['erros'])}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {relatorio['total_linhas']} linha(s): {relatorio['criadas']} criada(s), "
+            f"{relatorio['atualizadas']} atualizada(s), {relatorio['com_erro']} com erro"
+        ))
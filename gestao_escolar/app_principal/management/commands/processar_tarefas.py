@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from app_principal.tarefas import executar, identificador_worker, reservar_proxima
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano (pode rodar em vários processos ao mesmo tempo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Processa as tarefas pendentes e encerra, em vez de aguardar novas')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--max-tarefas', type=int, default=0,
+                            help='Encerra após processar esta quantidade de tarefas (0 = sem limite)')
+        parser.add_argument('--reprocessar-apos', type=int, default=60,
+                            help='Minutos após os quais uma tarefa em execução é considerada abandonada')
+
+    def handle(self, *args, **options):
+        worker = identificador_worker()
+        reprocessar_apos = timedelta(minutes=options['reprocessar_apos']) if options['reprocessar_apos'] else None
+        processadas = 0
+
+        self.stdout.write(f'Worker {worker} iniciado')
+
+        while True:
+            tarefa = reservar_proxima(worker, reprocessar_apos=reprocessar_apos)
+
+            if tarefa is None:
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Executando {tarefa}...')
+            if executar(tarefa):
+                self.stdout.write(self.style.SUCCESS(f'✅ Tarefa {tarefa.pk} concluída'))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ Tarefa {tarefa.pk} falhou'))
+
+            processadas += 1
+            if options['max_tarefas'] and processadas >= options['max_tarefas']:
+                break
+
+        self.stdout.write(f'{processadas} tarefa(s) processada(s)')
@@ -0,0 +1,449 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0003_remove_competencia_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=10, unique=True)),
+                ('nome', models.CharField(max_length=100)),
+                ('descricao', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ComboGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('descricao', models.TextField()),
+                ('ativo', models.BooleanField(default=True)),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DadosAlunos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_alunos', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('data_informacao', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DashboardCustoAluno',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(auto_now=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now_add=True)),
+                ('percentual_folha', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('percentual_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('eficiencia_custo', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+            ],
+            options={
+                'verbose_name': 'Dashboard - Custo por Aluno',
+                'verbose_name_plural': 'Dashboards - Custo por Aluno',
+                'ordering': ['-competencia__ano', '-competencia__mes', 'instituicao__nome'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FolhaPagamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_salarios', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('total_encargos', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('data_processamento', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Instituicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('ESCOLA', 'Escola'), ('SECRETARIA', 'Secretaria de Educação'), ('DIRETORIA', 'Diretoria Regional')], default='ESCOLA', max_length=20)),
+                ('endereco', models.TextField(blank=True, null=True)),
+                ('codigo_inep', models.CharField(blank=True, max_length=8, null=True, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ItemGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('descricao', models.TextField(blank=True, null=True)),
+                ('unidade_medida', models.CharField(default='R$', max_length=20)),
+                ('ativo', models.BooleanField(default=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.categoriagasto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LancamentoGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor_unitario', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('data_lancamento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('combo_origem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app_principal.combogasto')),
+            ],
+            options={
+                'verbose_name': 'Lançamento de Gasto',
+                'verbose_name_plural': 'Lançamentos de Gastos',
+                'ordering': ['-data_lancamento'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='combo',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='logacesso',
+            name='usuario',
+        ),
+        migrations.RemoveField(
+            model_name='setor',
+            name='municipio',
+        ),
+        migrations.RemoveField(
+            model_name='setor',
+            name='setor_pai',
+        ),
+        migrations.RemoveField(
+            model_name='setor',
+            name='tipo_setor',
+        ),
+        migrations.RemoveField(
+            model_name='setor',
+            name='usuario',
+        ),
+        migrations.RemoveField(
+            model_name='setorcombo',
+            name='combo',
+        ),
+        migrations.RemoveField(
+            model_name='setorcombo',
+            name='setor',
+        ),
+        migrations.RemoveField(
+            model_name='setorcomboitemcombo',
+            name='competencia',
+        ),
+        migrations.RemoveField(
+            model_name='setorcomboitemcombo',
+            name='item_combo',
+        ),
+        migrations.RemoveField(
+            model_name='setorcomboitemcombo',
+            name='setor',
+        ),
+        migrations.RemoveField(
+            model_name='setorcomboitemcombo',
+            name='setor_combo',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacao',
+            name='admin_responsavel',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacao',
+            name='municipio',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacao',
+            name='setor',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacao',
+            name='status',
+        ),
+        migrations.AlterModelOptions(
+            name='competencia',
+            options={'ordering': ['-ano', '-mes']},
+        ),
+        migrations.RenameField(
+            model_name='competencia',
+            old_name='status',
+            new_name='aberta',
+        ),
+        migrations.RenameField(
+            model_name='municipio',
+            old_name='nome_municipio',
+            new_name='nome',
+        ),
+        migrations.RenameField(
+            model_name='municipio',
+            old_name='unidade_federativa',
+            new_name='uf',
+        ),
+        migrations.RenameField(
+            model_name='unidadefederativa',
+            old_name='nome_unidade_federativa',
+            new_name='nome',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='filiacao_1',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='filiacao_2',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='perfil',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='role',
+        ),
+        migrations.RemoveField(
+            model_name='itemcombo',
+            name='descricao',
+        ),
+        migrations.RemoveField(
+            model_name='itemcombo',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='itemcombo',
+            name='tipo',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacaocadastro',
+            name='data_nascimento',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacaocadastro',
+            name='perfil_solicitado',
+        ),
+        migrations.RemoveField(
+            model_name='solicitacaocadastro',
+            name='setor_solicitado',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='ativo',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='cargo',
+            field=models.CharField(choices=[('ADMIN', 'Administrador'), ('GESTOR', 'Gestor'), ('RH', 'Recursos Humanos'), ('RESPONSAVEL', 'Responsável Financeiro')], default='RESPONSAVEL', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='data_cadastro',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='itemcombo',
+            name='valor_padrao',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='solicitacaocadastro',
+            name='cargo_solicitado',
+            field=models.CharField(choices=[('ADMIN', 'Administrador'), ('GESTOR', 'Gestor'), ('RH', 'Recursos Humanos'), ('RESPONSAVEL', 'Responsável Financeiro')], default='', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='solicitacaocadastro',
+            name='observacao',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='competencia',
+            name='ano',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='competencia',
+            name='mes',
+            field=models.PositiveIntegerField(choices=[(1, 'Janeiro'), (2, 'Fevereiro'), (3, 'Março'), (4, 'Abril'), (5, 'Maio'), (6, 'Junho'), (7, 'Julho'), (8, 'Agosto'), (9, 'Setembro'), (10, 'Outubro'), (11, 'Novembro'), (12, 'Dezembro')]),
+        ),
+        migrations.AlterField(
+            model_name='solicitacaocadastro',
+            name='admin_responsavel',
+            field=models.ForeignKey(blank=True, limit_choices_to={'cargo': 'ADMIN'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='solicitacoes_aprovadas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='solicitacaocadastro',
+            name='data_solicitacao',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='solicitacaocadastro',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('APROVADO', 'Aprovado'), ('REPROVADO', 'Reprovado')], default='PENDENTE', max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='competencia',
+            unique_together={('ano', 'mes')},
+        ),
+        migrations.DeleteModel(
+            name='Aluno',
+        ),
+        migrations.DeleteModel(
+            name='Item',
+        ),
+        migrations.DeleteModel(
+            name='LogAcesso',
+        ),
+        migrations.DeleteModel(
+            name='Perfil',
+        ),
+        migrations.DeleteModel(
+            name='Setor',
+        ),
+        migrations.DeleteModel(
+            name='SetorCombo',
+        ),
+        migrations.DeleteModel(
+            name='SetorComboItemCombo',
+        ),
+        migrations.DeleteModel(
+            name='Solicitacao',
+        ),
+        migrations.DeleteModel(
+            name='Status',
+        ),
+        migrations.DeleteModel(
+            name='TipoSetor',
+        ),
+        migrations.AddField(
+            model_name='lancamentogasto',
+            name='competencia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia'),
+        ),
+        migrations.AddField(
+            model_name='lancamentogasto',
+            name='instituicao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao'),
+        ),
+        migrations.AddField(
+            model_name='lancamentogasto',
+            name='item_gasto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.itemgasto'),
+        ),
+        migrations.AddField(
+            model_name='lancamentogasto',
+            name='usuario_lancamento',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='instituicao',
+            name='diretor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='instituicoes_dirigidas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='instituicao',
+            name='municipio',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.municipio'),
+        ),
+        migrations.AddField(
+            model_name='instituicao',
+            name='responsavel',
+            field=models.ForeignKey(blank=True, limit_choices_to={'cargo': 'RESPONSAVEL'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='instituicoes_responsavel', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='competencia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia'),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='instituicao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao'),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='usuario_processamento',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='competencia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia'),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='instituicao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao'),
+        ),
+        migrations.AddField(
+            model_name='dadosalunos',
+            name='competencia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia'),
+        ),
+        migrations.AddField(
+            model_name='dadosalunos',
+            name='instituicao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao'),
+        ),
+        migrations.AddField(
+            model_name='dadosalunos',
+            name='usuario_informacao',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='combogasto',
+            name='competencia',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia'),
+        ),
+        migrations.RemoveField(
+            model_name='competencia',
+            name='combo',
+        ),
+        migrations.RemoveField(
+            model_name='competencia',
+            name='periodo',
+        ),
+        migrations.AddField(
+            model_name='itemcombo',
+            name='item_gasto',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='app_principal.itemgasto'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='solicitacaocadastro',
+            name='instituicao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app_principal.instituicao'),
+        ),
+        migrations.AlterField(
+            model_name='itemcombo',
+            name='combo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='app_principal.combogasto'),
+        ),
+        migrations.DeleteModel(
+            name='Combo',
+        ),
+        migrations.AlterUniqueTogether(
+            name='lancamentogasto',
+            unique_together={('instituicao', 'competencia', 'item_gasto')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dashboardcustoaluno',
+            unique_together={('instituicao', 'competencia')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dadosalunos',
+            unique_together={('instituicao', 'competencia')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0005_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='custo_por_aluno_anterior',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='variacao_mensal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True),
+        ),
+    ]
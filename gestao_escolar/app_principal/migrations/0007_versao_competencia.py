@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0006_variacao_mensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competencia',
+            name='data_ultima_alteracao',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='competencia',
+            name='data_ultimo_calculo',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='competencia',
+            name='versao_calculada',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='competencia',
+            name='versao_dados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
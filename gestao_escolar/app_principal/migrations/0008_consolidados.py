@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0007_versao_competencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsolidadoUF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('quantidade_instituicoes', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('uf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.unidadefederativa')),
+            ],
+            options={
+                'verbose_name': 'Consolidado por UF',
+                'verbose_name_plural': 'Consolidados por UF',
+                'unique_together': {('uf', 'competencia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsolidadoTipoInstituicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('quantidade_instituicoes', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tipo', models.CharField(choices=[('ESCOLA', 'Escola'), ('SECRETARIA', 'Secretaria de Educação'), ('DIRETORIA', 'Diretoria Regional')], max_length=20)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+            ],
+            options={
+                'verbose_name': 'Consolidado por Tipo de Instituição',
+                'verbose_name_plural': 'Consolidados por Tipo de Instituição',
+                'unique_together': {('tipo', 'competencia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsolidadoMunicipio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('quantidade_instituicoes', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('municipio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.municipio')),
+            ],
+            options={
+                'verbose_name': 'Consolidado por Município',
+                'verbose_name_plural': 'Consolidados por Município',
+                'unique_together': {('municipio', 'competencia')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0008_consolidados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieTemporalCusto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel', models.CharField(choices=[('REDE', 'Rede'), ('MUNICIPIO', 'Município'), ('INSTITUICAO', 'Instituição')], max_length=20)),
+                ('referencia_id', models.PositiveIntegerField(default=0)),
+                ('periodo', models.PositiveIntegerField()),
+                ('quantidade_instituicoes', models.PositiveIntegerField(default=0)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('media_custo_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('media_ponderada', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('percentil_25', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('mediana', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('percentil_75', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('percentil_90', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+            ],
+            options={
+                'verbose_name': 'Série Temporal de Custo',
+                'verbose_name_plural': 'Séries Temporais de Custo',
+                'ordering': ['nivel', 'referencia_id', 'periodo'],
+                'unique_together': {('nivel', 'referencia_id', 'periodo')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0009_serie_temporal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoCadastro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveIntegerField(default=0)),
+                ('data_alteracao', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Versão dos Cadastros',
+                'verbose_name_plural': 'Versão dos Cadastros',
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0010_versao_cadastro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoCompetencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('quantidade_instituicoes', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantidade_lancamentos', models.PositiveIntegerField(default=0)),
+                ('versao_dados', models.PositiveIntegerField(default=0)),
+                ('competencia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fechamento', to='app_principal.competencia')),
+                ('usuario_fechamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Competência',
+                'verbose_name_plural': 'Fechamentos de Competência',
+            },
+        ),
+        migrations.CreateModel(
+            name='FechamentoInstituicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_gastos_operacionais', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_folha_pagamento', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('quantidade_alunos', models.PositiveIntegerField(default=0)),
+                ('quantidade_lancamentos', models.PositiveIntegerField(default=0)),
+                ('custo_por_aluno', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('fechamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instituicoes', to='app_principal.fechamentocompetencia')),
+                ('instituicao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao')),
+            ],
+            options={
+                'verbose_name': 'Fechamento por Instituição',
+                'verbose_name_plural': 'Fechamentos por Instituição',
+                'unique_together': {('instituicao', 'competencia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FechamentoCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('quantidade_lancamentos', models.PositiveIntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.categoriagasto')),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('fechamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='categorias', to='app_principal.fechamentocompetencia')),
+                ('instituicao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao')),
+            ],
+            options={
+                'verbose_name': 'Fechamento por Categoria',
+                'verbose_name_plural': 'Fechamentos por Categoria',
+                'unique_together': {('instituicao', 'competencia', 'categoria')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0011_fechamento_competencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fechamentocompetencia',
+            name='data_arquivamento',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LancamentoGastoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('valor_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('data_lancamento', models.DateTimeField()),
+                ('data_arquivamento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('combo_origem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app_principal.combogasto')),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('instituicao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao')),
+                ('item_gasto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.itemgasto')),
+                ('usuario_lancamento', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lançamento Arquivado',
+                'verbose_name_plural': 'Lançamentos Arquivados',
+                'ordering': ['-data_lancamento'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0012_arquivamento_lancamentos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dadosalunos',
+            index=models.Index(fields=['competencia', 'instituicao', 'quantidade_alunos'], name='app_princip_compete_a0afe7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dashboardcustoaluno',
+            index=models.Index(fields=['competencia', 'custo_por_aluno'], name='app_princip_compete_c8a917_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folhapagamento',
+            index=models.Index(fields=['competencia', 'instituicao', 'total_salarios', 'total_encargos'], name='app_princip_compete_6951e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentogasto',
+            index=models.Index(fields=['competencia', 'instituicao', 'valor_unitario'], name='app_princip_compete_a159d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentogasto',
+            index=models.Index(fields=['combo_origem', 'instituicao'], name='app_princip_combo_o_618b8f_idx'),
+        ),
+    ]
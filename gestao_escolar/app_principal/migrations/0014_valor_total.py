@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:25
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, Q
+from django.db.models.functions import Round
+
+
+def preencher_valor_total(apps, schema_editor):
+    """Preenche valor_total das linhas existentes: um UPDATE por tabela"""
+    for nome in ('LancamentoGasto', 'LancamentoGastoArquivado'):
+        apps.get_model('app_principal', nome).objects.update(valor_total=F('valor_unitario'))
+    # Arredondada como na restrição: no SQLite a soma é feita em ponto flutuante
+    apps.get_model('app_principal', 'FolhaPagamento').objects.update(
+        valor_total=Round(F('total_salarios') + F('total_encargos'), 2)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0013_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='folhapagamento',
+            options={'verbose_name': 'Folha de Pagamento', 'verbose_name_plural': 'Folhas de Pagamento'},
+        ),
+        migrations.RemoveIndex(
+            model_name='folhapagamento',
+            name='app_princip_compete_6951e5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='lancamentogasto',
+            name='app_princip_compete_a159d0_idx',
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='lancamentogasto',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=15, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='lancamentogastoarquivado',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_valor_total, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='folhapagamento',
+            index=models.Index(fields=['competencia', 'instituicao', 'valor_total'], name='app_princip_compete_13a8dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentogasto',
+            index=models.Index(fields=['competencia', 'instituicao', 'valor_total'], name='app_princip_compete_1facf5_idx'),
+        ),
+        # Depois do preenchimento: escritas que deixem valor_total divergente falham
+        migrations.AddConstraint(
+            model_name='lancamentogasto',
+            constraint=models.CheckConstraint(check=Q(valor_total=F('valor_unitario')), name='lancamento_valor_total_calculado'),
+        ),
+        migrations.AddConstraint(
+            model_name='lancamentogastoarquivado',
+            constraint=models.CheckConstraint(check=Q(valor_total=F('valor_unitario')), name='lancamento_arquivado_valor_total_calculado'),
+        ),
+        migrations.AddConstraint(
+            model_name='folhapagamento',
+            constraint=models.CheckConstraint(
+                check=Q(valor_total=Round(F('total_salarios') + F('total_encargos'), 2)),
+                name='folha_valor_total_calculado',
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0014_valor_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='quartil_custo',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, '1º quartil (até P25)'), (2, '2º quartil (P25-mediana)'), (3, '3º quartil (mediana-P75)'), (4, '4º quartil (acima de P75)')], null=True),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='zscore_custo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True),
+        ),
+    ]
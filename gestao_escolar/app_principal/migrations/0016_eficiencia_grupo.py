@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0015_estatisticas_rede'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='distancia_mediana',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='faixa_eficiencia',
+            field=models.CharField(blank=True, choices=[('alta', 'Alta'), ('media', 'Média'), ('baixa', 'Baixa')], max_length=5),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='grupo_comparacao',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='mediana_grupo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='percentil_grupo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='dashboardcustoaluno',
+            name='quantidade_grupo',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dashboardcustoaluno',
+            name='eficiencia_custo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+    ]
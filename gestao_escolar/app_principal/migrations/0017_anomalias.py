@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_principal', '0016_eficiencia_grupo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistribuicaoItemGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_lancamentos', models.PositiveIntegerField(default=0)),
+                ('mediana', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mad', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('percentil_5', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('percentil_25', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('percentil_75', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('percentil_95', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('data_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('item_gasto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.itemgasto')),
+            ],
+            options={
+                'verbose_name': 'Distribuição de Item de Gasto',
+                'verbose_name_plural': 'Distribuições de Itens de Gasto',
+                'unique_together': {('item_gasto', 'competencia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AnomaliaLancamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lancamento_id', models.BigIntegerField(unique=True)),
+                ('valor_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mediana', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('escore', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('razao_mediana', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('situacao', models.CharField(choices=[('PENDENTE', 'Pendente'), ('CONFIRMADA', 'Confirmada'), ('DESCARTADA', 'Descartada')], default='PENDENTE', max_length=20)),
+                ('data_deteccao', models.DateTimeField(default=django.utils.timezone.now)),
+                ('competencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.competencia')),
+                ('instituicao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.instituicao')),
+                ('item_gasto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_principal.itemgasto')),
+                ('usuario_revisao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Anomalia de Lançamento',
+                'verbose_name_plural': 'Anomalias de Lançamentos',
+                'ordering': ['-competencia__ano', '-competencia__mes', '-escore'],
+                'indexes': [models.Index(fields=['competencia', 'situacao', 'escore'], name='app_princip_compete_a4bcab_idx'), models.Index(fields=['item_gasto', 'competencia'], name='app_princip_item_ga_5fafcf_idx'), models.Index(fields=['instituicao', 'competencia'], name='app_princip_institu_c09cd8_idx')],
+            },
+        ),
+    ]
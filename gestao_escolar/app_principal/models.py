@@ -1,9 +1,26 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, Max, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest, Least, Round
+from django.db.models.lookups import GreaterThan
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+
+def limite_decimal(modelo, campo):
+    """
+    Maior valor absoluto que cabe no DecimalField: razões, variações e escores
+    não têm teto natural (o divisor pode ser um centavo) e são limitados a ele
+    """
+    field = modelo._meta.get_field(campo)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+def limitar(expressao, limite):
+    """Expressão SQL presa ao intervalo [-limite, limite]"""
+    return Least(Greatest(expressao, Value(-float(limite))), Value(float(limite)), output_field=FloatField())
+
 class UnidadeFederativa(models.Model):
     sigla = models.CharField(max_length=2, unique=True)
     nome = models.CharField(max_length=100)
@@ -84,6 +101,13 @@ class Competencia(models.Model):
     ano = models.PositiveIntegerField()
     mes = models.PositiveIntegerField(choices=MESES)
     aberta = models.BooleanField(default=True)
+
+    # Controle de desatualização: versao_dados sobe a cada escrita em lançamentos,
+    # folha ou alunos; versao_calculada guarda a versão usada no último recálculo
+    versao_dados = models.PositiveIntegerField(default=0, editable=False)
+    versao_calculada = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    data_ultima_alteracao = models.DateTimeField(null=True, blank=True, editable=False)
+    data_ultimo_calculo = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
         unique_together = ['ano', 'mes']
@@ -96,6 +120,93 @@ class Competencia(models.Model):
     def periodo(self):
         return f"{self.ano}-{self.mes:02d}"
 
+    @property
+    def desatualizada(self):
+        """Indica se houve alteração nos dados desde o último recálculo"""
+        return self.versao_calculada is None or self.versao_calculada < self.versao_dados
+
+    @classmethod
+    def filtro_desatualizadas(cls):
+        return Q(versao_calculada__isnull=True) | Q(versao_calculada__lt=F('versao_dados'))
+
+    @classmethod
+    def registrar_alteracao(cls, competencias):
+        """Incrementa a versão dos dados das competências alteradas"""
+        cls.objects.filter(id__in=competencias).update(
+            versao_dados=F('versao_dados') + 1,
+            data_ultima_alteracao=timezone.now(),
+        )
+
+    @classmethod
+    def registrar_calculo(cls, versoes):
+        """Marca as competências como calculadas na versão lida antes do recálculo"""
+        if not versoes:
+            return
+        cls.objects.filter(id__in=versoes).update(
+            versao_calculada=Case(
+                *[When(id=competencia_id, then=Value(versao)) for competencia_id, versao in versoes.items()],
+                output_field=models.PositiveIntegerField(),
+            ),
+            data_ultimo_calculo=timezone.now(),
+        )
+
+    @classmethod
+    def versao_geral(cls):
+        """
+        Retorna (versão, data da última modificação) do conjunto dos dashboards.
+        A versão muda a cada alteração em qualquer competência, a cada recálculo
+        completo e a cada alteração nos cadastros (nomes exibidos nos dashboards).
+        """
+        estado = cls.objects.aggregate(
+            quantidade=Count('id'),
+            versoes=Sum('versao_dados'),
+            ultima_alteracao=Max('data_ultima_alteracao'),
+            ultimo_calculo=Max('data_ultimo_calculo'),
+        )
+        versao_cadastro, alteracao_cadastro = VersaoCadastro.atual()
+        datas = [data for data in (estado['ultima_alteracao'], estado['ultimo_calculo'], alteracao_cadastro) if data]
+        ultima_modificacao = max(datas) if datas else None
+        versao = (
+            f"{estado['quantidade']}.{estado['versoes'] or 0}.{versao_cadastro}."
+            f"{ultima_modificacao.timestamp() if ultima_modificacao else 0}"
+        )
+        return versao, ultima_modificacao
+
+    @staticmethod
+    def mes_anterior(ano, mes):
+        """(ano, mes) do mês anterior, atravessando a virada do ano"""
+        return (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+
+    @staticmethod
+    def mes_seguinte(ano, mes):
+        """(ano, mes) do mês seguinte, atravessando a virada do ano"""
+        return (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+class VersaoCadastro(models.Model):
+    """
+    Contador (linha única) das alterações em instituições, municípios, UFs,
+    itens e categorias. Esses cadastros não mudam a versão das competências,
+    mas aparecem nos dashboards e relatórios: a versão entra nas chaves de cache.
+    """
+    versao = models.PositiveIntegerField(default=0)
+    data_alteracao = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Versão dos Cadastros"
+        verbose_name_plural = "Versão dos Cadastros"
+
+    @classmethod
+    def atual(cls):
+        """Retorna (versão, data da última alteração); (0, None) se nunca houve alteração"""
+        return cls.objects.filter(pk=1).values_list('versao', 'data_alteracao').first() or (0, None)
+
+    @classmethod
+    def registrar_alteracao(cls):
+        """Incrementa a versão, criando a linha na primeira alteração"""
+        agora = timezone.now()
+        if not cls.objects.filter(pk=1).update(versao=F('versao') + 1, data_alteracao=agora):
+            cls.objects.get_or_create(pk=1, defaults={'versao': 1, 'data_alteracao': agora})
+
 class ComboGasto(models.Model):
     nome = models.CharField(max_length=100)
     descricao = models.TextField()
@@ -129,13 +240,24 @@ class LancamentoGasto(models.Model):
     item_gasto = models.ForeignKey(ItemGasto, on_delete=models.CASCADE)
     combo_origem = models.ForeignKey(ComboGasto, on_delete=models.SET_NULL, null=True, blank=True)
     valor_unitario = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
-    valor_total = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(0)], editable=False)
+    valor_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, validators=[MinValueValidator(0)], editable=False)
     observacao = models.TextField(blank=True, null=True)
     data_lancamento = models.DateTimeField(default=timezone.now)
     usuario_lancamento = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
 
     class Meta:
         unique_together = ['instituicao', 'competencia', 'item_gasto']
+        indexes = [
+            # Cobre a soma por (instituição, competência) do motor de cálculo sem ler a tabela
+            models.Index(fields=['competencia', 'instituicao', 'valor_total']),
+            # Lançamentos de um combo nas instituições do responsável
+            models.Index(fields=['combo_origem', 'instituicao']),
+        ]
+        constraints = [
+            # valor_total é gravado pela aplicação (calcular_valor_total); update() ou
+            # bulk_update que mudem só o valor unitário falham em vez de divergir
+            models.CheckConstraint(check=Q(valor_total=F('valor_unitario')), name='lancamento_valor_total_calculado'),
+        ]
         verbose_name = "Lançamento de Gasto"
         verbose_name_plural = "Lançamentos de Gastos"
         ordering = ['-data_lancamento']
@@ -143,16 +265,13 @@ class LancamentoGasto(models.Model):
     def __str__(self):
         return f"{self.instituicao} - {self.item_gasto} - {self.competencia} - R$ {self.valor_total}"
 
+    def calcular_valor_total(self):
+        """Preenche valor_total (o próprio valor unitário, com 2 casas); chamar antes de bulk_create"""
+        self.valor_total = Decimal(self.valor_unitario).quantize(Decimal('0.01'))
+
     def save(self, *args, **kwargs):
         """Calcula automaticamente o valor_total antes de salvar"""
-        # Calcula o valor total
-        self.valor_total = self.valor_unitario * 1
-
-        self.valor_total = Decimal(self.valor_total)
-        
-        # Arredonda para 2 casas decimais
-        self.valor_total = self.valor_total.quantize(Decimal('0.01'))
-        
+        self.calcular_valor_total()
         super().save(*args, **kwargs)
 
     @property
@@ -176,31 +295,67 @@ class LancamentoGasto(models.Model):
         # Verifica se a instituição pertence ao usuário (se já tem usuario_lancamento)
         if self.usuario_lancamento and self.instituicao.responsavel != self.usuario_lancamento:
             raise ValidationError("Você só pode lançar gastos para suas próprias instituições.")
-        
-    @property
-    def valor_total(self):
-        """Calcula o valor total do lançamento"""
-        try:
-            return self.valor_unitario
-        except (TypeError, ValueError):
-            return Decimal('0.00')
+
+class LancamentoGastoArquivado(models.Model):
+    """
+    Lançamento de competência fechada há mais tempo que o prazo de
+    arquivamento, movido para fora da tabela de trabalho. Mantém o id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE)
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    item_gasto = models.ForeignKey(ItemGasto, on_delete=models.CASCADE)
+    combo_origem = models.ForeignKey(ComboGasto, on_delete=models.SET_NULL, null=True, blank=True)
+    valor_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    valor_total = models.DecimalField(max_digits=15, decimal_places=2)
+    observacao = models.TextField(blank=True, null=True)
+    data_lancamento = models.DateTimeField()
+    usuario_lancamento = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
+    data_arquivamento = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=Q(valor_total=F('valor_unitario')), name='lancamento_arquivado_valor_total_calculado'),
+        ]
+        verbose_name = "Lançamento Arquivado"
+        verbose_name_plural = "Lançamentos Arquivados"
+        ordering = ['-data_lancamento']
+
+    def __str__(self):
+        return f"{self.instituicao} - {self.item_gasto} - {self.competencia} (arquivado)"
 
 class FolhaPagamento(models.Model):
     instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE)
     competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
     total_salarios = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     total_encargos = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
+    valor_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, editable=False)
     observacao = models.TextField(blank=True, null=True)
     data_processamento = models.DateTimeField(default=timezone.now)
     usuario_processamento = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
 
-    @property
-    def valor_total(self):
-        """Calcula o valor total da folha"""
-        try:
-            return self.total_salarios + self.total_encargos
-        except (TypeError, ValueError):
-            return Decimal('0.00')
+    class Meta:
+        indexes = [
+            models.Index(fields=['competencia', 'instituicao', 'valor_total']),
+        ]
+        constraints = [
+            # Round: no SQLite a soma é feita em ponto flutuante (0,10 + 0,20 != 0,30)
+            models.CheckConstraint(
+                check=Q(valor_total=Round(F('total_salarios') + F('total_encargos'), 2)),
+                name='folha_valor_total_calculado',
+            ),
+        ]
+        verbose_name = "Folha de Pagamento"
+        verbose_name_plural = "Folhas de Pagamento"
+
+    def calcular_valor_total(self):
+        """Preenche valor_total (salários + encargos); chamar antes de bulk_create/bulk_update"""
+        self.valor_total = self.total_salarios + self.total_encargos
+
+    def save(self, *args, **kwargs):
+        """Calcula automaticamente o valor_total antes de salvar"""
+        self.calcular_valor_total()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Folha - {self.instituicao} - {self.competencia}"
@@ -214,6 +369,9 @@ class DadosAlunos(models.Model):
 
     class Meta:
         unique_together = ['instituicao', 'competencia']
+        indexes = [
+            models.Index(fields=['competencia', 'instituicao', 'quantidade_alunos']),
+        ]
 
     def __str__(self):
         return f"Alunos - {self.instituicao} - {self.competencia}"
@@ -232,54 +390,53 @@ class DashboardCustoAluno(models.Model):
     # Novos campos para métricas
     percentual_folha = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     percentual_operacionais = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    eficiencia_custo = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # 0-100 score
+    # 0-100: posição do custo por aluno entre as instituições do grupo de comparação
+    # (100 = a mais barata), calculada em lote por analitico.py
+    eficiencia_custo = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    # Comparação com o mês anterior (competência imediatamente anterior no calendário)
+    custo_por_aluno_anterior = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    variacao_mensal = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)  # %
+
+    # Posição do custo por aluno na rede da competência (analitico.py, a cada cálculo completo)
+    class Quartis(models.IntegerChoices):
+        PRIMEIRO = 1, "1º quartil (até P25)"
+        SEGUNDO = 2, "2º quartil (P25-mediana)"
+        TERCEIRO = 3, "3º quartil (mediana-P75)"
+        QUARTO = 4, "4º quartil (acima de P75)"
+
+    zscore_custo = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    quartil_custo = models.PositiveSmallIntegerField(choices=Quartis.choices, null=True, blank=True)
+
+    class FaixasEficiencia(models.TextChoices):
+        ALTA = "alta", "Alta"
+        MEDIA = "media", "Média"
+        BAIXA = "baixa", "Baixa"
+
+    LIMITE_EFICIENCIA_ALTA = 75  # quartil mais barato do grupo
+    LIMITE_EFICIENCIA_MEDIA = 25
+
+    faixa_eficiencia = models.CharField(max_length=5, choices=FaixasEficiencia.choices, blank=True)
+    # Grupo de comparação (rede, tipo ou município, dentro da competência) e sua distribuição
+    grupo_comparacao = models.CharField(max_length=10, blank=True)
+    quantidade_grupo = models.PositiveIntegerField(null=True, blank=True)
+    mediana_grupo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    percentil_grupo = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    distancia_mediana = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)  # %
 
     @classmethod
     def calcular_todos(cls):
         """Calcula dashboard para todas as competências abertas"""
-        competencias_abertas = Competencia.objects.filter(aberta=True)
-        total_criados = 0
-        
-        for competencia in competencias_abertas:
-            instituicoes = Instituicao.objects.all()
-            
-            for instituicao in instituicoes:
-                # Cálculos dos totais (mesma lógica do admin)
-                gastos_operacionais = LancamentoGasto.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
-                
-                folha_pagamento = FolhaPagamento.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
-                
-                dados_alunos = DadosAlunos.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).first()
-                
-                if dados_alunos:
-                    quantidade_alunos = dados_alunos.quantidade_alunos
-                    
-                    dashboard, created = cls.objects.update_or_create(
-                        instituicao=instituicao,
-                        competencia=competencia,
-                        defaults={
-                            'total_gastos_operacionais': gastos_operacionais,
-                            'total_folha_pagamento': folha_pagamento,
-                            'quantidade_alunos': quantidade_alunos
-                        }
-                    )
-                    
-                    if created:
-                        total_criados += 1
-        
-        return total_criados
+        from .calculos import recalcular_dashboards
+
+        return recalcular_dashboards(competencias=Competencia.objects.filter(aberta=True))
 
     class Meta:
         unique_together = ['instituicao', 'competencia']
+        indexes = [
+            # Rankings de custo por aluno dentro da competência (admin e API)
+            models.Index(fields=['competencia', 'custo_por_aluno']),
+        ]
         verbose_name = "Dashboard - Custo por Aluno"
         verbose_name_plural = "Dashboards - Custo por Aluno"
         ordering = ['-competencia__ano', '-competencia__mes', 'instituicao__nome']
@@ -288,59 +445,325 @@ class DashboardCustoAluno(models.Model):
         return f"Custo/Aluno - {self.instituicao} - {self.competencia}"
 
     def save(self, *args, **kwargs):
-        # Cálculos automáticos
+        self.calcular_metricas()
+        super().save(*args, **kwargs)
+
+    def calcular_metricas(self):
+        """Cálculos automáticos dos campos derivados a partir dos totais"""
         self.total_geral = self.total_gastos_operacionais + self.total_folha_pagamento
         
         if self.quantidade_alunos > 0:
             self.custo_por_aluno = self.total_geral / self.quantidade_alunos
             
             # Calcular percentuais
+            # (a eficiência depende das demais instituições: analitico.py)
             if self.total_geral > 0:
                 self.percentual_folha = (self.total_folha_pagamento / self.total_geral) * 100
                 self.percentual_operacionais = (self.total_gastos_operacionais / self.total_geral) * 100
-                
-                # Score de eficiência (quanto menor o custo por aluno, maior a eficiência)
-                # Baseado em média histórica - ajuste conforme necessidade
-                media_esperada = Decimal('500.00')  # Valor de referência
-                if self.custo_por_aluno <= media_esperada:
-                    self.eficiencia_custo = 100
-                else:
-                    self.eficiencia_custo = max(0, (media_esperada / self.custo_por_aluno) * 100)
-        
-        super().save(*args, **kwargs)
+
+            if self.custo_por_aluno_anterior:
+                variacao = (
+                    (self.custo_por_aluno - self.custo_por_aluno_anterior) / self.custo_por_aluno_anterior
+                ) * 100
+                limite = limite_decimal(DashboardCustoAluno, 'variacao_mensal')
+                self.variacao_mensal = max(-limite, min(variacao, limite))
+
+    @staticmethod
+    def expressoes_metricas(gastos, folha, alunos):
+        """
+        Monta as expressões SQL dos campos calculados a partir dos totais,
+        espelhando calcular_metricas() para ser usado em UPDATEs sem carregar a linha
+        """
+        total_geral = gastos + folha
+        total_real = Cast(total_geral, FloatField())
+        com_alunos = GreaterThan(alunos, 0)
+        # Arredondado como o valor gravado: a variação é calculada sobre ele
+        custo_por_aluno = Case(
+            When(com_alunos, then=Round(total_real / alunos, 2)),
+            default=Value(0),
+            output_field=models.DecimalField(),
+        )
+        custo_anterior = Cast(F('custo_por_aluno_anterior'), FloatField())
+
+        # Sem alunos ou sem gastos os percentuais voltam a 0, como no recálculo completo
+        return {
+            'total_gastos_operacionais': gastos,
+            'total_folha_pagamento': folha,
+            'quantidade_alunos': alunos,
+            'total_geral': total_geral,
+            'custo_por_aluno': custo_por_aluno,
+            'percentual_folha': Case(
+                When(com_alunos & GreaterThan(total_geral, 0),
+                     then=Round(Cast(folha, FloatField()) * 100 / total_real, 2)),
+                default=Value(0),
+                output_field=models.DecimalField(),
+            ),
+            'percentual_operacionais': Case(
+                When(com_alunos & GreaterThan(total_geral, 0),
+                     then=Round(Cast(gastos, FloatField()) * 100 / total_real, 2)),
+                default=Value(0),
+                output_field=models.DecimalField(),
+            ),
+            'variacao_mensal': Case(
+                When(GreaterThan(F('custo_por_aluno_anterior'), 0),
+                     then=Round(limitar(
+                         (Cast(custo_por_aluno, FloatField()) - custo_anterior) * 100 / custo_anterior,
+                         limite_decimal(DashboardCustoAluno, 'variacao_mensal'),
+                     ), 2)),
+                default=Value(None),
+                output_field=models.DecimalField(),
+            ),
+            'data_calculo': timezone.now(),
+        }
 
     @property
     def status_eficiencia(self):
-        """Retorna status baseado no score de eficiência"""
-        if self.eficiencia_custo >= 80:
-            return "alta"
-        elif self.eficiencia_custo >= 60:
-            return "media"
-        else:
-            return "baixa"
+        """Faixa gravada no último cálculo da eficiência da competência"""
+        return self.faixa_eficiencia or "sem dados"
 
-    @property
-    def variacao_mensal(self):
-        """Calcula variação em relação ao mês anterior"""
-        try:
-            mes_anterior = Competencia.objects.filter(
-                ano=self.competencia.ano,
-                mes=self.competencia.mes - 1
-            ).first()
-            
-            if mes_anterior:
-                anterior = DashboardCustoAluno.objects.filter(
-                    instituicao=self.instituicao,
-                    competencia=mes_anterior
-                ).first()
-                
-                if anterior and anterior.custo_por_aluno > 0:
-                    variacao = ((self.custo_por_aluno - anterior.custo_por_aluno) / anterior.custo_por_aluno) * 100
-                    return variacao
-        except:
-            pass
-        return None
-    
+class ConsolidadoCustoBase(models.Model):
+    """Totais dos dashboards de uma competência somados por um nível regional"""
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    total_gastos_operacionais = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    total_folha_pagamento = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    total_geral = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    quantidade_alunos = models.PositiveIntegerField(default=0)
+    quantidade_instituicoes = models.PositiveIntegerField(default=0)
+    custo_por_aluno = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # ponderado pelos alunos
+    data_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+    def calcular_metricas(self):
+        self.total_geral = self.total_gastos_operacionais + self.total_folha_pagamento
+        self.custo_por_aluno = self.total_geral / self.quantidade_alunos if self.quantidade_alunos > 0 else 0
+
+    @staticmethod
+    def expressoes_delta(gastos=0, folha=0, alunos=0):
+        """Expressões para somar a diferença de um dashboard aos totais consolidados"""
+        total_geral = F('total_geral') + Value(gastos) + Value(folha)
+        quantidade_alunos = F('quantidade_alunos') + Value(alunos)
+        return {
+            'total_gastos_operacionais': F('total_gastos_operacionais') + Value(gastos),
+            'total_folha_pagamento': F('total_folha_pagamento') + Value(folha),
+            'total_geral': total_geral,
+            'quantidade_alunos': quantidade_alunos,
+            'custo_por_aluno': Case(
+                When(GreaterThan(quantidade_alunos, 0),
+                     then=Cast(total_geral, FloatField()) / quantidade_alunos),
+                default=Value(0),
+                output_field=models.DecimalField(),
+            ),
+            'data_calculo': timezone.now(),
+        }
+
+class ConsolidadoMunicipio(ConsolidadoCustoBase):
+    municipio = models.ForeignKey(Municipio, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['municipio', 'competencia']
+        verbose_name = "Consolidado por Município"
+        verbose_name_plural = "Consolidados por Município"
+
+    def __str__(self):
+        return f"Custo/Aluno - {self.municipio} - {self.competencia}"
+
+class ConsolidadoUF(ConsolidadoCustoBase):
+    uf = models.ForeignKey(UnidadeFederativa, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ['uf', 'competencia']
+        verbose_name = "Consolidado por UF"
+        verbose_name_plural = "Consolidados por UF"
+
+    def __str__(self):
+        return f"Custo/Aluno - {self.uf.sigla} - {self.competencia}"
+
+class ConsolidadoTipoInstituicao(ConsolidadoCustoBase):
+    tipo = models.CharField(max_length=20, choices=Instituicao.TIPOS)
+
+    class Meta:
+        unique_together = ['tipo', 'competencia']
+        verbose_name = "Consolidado por Tipo de Instituição"
+        verbose_name_plural = "Consolidados por Tipo de Instituição"
+
+    def __str__(self):
+        return f"Custo/Aluno - {self.get_tipo_display()} - {self.competencia}"
+
+class SerieTemporalCusto(models.Model):
+    """Ponto mensal da série histórica do custo por aluno, regravado a cada cálculo completo da competência"""
+    NIVEIS = [
+        ('REDE', 'Rede'),
+        ('MUNICIPIO', 'Município'),
+        ('INSTITUICAO', 'Instituição'),
+    ]
+
+    nivel = models.CharField(max_length=20, choices=NIVEIS)
+    referencia_id = models.PositiveIntegerField(default=0)  # id do município ou da instituição; 0 para a rede
+    periodo = models.PositiveIntegerField()  # ano * 100 + mês, ex.: 202401
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    quantidade_instituicoes = models.PositiveIntegerField(default=0)
+    quantidade_alunos = models.PositiveIntegerField(default=0)
+    total_geral = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    media_custo_aluno = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    media_ponderada = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # total_geral / alunos
+    percentil_25 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    mediana = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    percentil_75 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    percentil_90 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    data_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # O índice da restrição atende as leituras de intervalo (nível, referência, período)
+        unique_together = ['nivel', 'referencia_id', 'periodo']
+        ordering = ['nivel', 'referencia_id', 'periodo']
+        verbose_name = "Série Temporal de Custo"
+        verbose_name_plural = "Séries Temporais de Custo"
+
+    def __str__(self):
+        return f"{self.get_nivel_display()} {self.referencia_id} - {self.periodo}"
+
+    @staticmethod
+    def periodo_de(ano, mes):
+        return ano * 100 + mes
+
+    @staticmethod
+    def percentil(ordenados, fracao):
+        """Percentil com interpolação linear sobre valores já ordenados"""
+        posicao = (len(ordenados) - 1) * Decimal(str(fracao))
+        inferior = int(posicao)
+        superior = min(inferior + 1, len(ordenados) - 1)
+        return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+    def calcular_metricas(self, custos):
+        """Preenche médias e percentis a partir dos custos por aluno do grupo"""
+        ordenados = sorted(custos)
+        if not ordenados:
+            return
+        self.media_custo_aluno = sum(ordenados) / len(ordenados)
+        self.media_ponderada = self.total_geral / self.quantidade_alunos if self.quantidade_alunos > 0 else 0
+        self.percentil_25 = self.percentil(ordenados, 0.25)
+        self.mediana = self.percentil(ordenados, 0.5)
+        self.percentil_75 = self.percentil(ordenados, 0.75)
+        self.percentil_90 = self.percentil(ordenados, 0.9)
+
+class FechamentoCompetencia(ConsolidadoCustoBase):
+    """
+    Retrato imutável de uma competência fechada, gravado após o recálculo
+    final. Enquanto existir, os relatórios da competência são lidos daqui e
+    não dos lançamentos; reabrir a competência apaga o retrato.
+    """
+    competencia = models.OneToOneField(Competencia, on_delete=models.CASCADE, related_name='fechamento')
+    quantidade_lancamentos = models.PositiveIntegerField(default=0)
+    versao_dados = models.PositiveIntegerField(default=0)  # versão da competência no fechamento
+    usuario_fechamento = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    data_arquivamento = models.DateTimeField(null=True, blank=True)  # lançamentos movidos para o arquivo
+
+    class Meta:
+        verbose_name = "Fechamento de Competência"
+        verbose_name_plural = "Fechamentos de Competência"
+
+    def __str__(self):
+        return f"Fechamento - {self.competencia}"
+
+class FechamentoInstituicao(models.Model):
+    fechamento = models.ForeignKey(FechamentoCompetencia, on_delete=models.CASCADE, related_name='instituicoes')
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE)
+    total_gastos_operacionais = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_folha_pagamento = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_geral = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    quantidade_alunos = models.PositiveIntegerField(default=0)
+    quantidade_lancamentos = models.PositiveIntegerField(default=0)
+    custo_por_aluno = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['instituicao', 'competencia']
+        verbose_name = "Fechamento por Instituição"
+        verbose_name_plural = "Fechamentos por Instituição"
+
+    def __str__(self):
+        return f"Fechamento - {self.instituicao} - {self.competencia}"
+
+class FechamentoCategoria(models.Model):
+    fechamento = models.ForeignKey(FechamentoCompetencia, on_delete=models.CASCADE, related_name='categorias')
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE)
+    categoria = models.ForeignKey(CategoriaGasto, on_delete=models.CASCADE)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    quantidade_lancamentos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['instituicao', 'competencia', 'categoria']
+        verbose_name = "Fechamento por Categoria"
+        verbose_name_plural = "Fechamentos por Categoria"
+
+    def __str__(self):
+        return f"Fechamento - {self.instituicao} - {self.categoria} - {self.competencia}"
+
+class DistribuicaoItemGasto(models.Model):
+    """
+    Distribuição do valor_unitario de um item de gasto entre as instituições
+    numa competência, gravada pela detecção de anomalias (anomalias.py)
+    """
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    item_gasto = models.ForeignKey(ItemGasto, on_delete=models.CASCADE)
+    quantidade_lancamentos = models.PositiveIntegerField(default=0)
+    mediana = models.DecimalField(max_digits=12, decimal_places=2)
+    mad = models.DecimalField(max_digits=12, decimal_places=2)  # desvio absoluto mediano
+    percentil_5 = models.DecimalField(max_digits=12, decimal_places=2)
+    percentil_25 = models.DecimalField(max_digits=12, decimal_places=2)
+    percentil_75 = models.DecimalField(max_digits=12, decimal_places=2)
+    percentil_95 = models.DecimalField(max_digits=12, decimal_places=2)
+    data_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['item_gasto', 'competencia']
+        verbose_name = "Distribuição de Item de Gasto"
+        verbose_name_plural = "Distribuições de Itens de Gasto"
+
+    def __str__(self):
+        return f"{self.item_gasto} - {self.competencia}"
+
+class AnomaliaLancamento(models.Model):
+    """
+    Lançamento cujo valor_unitario se afasta da mediana das demais
+    instituições para o mesmo item e competência. Guarda o id do lançamento
+    sem chave estrangeira: o achado continua válido depois do arquivamento,
+    que mantém o id. A situação é do auditor e não muda numa nova detecção.
+    """
+    SITUACOES = [
+        ('PENDENTE', 'Pendente'),
+        ('CONFIRMADA', 'Confirmada'),
+        ('DESCARTADA', 'Descartada'),
+    ]
+
+    lancamento_id = models.BigIntegerField(unique=True)
+    competencia = models.ForeignKey(Competencia, on_delete=models.CASCADE)
+    item_gasto = models.ForeignKey(ItemGasto, on_delete=models.CASCADE)
+    instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE)
+    valor_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    mediana = models.DecimalField(max_digits=12, decimal_places=2)  # do item na competência, na detecção
+    escore = models.DecimalField(max_digits=9, decimal_places=2)  # z-score robusto: 0,6745 * (valor - mediana) / MAD
+    razao_mediana = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)  # valor / mediana
+    situacao = models.CharField(max_length=20, choices=SITUACOES, default='PENDENTE')
+    usuario_revisao = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    data_deteccao = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Anomalias do mês, por situação, das mais extremas às menores (admin e API)
+            models.Index(fields=['competencia', 'situacao', 'escore']),
+            models.Index(fields=['item_gasto', 'competencia']),
+            models.Index(fields=['instituicao', 'competencia']),
+        ]
+        verbose_name = "Anomalia de Lançamento"
+        verbose_name_plural = "Anomalias de Lançamentos"
+        ordering = ['-competencia__ano', '-competencia__mes', '-escore']
+
+    def __str__(self):
+        return f"{self.instituicao} - {self.item_gasto} - {self.competencia} (escore {self.escore})"
 
 class SolicitacaoCadastro(models.Model):
     STATUS_CHOICES = [
@@ -363,4 +786,38 @@ class SolicitacaoCadastro(models.Model):
     observacao = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        return f"Solicitação - {self.nome} ({self.get_cargo_solicitado_display()})"
\ No newline at end of file
+        return f"Solicitação - {self.nome} ({self.get_cargo_solicitado_display()})"
+
+class Tarefa(models.Model):
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Em execução'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+    progresso = models.PositiveSmallIntegerField(default=0)  # 0-100
+    resultado = models.JSONField(blank=True, null=True)
+    erro = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    usuario = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    data_criacao = models.DateTimeField(default=timezone.now)
+    data_inicio = models.DateTimeField(blank=True, null=True)
+    data_fim = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ['-data_criacao']
+        indexes = [models.Index(fields=['status', 'data_criacao'])]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_status_display()})"
+
+    def atualizar_progresso(self, progresso):
+        """Grava o progresso (0-100) sem tocar nos demais campos"""
+        self.progresso = max(0, min(100, int(progresso)))
+        Tarefa.objects.filter(pk=self.pk).update(progresso=self.progresso)
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoCursor(CursorPagination):
+    """
+    Paginação por cursor (keyset): cada página é um WHERE id < último id visto
+    com LIMIT, então o custo não cresce com a posição na tabela.
+    O cliente segue os links next/previous da resposta.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'tamanho'
+    max_page_size = 1000
@@ -0,0 +1,203 @@
+import hashlib
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import (
+    Competencia, LancamentoGasto, LancamentoGastoArquivado, FolhaPagamento, DadosAlunos,
+    FechamentoInstituicao, FechamentoCategoria, VersaoCadastro,
+)
+
+# Segundos que um relatório de competências abertas fica em cache. A chave já
+# inclui as versões dos dados; o prazo só limita a vida de entradas órfãs.
+TEMPO_CACHE_RELATORIOS = 60 * 60
+
+# Dimensão -> ([(coluna do resultado, caminho a partir do fato)], fatos que a possuem).
+# None: todos os fatos têm instituição e competência.
+DIMENSOES = {
+    'instituicao': ([('instituicao_id', 'instituicao_id'), ('instituicao', 'instituicao__nome')], None),
+    'municipio': ([('municipio_id', 'instituicao__municipio_id'), ('municipio', 'instituicao__municipio__nome')], None),
+    'uf': ([('uf', 'instituicao__municipio__uf__sigla')], None),
+    'tipo': ([('tipo', 'instituicao__tipo')], None),
+    'ano': ([('ano', 'competencia__ano')], None),
+    'competencia': ([('competencia_id', 'competencia_id'), ('ano', 'competencia__ano'), ('mes', 'competencia__mes')], None),
+    'categoria': ([('categoria', 'item_gasto__categoria__codigo'), ('categoria_nome', 'item_gasto__categoria__nome')], {'gastos'}),
+    'item_gasto': ([('item_gasto_id', 'item_gasto_id'), ('item_gasto', 'item_gasto__nome')], {'gastos'}),
+}
+
+# Fato -> (modelo, agregações calculadas no GROUP BY)
+FATOS = {
+    'gastos': (LancamentoGasto, {
+        'total_gastos_operacionais': Sum('valor_total'),
+        'quantidade_lancamentos': Count('id'),
+    }),
+    'folha': (FolhaPagamento, {
+        'total_folha_pagamento': Sum('valor_total'),
+    }),
+    # Alunos são um estoque mensal: somar competências diferentes não faz
+    # sentido, então guardamos a soma e o número de competências do grupo
+    'alunos': (DadosAlunos, {
+        'soma_alunos': Sum('quantidade_alunos'),
+        'competencias_alunos': Count('competencia', distinct=True),
+    }),
+}
+
+# Competências fechadas são lidas do retrato do fechamento:
+# fato -> (modelo, agregações, filtro das linhas que contam)
+FATOS_FECHADOS = {
+    'gastos': (FechamentoCategoria, {
+        'total_gastos_operacionais': Sum('total'),
+        'quantidade_lancamentos': Sum('quantidade_lancamentos'),
+    }, Q()),
+    'folha': (FechamentoInstituicao, {
+        'total_folha_pagamento': Sum('total_folha_pagamento'),
+    }, Q(total_folha_pagamento__gt=0)),
+    'alunos': (FechamentoInstituicao, {
+        'soma_alunos': Sum('quantidade_alunos'),
+        'competencias_alunos': Count('competencia', distinct=True),
+    }, Q(quantidade_alunos__gt=0)),
+}
+
+# Caminhos que mudam no retrato; item de gasto não é guardado nele
+CAMINHOS_FECHADOS = {
+    'item_gasto__categoria__codigo': 'categoria__codigo',
+    'item_gasto__categoria__nome': 'categoria__nome',
+}
+SEM_RETRATO = {'item_gasto_id', 'item_gasto__nome'}
+
+# Medida -> fatos de que depende
+MEDIDAS = {
+    'total_gastos_operacionais': ('gastos',),
+    'quantidade_lancamentos': ('gastos',),
+    'total_folha_pagamento': ('folha',),
+    'total_geral': ('gastos', 'folha'),
+    'quantidade_alunos': ('alunos',),
+    'custo_por_aluno': ('gastos', 'folha', 'alunos'),
+}
+
+MEDIDAS_PADRAO = ['total_gastos_operacionais', 'total_folha_pagamento', 'total_geral', 'quantidade_alunos', 'custo_por_aluno']
+
+
+def medidas_incompativeis(dimensoes, medidas):
+    """Medidas que dependem de um fato sem alguma das dimensões pedidas (ex.: folha por categoria)"""
+    return [
+        medida for medida in medidas
+        if any(
+            DIMENSOES[dimensao][1] is not None and fato not in DIMENSOES[dimensao][1]
+            for fato in MEDIDAS[medida] for dimensao in dimensoes
+        )
+    ]
+
+
+def _colunas(dimensoes):
+    """Colunas do resultado, sem repetir as compartilhadas (ano em 'ano' e 'competencia')"""
+    colunas = {}
+    for dimensao in dimensoes:
+        for coluna, caminho in DIMENSOES[dimensao][0]:
+            colunas.setdefault(coluna, caminho)
+    return colunas
+
+
+def _finalizar(linha, medidas):
+    gastos = linha.pop('total_gastos_operacionais', None) or Decimal('0.00')
+    folha = linha.pop('total_folha_pagamento', None) or Decimal('0.00')
+    lancamentos = linha.pop('quantidade_lancamentos', None) or 0
+    soma_alunos = linha.pop('soma_alunos', None) or 0
+    competencias = linha.pop('competencias_alunos', None) or 0
+
+    # Média mensal de alunos no período; numa única competência é a própria soma
+    alunos = Decimal(soma_alunos) / competencias if competencias else Decimal(0)
+    total_geral = gastos + folha
+    valores = {
+        'total_gastos_operacionais': gastos,
+        'quantidade_lancamentos': lancamentos,
+        'total_folha_pagamento': folha,
+        'total_geral': total_geral,
+        'quantidade_alunos': int(alunos.to_integral_value()),
+        'custo_por_aluno': (total_geral / alunos).quantize(Decimal('0.01')) if alunos else Decimal('0.00'),
+    }
+    linha.update((medida, valores[medida]) for medida in medidas)
+    return linha
+
+
+def _agregar(consulta, caminhos, agregacoes):
+    if caminhos:
+        # order_by() limpa o ordering do Meta, que entraria no GROUP BY
+        return consulta.order_by().values(*caminhos).annotate(**agregacoes)
+    return [consulta.aggregate(**agregacoes)]
+
+
+def gerar_relatorio(filtros, dimensoes=(), medidas=MEDIDAS_PADRAO):
+    """
+    Agrega as medidas pelas dimensões pedidas. Cada fato envolvido (gastos,
+    folha, alunos) vira um SELECT ... GROUP BY sobre os dados brutos das
+    competências sem fechamento e outro sobre o retrato das fechadas; os
+    resultados são combinados em memória pela chave das dimensões. Retorna
+    as linhas já ordenadas pelas dimensões.
+    """
+    colunas = _colunas(dimensoes)
+    fatos = {fato for medida in medidas for fato in MEDIDAS[medida]}
+    usar_retrato = not SEM_RETRATO & set(colunas.values())
+
+    consultas = []
+    for fato in sorted(fatos):
+        modelo, agregacoes = FATOS[fato]
+        brutos = modelo.objects.filter(filtros)
+        if usar_retrato:
+            brutos = brutos.filter(competencia__fechamento__isnull=True)
+            modelo_fechado, agregacoes_fechadas, condicao = FATOS_FECHADOS[fato]
+            caminhos = [CAMINHOS_FECHADOS.get(caminho, caminho) for caminho in colunas.values()]
+            consultas.append((modelo_fechado.objects.filter(filtros, condicao), caminhos, agregacoes_fechadas))
+        elif fato == 'gastos':
+            # Por item de gasto só os lançamentos servem, inclusive os arquivados
+            consultas.append((LancamentoGastoArquivado.objects.filter(filtros), list(colunas.values()), agregacoes))
+        consultas.append((brutos, list(colunas.values()), agregacoes))
+
+    linhas = {}
+    for consulta, caminhos, agregacoes in consultas:
+        for registro in _agregar(consulta, caminhos, agregacoes):
+            chave = tuple(registro[caminho] for caminho in caminhos)
+            linha = linhas.setdefault(chave, dict(zip(colunas, chave)))
+            # Bruto e retrato cobrem competências diferentes: as parciais se somam
+            for nome in agregacoes:
+                if registro[nome] is not None:
+                    linha[nome] = linha.get(nome, 0) + registro[nome]
+
+    ordenadas = sorted(linhas.items(), key=lambda item: [(valor is None, valor) for valor in item[0]])
+    return [_finalizar(linha, medidas) for _, linha in ordenadas]
+
+
+def relatorio_em_cache(escopo, parametros, dimensoes=(), medidas=MEDIDAS_PADRAO, filtros=Q()):
+    """
+    Retorna {'linhas', 'totais'} do cache ou gera e guarda. A chave é o pedido
+    normalizado mais a versão dos dados das competências que os filtros
+    alcançam (uma consulta em Competencia) e a versão dos cadastros: uma
+    escrita muda a chave em todos os processos e as entradas antigas expiram.
+    Relatórios só de competências fechadas ficam no cache sem prazo.
+    """
+    competencias = Competencia.objects.all()
+    if parametros.get('competencia_id'):
+        competencias = competencias.filter(id=parametros['competencia_id'])
+    if parametros.get('ano'):
+        competencias = competencias.filter(ano=parametros['ano'])
+    assinatura = tuple(competencias.order_by('id').values_list('id', 'versao_dados', 'aberta'))
+
+    pedido = (
+        escopo,
+        tuple(sorted((nome, valor) for nome, valor in parametros.items() if valor)),
+        tuple(dimensoes),
+        tuple(medidas),
+        assinatura,
+        VersaoCadastro.atual()[0],
+    )
+    chave = 'relatorio:' + hashlib.md5(repr(pedido).encode()).hexdigest()
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = {
+            'linhas': gerar_relatorio(filtros, dimensoes, medidas) if dimensoes else None,
+            'totais': gerar_relatorio(filtros, medidas=medidas)[0],
+        }
+        fechado = bool(assinatura) and not any(aberta for _, _, aberta in assinatura)
+        cache.set(chave, resultado, None if fechado else TEMPO_CACHE_RELATORIOS)
+    return resultado
@@ -1,7 +1,23 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
 from .models import *
+from .calculos import TAMANHO_LOTE
+from .relatorios import DIMENSOES, MEDIDAS, MEDIDAS_PADRAO, medidas_incompativeis
+from .signals import dashboards_suspensos
+
+class CamposDinamicosMixin:
+    """Permite ao cliente escolher os campos da resposta com ?fields=campo1,campo2"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        campos = request.query_params.get('fields') if request else None
+        if campos:
+            solicitados = {campo.strip() for campo in campos.split(',')}
+            for campo in set(self.fields) - solicitados:
+                self.fields.pop(campo)
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
@@ -25,7 +41,7 @@ class LoginSerializer(serializers.Serializer):
 
         return data
 
-class InstituicaoSerializer(serializers.ModelSerializer):
+class InstituicaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     municipio_nome = serializers.CharField(source='municipio.nome', read_only=True)
     uf_sigla = serializers.CharField(source='municipio.uf.sigla', read_only=True)
     
@@ -127,8 +143,10 @@ class LancamentoComboSerializer(serializers.ModelSerializer):
 class LancamentoComboLoteSerializer(serializers.Serializer):
     instituicao = serializers.PrimaryKeyRelatedField(
         queryset=Instituicao.objects.all(),
-        required=True
+        required=False
     )
+    # Lote: lista de ids ou "todas" (todas as instituições do responsável)
+    instituicoes = serializers.JSONField(required=False)
     observacao_geral = serializers.CharField(required=False, allow_blank=True, default="")
     itens = serializers.ListField(
         child=serializers.DictField(),
@@ -137,85 +155,142 @@ class LancamentoComboLoteSerializer(serializers.Serializer):
     
     def validate_instituicao(self, value):
         user = self.context['request'].user
-        if not Instituicao.objects.filter(id=value.id, responsavel=user).exists():
+        if value.responsavel_id != user.id:
             raise serializers.ValidationError("Você não tem permissão para esta instituição")
         return value
     
+    def validate_instituicoes(self, value):
+        if value == 'todas':
+            return value
+        if not isinstance(value, list) or not value or not all(isinstance(id_, int) for id_ in value):
+            raise serializers.ValidationError('Informe uma lista de ids de instituições ou "todas"')
+        return value
+    
     def validate_itens(self, value):
         if not value:
             raise serializers.ValidationError("Pelo menos um item deve ser informado")
         
-        for item in value:
-            required_fields = ['item_gasto_id', 'valor_unitario']
-            for field in required_fields:
+        # Os lançamentos são gravados com bulk_create (sem full_clean) em todas as
+        # instituições do lote: o valor é validado aqui com as regras do modelo
+        campos = {
+            'item_gasto_id': serializers.IntegerField(),
+            'valor_unitario': serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0),
+        }
+        for posicao, item in enumerate(value, start=1):
+            for field, campo in campos.items():
                 if field not in item:
                     raise serializers.ValidationError(f"Campo '{field}' é obrigatório para cada item")
-            
-            # Validar tipos
-            try:
-                float(item['valor_unitario'])
-            except (TypeError, ValueError):
-                raise serializers.ValidationError("Quantidade e valor_unitario devem ser números válidos")
+                try:
+                    item[field] = campo.run_validation(item[field])
+                except serializers.ValidationError as erro:
+                    raise serializers.ValidationError(f"Item {posicao}, {field}: {' '.join(erro.detail)}")
         
         return value
     
+    def validate(self, data):
+        if ('instituicao' in data) == ('instituicoes' in data):
+            raise serializers.ValidationError("Informe 'instituicao' ou 'instituicoes'")
+        
+        if 'instituicao' in data:
+            data['instituicoes'] = [data.pop('instituicao')]
+            return data
+        
+        # Resolve e valida todas as instituições do lote em uma consulta
+        permitidas = Instituicao.objects.filter(responsavel=self.context['request'].user).order_by('nome')
+        if data['instituicoes'] == 'todas':
+            instituicoes = list(permitidas)
+            if not instituicoes:
+                raise serializers.ValidationError({'instituicoes': "Você não é responsável por nenhuma instituição"})
+        else:
+            instituicoes = list(permitidas.filter(id__in=data['instituicoes']))
+            sem_permissao = set(data['instituicoes']) - {instituicao.id for instituicao in instituicoes}
+            if sem_permissao:
+                raise serializers.ValidationError({
+                    'instituicoes': f"Você não tem permissão para as instituições {sorted(sem_permissao)}"
+                })
+        data['instituicoes'] = instituicoes
+        return data
+    
     def create(self, validated_data):
         combo_id = self.context['combo_id']
         user = self.context['request'].user
         
         try:
-            combo = ComboGasto.objects.get(id=combo_id)
-            instituicao = validated_data['instituicao']
-            observacao_geral = validated_data.get('observacao_geral', '')
-            
-            lancamentos_criados = []
-            itens_combo_ids = set(combo.itens.values_list('item_gasto_id', flat=True))
-            
-            for item_data in validated_data['itens']:
-                item_gasto_id = item_data['item_gasto_id']
-                valor_unitario = item_data['valor_unitario']
-                observacao_item = item_data.get('observacao', '')
-                
-                # Verificar se o item pertence ao combo
-                if item_gasto_id not in itens_combo_ids:
-                    continue
-                
-                # Verificar se já existe lançamento
-                if LancamentoGasto.objects.filter(
-                    instituicao=instituicao,
-                    competencia=combo.competencia,
-                    item_gasto_id=item_gasto_id
-                ).exists():
+            combo = ComboGasto.objects.select_related('competencia').get(id=combo_id)
+        except ComboGasto.DoesNotExist:
+            raise serializers.ValidationError("Combo não encontrado")
+        
+        instituicoes = validated_data['instituicoes']
+        observacao_geral = validated_data.get('observacao_geral', '')
+        itens_combo_ids = set(combo.itens.values_list('item_gasto_id', flat=True))
+        
+        # Itens que pertencem ao combo (o primeiro vence se o item vier repetido)
+        itens = {}
+        for item_data in validated_data['itens']:
+            if item_data['item_gasto_id'] in itens_combo_ids:
+                itens.setdefault(item_data['item_gasto_id'], item_data)
+        
+        # Todos os pares (instituição, item) já lançados, em uma consulta
+        existentes = set(
+            LancamentoGasto.objects.filter(
+                competencia=combo.competencia,
+                instituicao__in=instituicoes,
+                item_gasto_id__in=itens
+            ).values_list('instituicao_id', 'item_gasto_id')
+        )
+        
+        novos = []
+        resumo = []
+        for instituicao in instituicoes:
+            criados = 0
+            for item_gasto_id, item_data in itens.items():
+                if (instituicao.id, item_gasto_id) in existentes:
                     continue
                 
                 # Criar observação combinada
                 observacao_final = f"Combo: {combo.nome}"
                 if observacao_geral:
                     observacao_final += f" | {observacao_geral}"
-                if observacao_item:
-                    observacao_final += f" | {observacao_item}"
+                if item_data.get('observacao'):
+                    observacao_final += f" | {item_data['observacao']}"
                 
-                # Criar lançamento
-                lancamento = LancamentoGasto.objects.create(
+                lancamento = LancamentoGasto(
                     instituicao=instituicao,
                     competencia=combo.competencia,
                     item_gasto_id=item_gasto_id,
                     combo_origem=combo,
-                    valor_unitario=valor_unitario,
+                    valor_unitario=item_data['valor_unitario'],
                     observacao=observacao_final,
                     usuario_lancamento=user
                 )
-                lancamentos_criados.append(lancamento)
+                # bulk_create não chama save()
+                lancamento.calcular_valor_total()
+                novos.append(lancamento)
+                criados += 1
             
-            return {
-                'lancamentos_criados': lancamentos_criados,
-                'total_criado': len(lancamentos_criados),
-                'combo': combo.nome,
-                'competencia': str(combo.competencia)
-            }
-            
-        except ComboGasto.DoesNotExist:
-            raise serializers.ValidationError("Combo não encontrado")
+            resumo.append({
+                'instituicao_id': instituicao.id,
+                'instituicao_nome': instituicao.nome,
+                'criados': criados,
+                'ignorados': len(itens) - criados,
+            })
+        
+        # bulk_create não dispara signals: as chaves afetadas são recalculadas uma vez no commit
+        with transaction.atomic(), dashboards_suspensos() as chaves:
+            lancamentos_criados = LancamentoGasto.objects.bulk_create(novos, batch_size=TAMANHO_LOTE)
+            chaves.update((lancamento.instituicao_id, combo.competencia_id) for lancamento in lancamentos_criados)
+        
+        return {
+            'lancamentos_criados': lancamentos_criados,
+            'total_criado': len(lancamentos_criados),
+            'combo': combo.nome,
+            'competencia': str(combo.competencia),
+            'resumo_instituicoes': resumo,
+            'itens_fora_do_combo': [
+                item_data['item_gasto_id'] for item_data in validated_data['itens']
+                if item_data['item_gasto_id'] not in itens_combo_ids
+            ],
+        }
         
 class ComboLancamentoSerializer(serializers.ModelSerializer):
     itens_combo = ItemComboSerializer(many=True, read_only=True, source='itens')
@@ -249,7 +324,7 @@ class FolhaPagamentoCreateSerializer(serializers.ModelSerializer):
         validated_data['usuario_processamento'] = self.context['request'].user
         return super().create(validated_data)
 
-class FolhaPagamentoSerializer(serializers.ModelSerializer):
+class FolhaPagamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     instituicao_nome = serializers.CharField(source='instituicao.nome', read_only=True)
     competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
     valor_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -277,7 +352,7 @@ class DadosAlunosCreateSerializer(serializers.ModelSerializer):
         validated_data['usuario_informacao'] = self.context['request'].user
         return super().create(validated_data)
 
-class DadosAlunosSerializer(serializers.ModelSerializer):
+class DadosAlunosSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     instituicao_nome = serializers.CharField(source='instituicao.nome', read_only=True)
     competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
     
@@ -286,7 +361,7 @@ class DadosAlunosSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # ========== SERIALIZERS PARA DASHBOARD ==========
-class DashboardCustoAlunoSerializer(serializers.ModelSerializer):
+class DashboardCustoAlunoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     instituicao_nome = serializers.CharField(source='instituicao.nome', read_only=True)
     competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
     municipio_nome = serializers.CharField(source='instituicao.municipio.nome', read_only=True)
@@ -296,6 +371,73 @@ class DashboardCustoAlunoSerializer(serializers.ModelSerializer):
         model = DashboardCustoAluno
         fields = '__all__'
 
+# ========== SERIALIZERS PARA CONSOLIDADOS REGIONAIS ==========
+class ConsolidadoMunicipioSerializer(serializers.ModelSerializer):
+    municipio_nome = serializers.CharField(source='municipio.nome', read_only=True)
+    uf_sigla = serializers.CharField(source='municipio.uf.sigla', read_only=True)
+    competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
+    
+    class Meta:
+        model = ConsolidadoMunicipio
+        fields = '__all__'
+
+class ConsolidadoUFSerializer(serializers.ModelSerializer):
+    uf_sigla = serializers.CharField(source='uf.sigla', read_only=True)
+    uf_nome = serializers.CharField(source='uf.nome', read_only=True)
+    competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
+    
+    class Meta:
+        model = ConsolidadoUF
+        fields = '__all__'
+
+class ConsolidadoTipoInstituicaoSerializer(serializers.ModelSerializer):
+    tipo_nome = serializers.CharField(source='get_tipo_display', read_only=True)
+    competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
+    
+    class Meta:
+        model = ConsolidadoTipoInstituicao
+        fields = '__all__'
+
+class SerieTemporalCustoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SerieTemporalCusto
+        fields = [
+            'periodo', 'competencia', 'quantidade_instituicoes', 'quantidade_alunos', 'total_geral',
+            'media_custo_aluno', 'media_ponderada', 'percentil_25', 'mediana',
+            'percentil_75', 'percentil_90', 'data_calculo'
+        ]
+
+# ========== SERIALIZERS PARA AUDITORIA ==========
+class AnomaliaLancamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    instituicao_nome = serializers.CharField(source='instituicao.nome', read_only=True)
+    item_gasto_nome = serializers.CharField(source='item_gasto.nome', read_only=True)
+    competencia_periodo = serializers.CharField(source='competencia.periodo', read_only=True)
+    situacao_display = serializers.CharField(source='get_situacao_display', read_only=True)
+
+    class Meta:
+        model = AnomaliaLancamento
+        fields = [
+            'id', 'lancamento_id', 'competencia', 'competencia_periodo', 'item_gasto', 'item_gasto_nome',
+            'instituicao', 'instituicao_nome', 'valor_unitario', 'mediana', 'escore', 'razao_mediana',
+            'situacao', 'situacao_display', 'data_deteccao',
+        ]
+
+class FiltroAnomaliasSerializer(serializers.Serializer):
+    competencia_id = serializers.IntegerField(required=False)
+    item_gasto_id = serializers.IntegerField(required=False)
+    instituicao_id = serializers.IntegerField(required=False)
+    situacao = serializers.ChoiceField(choices=AnomaliaLancamento.SITUACOES, required=False)
+
+class TarefaSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = Tarefa
+        fields = [
+            'id', 'tipo', 'parametros', 'status', 'status_display', 'progresso',
+            'resultado', 'erro', 'data_criacao', 'data_inicio', 'data_fim'
+        ]
+
 class SolicitacaoCadastroSerializer(serializers.ModelSerializer):
     instituicao_nome = serializers.CharField(source='instituicao.nome', read_only=True)
     
@@ -311,9 +453,27 @@ class RelatorioCustoSerializer(serializers.Serializer):
     instituicao_id = serializers.IntegerField(required=False)
     competencia_id = serializers.IntegerField(required=False)
     ano = serializers.IntegerField(required=False)
+    dimensoes = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(DIMENSOES)), required=False, default=list
+    )
+    medidas = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(MEDIDAS)), required=False, allow_empty=False,
+        default=lambda: list(MEDIDAS_PADRAO)
+    )
     
     total_gastos_operacionais = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
     total_folha_pagamento = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
     total_geral = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
     quantidade_alunos = serializers.IntegerField(read_only=True)
-    custo_por_aluno = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
\ No newline at end of file
+    custo_por_aluno = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    def validate(self, data):
+        # Remove repetições mantendo a ordem pedida
+        data['dimensoes'] = list(dict.fromkeys(data['dimensoes']))
+        data['medidas'] = list(dict.fromkeys(data['medidas']))
+        incompativeis = medidas_incompativeis(data['dimensoes'], data['medidas'])
+        if incompativeis:
+            raise serializers.ValidationError({
+                'medidas': f"{', '.join(incompativeis)} não podem ser detalhadas por {', '.join(data['dimensoes'])}"
+            })
+        return data
\ No newline at end of file
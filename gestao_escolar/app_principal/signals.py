@@ -1,53 +1,291 @@
-from django.db.models.signals import post_save, post_delete
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction, models
-from .models import LancamentoGasto, FolhaPagamento, DadosAlunos, DashboardCustoAluno
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from .models import (
+    Competencia, LancamentoGasto, LancamentoGastoArquivado, FolhaPagamento, DadosAlunos, DashboardCustoAluno,
+    Instituicao, Municipio, UnidadeFederativa, ItemGasto, CategoriaGasto, VersaoCadastro,
+)
+from .calculos import (
+    aplicar_delta_consolidados, atualizar_consolidados, atualizar_variacoes,
+    recalcular_chaves, recalcular_dashboards, fechar_competencia, reabrir_competencia,
+)
+
+_local = threading.local()
+
+
+def _estado_dashboard(instance):
+    """
+    Retorna (instituicao_id, competencia_id, valor) com que a instância
+    contribui para o dashboard, ou None se os campos não estiverem carregados
+    """
+    campos = {'instituicao_id', 'competencia_id'}
+    if isinstance(instance, DadosAlunos):
+        campos.add('quantidade_alunos')
+    else:
+        campos.add('valor_total')
+
+    # Campos adiados exigiriam uma consulta extra só para o snapshot
+    if campos & instance.get_deferred_fields():
+        return None
+
+    if isinstance(instance, DadosAlunos):
+        valor = instance.quantidade_alunos
+    else:
+        valor = instance.valor_total
+    return instance.instituicao_id, instance.competencia_id, valor
+
+
+@receiver(post_init, sender=LancamentoGasto)
+@receiver(post_init, sender=FolhaPagamento)
+@receiver(post_init, sender=DadosAlunos)
+def guardar_estado_original(sender, instance, **kwargs):
+    """Guarda os valores carregados do banco para calcular o delta depois"""
+    instance._estado_dashboard = _estado_dashboard(instance) if instance.pk else None
+
+
+@receiver(post_init, sender=Competencia)
+def guardar_situacao_competencia(sender, instance, **kwargs):
+    """Guarda se a competência estava aberta ao ser carregada, para detectar o fechamento"""
+    if instance.pk and 'aberta' not in instance.get_deferred_fields():
+        instance._aberta_original = instance.aberta
+    else:
+        instance._aberta_original = None
+
+
+@receiver(post_save, sender=Competencia)
+def fechar_ou_reabrir_competencia(sender, instance, created=False, **kwargs):
+    """
+    Fechar (aberta True -> False) agenda o recálculo final e o retrato para
+    depois do commit; reabrir descarta o retrato na mesma transação
+    """
+    original, instance._aberta_original = instance._aberta_original, instance.aberta
+    if created or original is None or original == instance.aberta:
+        return
+
+    if instance.aberta:
+        reabrir_competencia(instance.pk)
+    else:
+        usuario = getattr(instance, '_usuario_fechamento', None)
+        transaction.on_commit(lambda: fechar_competencia(instance.pk, usuario))
+
+
+# Modelo -> (campo do dashboard que soma a medida, nome do delta)
+MEDIDAS_DASHBOARD = {
+    LancamentoGasto: ('total_gastos_operacionais', 'gastos'),
+    FolhaPagamento: ('total_folha_pagamento', 'folha'),
+    DadosAlunos: ('quantidade_alunos', 'alunos'),
+}
+
+
+def recalcular_dashboard(instituicao_id, competencia_id):
+    """
+    Recalcula o dashboard de uma (instituição, competência) a partir dos dados brutos
+    """
+    recalcular_dashboards(competencias=[competencia_id], instituicoes=[instituicao_id])
+
+
+class _DashboardsPendentes:
+    """Chaves (instituicao_id, competencia_id) alteradas na transação corrente"""
+
+    def __init__(self):
+        self.chaves = set()
+        self.executado = False
+
+    def __call__(self):
+        # Registrado uma vez por escrita: só a primeira chamada após o commit recalcula
+        if self.executado:
+            return
+        self.executado = True
+        if getattr(_local, 'pendentes', None) is self:
+            _local.pendentes = None
+        try:
+            recalcular_chaves(self.chaves)
+        finally:
+            Competencia.registrar_alteracao({competencia_id for _, competencia_id in self.chaves})
+
+
+def _dashboards_pendentes():
+    """
+    Retorna o acumulador da transação corrente e registra o recálculo no
+    on_commit. O registro é refeito a cada escrita: se o savepoint de uma
+    delas sofrer rollback, o callback registrado ali sai da fila, mas o das
+    escritas seguintes continua. Chaves que sobraram de um rollback apenas
+    são recalculadas a partir dos dados brutos sem necessidade.
+    """
+    pendentes = getattr(_local, 'pendentes', None)
+    if pendentes is None or pendentes.executado:
+        pendentes = _DashboardsPendentes()
+        _local.pendentes = pendentes
+    transaction.on_commit(pendentes)
+    return pendentes
+
+
+@contextmanager
+def dashboards_suspensos(atualizar_ao_final=True):
+    """
+    Suspende a atualização automática dos dashboards durante importações em
+    lote e comandos de gestão. As chaves alteradas são acumuladas no conjunto
+    retornado (que também aceita chaves de operações em lote feitas à mão) e
+    recalculadas de uma vez ao final, após o commit. Com
+    atualizar_ao_final=False as competências apenas ficam marcadas como
+    desatualizadas, para o próximo recálculo agendado.
+    """
+    externas = getattr(_local, 'suspensas', None)
+    chaves = set() if externas is None else externas
+    _local.suspensas = chaves
+    try:
+        yield chaves
+    finally:
+        _local.suspensas = externas
+
+    # Blocos aninhados deixam o recálculo para o bloco mais externo
+    if externas is None and chaves:
+        transaction.on_commit(lambda: _finalizar_suspensao(chaves, atualizar_ao_final))
+
+
+def _finalizar_suspensao(chaves, atualizar):
+    try:
+        if atualizar:
+            recalcular_chaves(chaves)
+    finally:
+        Competencia.registrar_alteracao({competencia_id for _, competencia_id in chaves})
+
+
+def aplicar_delta_dashboard(instituicao_id, competencia_id, gastos=0, folha=0, alunos=None):
+    """
+    Aplica a diferença de valores diretamente sobre os totais do dashboard,
+    recalculando os campos derivados no mesmo UPDATE.
+    Retorna False quando não há dashboard para receber o delta.
+    """
+    expressoes = DashboardCustoAluno.expressoes_metricas(
+        gastos=F('total_gastos_operacionais') + Value(gastos),
+        folha=F('total_folha_pagamento') + Value(folha),
+        alunos=Value(alunos) if alunos is not None else F('quantidade_alunos'),
+    )
+    return DashboardCustoAluno.objects.filter(
+        instituicao_id=instituicao_id,
+        competencia_id=competencia_id
+    ).update(**expressoes) > 0
+
 
 @receiver([post_save, post_delete], sender=LancamentoGasto)
 @receiver([post_save, post_delete], sender=FolhaPagamento)
 @receiver([post_save, post_delete], sender=DadosAlunos)
-def atualizar_dashboard(sender, instance, **kwargs):
+def atualizar_dashboard(sender, instance, created=False, **kwargs):
     """
-    Atualiza automaticamente o dashboard quando há mudanças nos dados
+    Atualiza automaticamente o dashboard quando há mudanças nos dados.
+    Aplica apenas o delta da linha alterada e recorre ao recálculo completo
+    quando o delta não é confiável.
     """
+    removido = kwargs['signal'] is post_delete
+    original = None if created else instance._estado_dashboard
+    atual = None if removido else _estado_dashboard(instance)
+
+    if not removido:
+        instance._estado_dashboard = atual
+
+    chaves = {estado[:2] for estado in (original, atual) if estado}
+    chaves.add((instance.instituicao_id, instance.competencia_id))
+
+    suspensas = getattr(_local, 'suspensas', None)
+    if suspensas is not None:
+        suspensas.update(chaves)
+        return
+
+    if transaction.get_connection().in_atomic_block:
+        # Em lote: recalcula cada chave uma única vez no commit
+        _dashboards_pendentes().chaves.update(chaves)
+        return
+
+    # A versão só sobe depois da escrita no dashboard: quem lê a versão nova
+    # (caches de resposta, ETags) já encontra os dados atualizados
+    competencias = {competencia_id for _, competencia_id in chaves}
+    try:
+        _aplicar_alteracao(sender, chaves, created, removido, original, atual)
+    finally:
+        Competencia.registrar_alteracao(competencias)
+
+
+def _aplicar_alteracao(sender, chaves, created, removido, original, atual):
+    delta_confiavel = (
+        len(chaves) == 1
+        and (created or original is not None)
+        and (removido or atual is not None)
+        # Remover os dados de alunos deixa o dashboard sem base de cálculo
+        and not (removido and sender is DadosAlunos)
+    )
+
+    if not delta_confiavel:
+        # Ex.: a linha mudou de instituição/competência ou o estado original é desconhecido
+        for instituicao_id, competencia_id in chaves:
+            recalcular_dashboard(instituicao_id, competencia_id)
+        return
+
+    instituicao_id, competencia_id = chaves.pop()
+    valor_anterior = original[2] if original else 0
+    valor_atual = atual[2] if atual else 0
+    diferenca = valor_atual - valor_anterior
+    campo_dashboard, campo_delta = MEDIDAS_DASHBOARD[sender]
+
     with transaction.atomic():
-        instituicao = instance.instituicao
-        competencia = instance.competencia
-        
-        # Verificar se existem dados completos para calcular
-        try:
-            dados_alunos = DadosAlunos.objects.get(
-                instituicao=instituicao,
-                competencia=competencia
-            )
-            quantidade_alunos = dados_alunos.quantidade_alunos
-        except DadosAlunos.DoesNotExist:
-            # Sem dados de alunos, não é possível calcular
+        # O estado original vem da instância e pode estar vencido (outra
+        # instância da mesma linha gravou depois de ela ser carregada): o delta
+        # só vale se levar o total travado do dashboard ao total do banco
+        armazenado = DashboardCustoAluno.objects.select_for_update().filter(
+            instituicao_id=instituicao_id,
+            competencia_id=competencia_id
+        ).values_list(campo_dashboard, flat=True).first()
+        if armazenado is None or armazenado + diferenca != _total_no_banco(sender, instituicao_id, competencia_id):
+            # Sem dashboard para receber o delta ou delta vencido: parte dos dados brutos
+            recalcular_dashboard(instituicao_id, competencia_id)
+            return
+
+        if sender is DadosAlunos:
+            aplicar_delta_dashboard(instituicao_id, competencia_id, alunos=valor_atual)
+        else:
+            aplicar_delta_dashboard(instituicao_id, competencia_id, **{campo_delta: diferenca})
+        if not diferenca:
             return
-        
-        # Calcular totais
-        total_gastos_operacionais = LancamentoGasto.objects.filter(
-            instituicao=instituicao,
-            competencia=competencia
-        ).aggregate(total=models.Sum('valor_total'))['total'] or 0
-        
-        total_folha_pagamento = FolhaPagamento.objects.filter(
-            instituicao=instituicao,
-            competencia=competencia
-        ).aggregate(total=models.Sum('valor_total'))['total'] or 0
-        
-        total_geral = total_gastos_operacionais + total_folha_pagamento
-        custo_por_aluno = total_geral / quantidade_alunos if quantidade_alunos > 0 else 0
-        
-        # Atualizar ou criar dashboard
-        DashboardCustoAluno.objects.update_or_create(
-            instituicao=instituicao,
-            competencia=competencia,
-            defaults={
-                'total_gastos_operacionais': total_gastos_operacionais,
-                'total_folha_pagamento': total_folha_pagamento,
-                'total_geral': total_geral,
-                'quantidade_alunos': quantidade_alunos,
-                'custo_por_aluno': custo_por_aluno
-            }
-        )
\ No newline at end of file
+
+        # A variação da própria linha já veio no UPDATE; falta a do mês seguinte
+        atualizar_variacoes([competencia_id], [instituicao_id], incluir_proprias=False)
+
+        if sender is DadosAlunos and created:
+            # O dashboard pode ter ficado com alunos antigos: a diferença real é desconhecida
+            atualizar_consolidados([competencia_id])
+        else:
+            aplicar_delta_consolidados(instituicao_id, competencia_id, **{campo_delta: diferenca})
+
+
+def _total_no_banco(sender, instituicao_id, competencia_id):
+    """Total da medida da chave gravado nos dados brutos, como o recálculo completo o soma"""
+    if sender is DadosAlunos:
+        modelos, campo = [DadosAlunos], 'quantidade_alunos'
+    elif sender is FolhaPagamento:
+        modelos, campo = [FolhaPagamento], 'valor_total'
+    else:
+        modelos, campo = [LancamentoGasto, LancamentoGastoArquivado], 'valor_total'
+    return sum(
+        modelo.objects.filter(instituicao_id=instituicao_id, competencia_id=competencia_id)
+        .aggregate(total=Sum(campo))['total'] or 0
+        for modelo in modelos
+    )
+
+
+@receiver([post_save, post_delete], sender=Instituicao)
+@receiver([post_save, post_delete], sender=Municipio)
+@receiver([post_save, post_delete], sender=UnidadeFederativa)
+@receiver([post_save, post_delete], sender=ItemGasto)
+@receiver([post_save, post_delete], sender=CategoriaGasto)
+def registrar_alteracao_cadastro(sender, **kwargs):
+    """
+    Cadastros definem os nomes exibidos nos dashboards e os agrupamentos dos
+    relatórios (município, tipo, categoria) e não mudam a versão das
+    competências: sobe a versão dos cadastros, que invalida as respostas em
+    cache de todos os processos
+    """
+    VersaoCadastro.registrar_alteracao()
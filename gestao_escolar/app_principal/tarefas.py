@@ -0,0 +1,135 @@
+import logging
+import os
+import socket
+import traceback
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Competencia, Tarefa
+from .anomalias import detectar_anomalias
+from .calculos import recalcular_dashboards
+
+logger = logging.getLogger(__name__)
+
+# Tipo da tarefa -> função executora, preenchido pelo decorador @tarefa
+EXECUTORES = {}
+
+
+def tarefa(tipo):
+    """Registra a função como executora das tarefas do tipo informado"""
+    def decorador(funcao):
+        EXECUTORES[tipo] = funcao
+        return funcao
+    return decorador
+
+
+def enfileirar(tipo, usuario=None, unica=False, **parametros):
+    """
+    Cria uma tarefa pendente e retorna a instância.
+    Com unica=True, reaproveita uma tarefa idêntica do mesmo usuário que ainda
+    não começou (o usuário precisa poder consultar a tarefa retornada).
+    """
+    if tipo not in EXECUTORES:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+
+    if unica:
+        existente = Tarefa.objects.filter(tipo=tipo, parametros=parametros, status='PENDENTE', usuario=usuario).first()
+        if existente:
+            return existente
+
+    return Tarefa.objects.create(tipo=tipo, parametros=parametros, usuario=usuario)
+
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reservar_proxima(worker, reprocessar_apos=None):
+    """
+    Reserva a próxima tarefa pendente para o worker.
+
+    A reserva é um UPDATE condicionado ao status PENDENTE: entre vários
+    processos, apenas um consegue mudar a linha, então a mesma tarefa nunca é
+    executada duas vezes. Tarefas EXECUTANDO há mais que `reprocessar_apos`
+    (worker que morreu) voltam a ser elegíveis.
+    """
+    elegiveis = Q(status='PENDENTE')
+    if reprocessar_apos:
+        elegiveis |= Q(status='EXECUTANDO', data_inicio__lt=timezone.now() - reprocessar_apos)
+
+    while True:
+        candidata = Tarefa.objects.filter(elegiveis).order_by('data_criacao', 'id').values('id', 'status', 'data_inicio').first()
+        if candidata is None:
+            return None
+
+        reservadas = Tarefa.objects.filter(
+            id=candidata['id'],
+            status=candidata['status'],
+            data_inicio=candidata['data_inicio'],
+        ).update(
+            status='EXECUTANDO',
+            worker=worker,
+            progresso=0,
+            data_inicio=timezone.now(),
+        )
+        if reservadas:
+            return Tarefa.objects.get(id=candidata['id'])
+        # Outro worker reservou primeiro: tenta a próxima
+
+
+def _finalizar(tarefa_reservada, **campos):
+    """
+    Grava o desfecho só se a tarefa ainda for desta reserva: se ela foi
+    considerada abandonada e reservada por outro worker, data_inicio mudou e
+    o UPDATE não encontra a linha. Retorna se o desfecho foi gravado.
+    """
+    gravadas = Tarefa.objects.filter(
+        pk=tarefa_reservada.pk,
+        status='EXECUTANDO',
+        data_inicio=tarefa_reservada.data_inicio,
+    ).update(data_fim=timezone.now(), **campos)
+    if not gravadas:
+        logger.warning("Tarefa %s foi reservada por outro worker; desfecho descartado", tarefa_reservada.pk)
+    return bool(gravadas)
+
+
+def executar(tarefa_reservada):
+    """
+    Executa uma tarefa já reservada, gravando resultado ou erro.
+    Retorna True se a tarefa foi concluída por este worker.
+    """
+    executor = EXECUTORES.get(tarefa_reservada.tipo)
+    try:
+        if executor is None:
+            raise ValueError(f"Tipo de tarefa desconhecido: {tarefa_reservada.tipo}")
+        resultado = executor(tarefa_reservada, **tarefa_reservada.parametros)
+    except Exception:
+        logger.exception("Falha na tarefa %s", tarefa_reservada.pk)
+        _finalizar(tarefa_reservada, status='ERRO', erro=traceback.format_exc())
+        return False
+
+    return _finalizar(tarefa_reservada, status='CONCLUIDA', progresso=100, resultado=resultado)
+
+
+# ========== EXECUTORES ==========
+@tarefa('recalcular_dashboards')
+def executar_recalculo_dashboards(tarefa_atual, competencias=None):
+    """Recalcula os dashboards competência a competência, reportando o progresso"""
+    if competencias is None:
+        competencias = list(Competencia.objects.filter(aberta=True).values_list('id', flat=True))
+
+    resultado = {'competencias': len(competencias), 'criados': 0, 'atualizados': 0}
+    for indice, competencia_id in enumerate(competencias, start=1):
+        parcial = recalcular_dashboards(competencias=[competencia_id])
+        resultado['criados'] += parcial['criados']
+        resultado['atualizados'] += parcial['atualizados']
+        tarefa_atual.atualizar_progresso(indice * 100 / len(competencias))
+
+    return resultado
+
+
+@tarefa('detectar_anomalias')
+def executar_deteccao_anomalias(tarefa_atual, competencias=None):
+    """Detecta anomalias nos lançamentos competência a competência, reportando o progresso"""
+    return detectar_anomalias(competencias, progresso=tarefa_atual.atualizar_progresso)
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+from ..models import (
+    UnidadeFederativa, Municipio, CustomUser, Instituicao, CategoriaGasto, ItemGasto, Competencia,
+)
+
+
+def criar_rede(quantidade_instituicoes=3, quantidade_itens=2):
+    """
+    Cadastros mínimos para os cálculos: duas UFs com um município cada, as
+    instituições alternando entre eles, itens de gasto de uma categoria e as
+    competências 12/2024 e 01/2025 (virada do ano). Retorna um dicionário.
+    """
+    ufs = [
+        UnidadeFederativa.objects.create(sigla='SP', nome='São Paulo'),
+        UnidadeFederativa.objects.create(sigla='RJ', nome='Rio de Janeiro'),
+    ]
+    municipios = [Municipio.objects.create(nome=f'Município {uf.sigla}', uf=uf) for uf in ufs]
+    responsavel = CustomUser.objects.create_user(username='responsavel', password='senha', cargo='RESPONSAVEL')
+    instituicoes = [
+        Instituicao.objects.create(
+            nome=f'Escola {indice}',
+            municipio=municipios[indice % 2],
+            responsavel=responsavel,
+            codigo_inep=f'{indice:08d}',
+        )
+        for indice in range(quantidade_instituicoes)
+    ]
+    categoria = CategoriaGasto.objects.create(codigo='01', nome='Custeio')
+    itens = [ItemGasto.objects.create(nome=f'Item {indice}', categoria=categoria) for indice in range(quantidade_itens)]
+    return {
+        'municipios': municipios,
+        'responsavel': responsavel,
+        'instituicoes': instituicoes,
+        'itens': itens,
+        'dezembro': Competencia.objects.create(ano=2024, mes=12),
+        'janeiro': Competencia.objects.create(ano=2025, mes=1),
+    }
+
+
+def reais(valor):
+    return Decimal(valor).quantize(Decimal('0.01'))
@@ -0,0 +1,116 @@
+import numpy as np
+
+from django.test import SimpleTestCase, TestCase
+
+from ..analitico import CAMPOS_FATOS, CAMPOS_TEXTO, _posicao_no_grupo, calcular_estatisticas, percentis_por_grupo
+from ..calculos import recalcular_dashboards
+from ..models import LancamentoGasto, DadosAlunos, DashboardCustoAluno
+from .fabricas import criar_rede, reais
+
+
+def fatos_de(custos, competencias=None, grupos=None):
+    """Arrays no formato de carregar_fatos(): um aluno por dashboard, custo = gastos"""
+    quantidade = len(custos)
+    fatos = {
+        nome: np.full(quantidade, '', dtype=object) if nome in CAMPOS_TEXTO else np.full(quantidade, np.nan)
+        for nome in CAMPOS_FATOS
+    }
+    fatos['id'] = np.arange(1, quantidade + 1)
+    fatos['competencia_id'] = np.array(competencias or [1] * quantidade, dtype=np.int64)
+    fatos['gastos'] = np.array(custos, dtype=np.float64)
+    fatos['folha'] = np.zeros(quantidade)
+    fatos['alunos'] = np.ones(quantidade)
+    fatos['grupo'] = np.array(grupos or [0] * quantidade, dtype=np.int64)
+    return fatos
+
+
+class PercentisTest(SimpleTestCase):
+
+    def test_percentis_por_grupo_igualam_numpy(self):
+        valores = np.array([7.0, 1.0, 3.0, 3.0, 10.0, 2.0, 2.0, 2.0, 9.0])
+        grupos = np.array([0, 0, 0, 0, 1, 1, 1, 1, 1])
+        resultado = percentis_por_grupo(valores, grupos, 2)
+        for grupo in (0, 1):
+            for nome, fracao in (('percentil_25', 25), ('mediana', 50), ('percentil_75', 75), ('percentil_90', 90)):
+                self.assertAlmostEqual(resultado[nome][grupo], np.percentile(valores[grupos == grupo], fracao))
+
+    def test_posicao_divide_empates_ao_meio(self):
+        posicoes = _posicao_no_grupo(np.array([20.0, 10.0, 30.0, 20.0]), np.zeros(4, dtype=np.int64), 1)
+        np.testing.assert_allclose(posicoes, [50.0, 12.5, 87.5, 50.0])
+
+    def test_posicao_e_calculada_dentro_de_cada_grupo(self):
+        valores = np.array([5.0, 100.0, 5.0, 100.0, 1.0])
+        grupos = np.array([0, 1, 1, 0, 0])
+        posicoes = _posicao_no_grupo(valores, grupos, 2)
+        # Grupo 0: 1 < 5 < 100; grupo 1: 5 < 100
+        np.testing.assert_allclose(posicoes, [50.0, 75.0, 25.0, 250 / 3, 50 / 3])
+
+
+class EstatisticasComEmpatesTest(SimpleTestCase):
+
+    def test_custos_iguais_ficam_no_primeiro_quartil_com_eficiencia_media(self):
+        estatisticas = calcular_estatisticas(fatos_de([100, 100, 100, 100]))
+        np.testing.assert_array_equal(estatisticas['quartil_custo'], [1, 1, 1, 1])
+        np.testing.assert_array_equal(estatisticas['zscore_custo'], [0, 0, 0, 0])
+        np.testing.assert_array_equal(estatisticas['eficiencia_custo'], [50, 50, 50, 50])
+        self.assertEqual(set(estatisticas['faixa_eficiencia']), {DashboardCustoAluno.FaixasEficiencia.MEDIA})
+
+    def test_empatados_recebem_o_mesmo_quartil_e_eficiencia(self):
+        estatisticas = calcular_estatisticas(fatos_de([100, 300, 100, 200]))
+        # P25 = 100, mediana = 150, P75 = 225: quem empata no P25 não passa dele
+        np.testing.assert_array_equal(estatisticas['quartil_custo'], [1, 4, 1, 3])
+        np.testing.assert_allclose(estatisticas['eficiencia_custo'], [75, 12.5, 75, 37.5])
+        self.assertEqual(list(estatisticas['faixa_eficiencia']), ['alta', 'baixa', 'alta', 'media'])
+
+    def test_grupos_de_comparacao_sao_independentes(self):
+        # Mesma competência, dois grupos: o mais caro de cada um é o menos eficiente do seu grupo
+        estatisticas = calcular_estatisticas(fatos_de([10, 20, 1000, 2000], grupos=[0, 0, 1, 1]), grupo='tipo')
+        np.testing.assert_allclose(estatisticas['eficiencia_custo'], [75, 25, 75, 25])
+        np.testing.assert_allclose(estatisticas['mediana_grupo'], [15, 15, 1500, 1500])
+        # O quartil continua sendo o da rede da competência
+        np.testing.assert_array_equal(estatisticas['quartil_custo'], [1, 2, 3, 4])
+
+    def test_dashboards_sem_alunos_ficam_fora_da_distribuicao(self):
+        fatos = fatos_de([100, 200, 50])
+        fatos['alunos'][2] = 0
+        estatisticas = calcular_estatisticas(fatos)
+        self.assertTrue(np.isnan(estatisticas['quartil_custo'][2]))
+        self.assertEqual(estatisticas['faixa_eficiencia'][2], '')
+        self.assertEqual(estatisticas['rede'][1]['instituicoes'], 2)
+
+
+class AnaliseGravadaTest(TestCase):
+
+    def test_recalculo_grava_posicao_dos_empatados(self):
+        rede = criar_rede(quantidade_instituicoes=4)
+        dezembro = rede['dezembro']
+        for escola, valor in zip(rede['instituicoes'], ['100', '300', '100', '200']):
+            DadosAlunos.objects.create(instituicao=escola, competencia=dezembro, quantidade_alunos=1)
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=dezembro, item_gasto=rede['itens'][0], valor_unitario=reais(valor),
+            )
+        recalcular_dashboards(competencias=[dezembro.id])
+
+        gravados = {
+            dashboard.instituicao_id: dashboard
+            for dashboard in DashboardCustoAluno.objects.filter(competencia=dezembro)
+        }
+        primeira, terceira = (gravados[escola.id] for escola in rede['instituicoes'][0::2])
+        self.assertEqual(primeira.eficiencia_custo, terceira.eficiencia_custo)
+        self.assertEqual(primeira.eficiencia_custo, reais('75'))
+        self.assertEqual(primeira.quartil_custo, DashboardCustoAluno.Quartis.PRIMEIRO)
+        self.assertEqual(primeira.quantidade_grupo, 4)
+        self.assertEqual(primeira.mediana_grupo, reais('150'))
+
+    def test_distancia_da_mediana_de_centavos_fica_no_limite_do_campo(self):
+        rede = criar_rede(quantidade_instituicoes=3)
+        dezembro = rede['dezembro']
+        for escola, valor in zip(rede['instituicoes'], ['0.01', '0.01', '900000']):
+            DadosAlunos.objects.create(instituicao=escola, competencia=dezembro, quantidade_alunos=1)
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=dezembro, item_gasto=rede['itens'][0], valor_unitario=reais(valor),
+            )
+        recalcular_dashboards(competencias=[dezembro.id])
+
+        extremo = DashboardCustoAluno.objects.get(instituicao=rede['instituicoes'][2])
+        self.assertEqual((extremo.mediana_grupo, extremo.distancia_mediana), (reais('0.01'), reais('9999999.99')))
@@ -0,0 +1,85 @@
+import numpy as np
+
+from django.test import SimpleTestCase, TestCase
+
+from ..anomalias import LIMITE_ESCORE, calcular_escores, detectar_competencia
+from ..models import LancamentoGasto, DistribuicaoItemGasto, AnomaliaLancamento
+from .fabricas import criar_rede, reais
+
+
+class EscoreRobustoTest(SimpleTestCase):
+
+    def test_mad_zero_usa_o_desvio_absoluto_medio(self):
+        # A maioria paga o mesmo valor: MAD = 0, mas o valor fora do padrão ainda é acusado
+        valores = np.array([80.0, 80.0, 80.0, 80.0, 80.0, 95.0])
+        distribuicoes, escores = calcular_escores(valores, np.zeros(6, dtype=np.int64), 1)
+        self.assertEqual(distribuicoes['mad'][0], 0)
+        self.assertEqual(distribuicoes['mediana'][0], 80)
+        np.testing.assert_array_equal(escores[:5], 0)
+        self.assertAlmostEqual(escores[5], 15 / (2.5 * 1.2533))
+        self.assertGreaterEqual(escores[5], LIMITE_ESCORE)
+
+    def test_valores_todos_iguais_tem_escore_zero(self):
+        distribuicoes, escores = calcular_escores(np.full(5, 42.0), np.zeros(5, dtype=np.int64), 1)
+        self.assertEqual(distribuicoes['mad'][0], 0)
+        np.testing.assert_array_equal(escores, 0)
+        self.assertFalse(np.isnan(escores).any())
+
+    def test_grupos_com_e_sem_mad_no_mesmo_lote(self):
+        valores = np.array([10.0, 10.0, 10.0, 10.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+        grupos = np.array([0, 0, 0, 0, 1, 1, 1, 1, 1])
+        distribuicoes, escores = calcular_escores(valores, grupos, 2)
+        np.testing.assert_array_equal(distribuicoes['mad'], [0, 1])
+        np.testing.assert_array_equal(escores[:4], 0)
+        # Grupo 1: mediana 3, MAD 1 -> 0,6745 * (valor - 3)
+        np.testing.assert_allclose(escores[4:], 0.6745 * np.array([-2, -1, 0, 1, 2]))
+
+
+class DeteccaoTest(TestCase):
+
+    def test_detecta_o_unico_valor_diferente_com_mad_zero(self):
+        rede = criar_rede(quantidade_instituicoes=6)
+        dezembro, item = rede['dezembro'], rede['itens'][0]
+        for escola in rede['instituicoes']:
+            LancamentoGasto.objects.create(instituicao=escola, competencia=dezembro, item_gasto=item, valor_unitario=reais('80'))
+        fora = LancamentoGasto.objects.get(instituicao=rede['instituicoes'][0])
+        fora.valor_unitario = reais('95')
+        fora.save()
+
+        resultado = detectar_competencia(dezembro.id)
+
+        self.assertEqual(resultado, {'itens': 1, 'lancamentos': 6, 'anomalias': 1})
+        distribuicao = DistribuicaoItemGasto.objects.get(competencia=dezembro, item_gasto=item)
+        self.assertEqual(distribuicao.mad, 0)
+        self.assertEqual(distribuicao.mediana, reais('80'))
+        anomalia = AnomaliaLancamento.objects.get()
+        self.assertEqual(anomalia.lancamento_id, fora.id)
+        self.assertEqual(anomalia.razao_mediana, reais('1.19'))
+
+    def test_item_com_poucos_lancamentos_nao_forma_distribuicao(self):
+        rede = criar_rede(quantidade_instituicoes=3)
+        for escola, valor in zip(rede['instituicoes'], ['10', '10', '1000']):
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=rede['dezembro'], item_gasto=rede['itens'][0], valor_unitario=reais(valor),
+            )
+        self.assertEqual(detectar_competencia(rede['dezembro'].id)['itens'], 0)
+        self.assertFalse(AnomaliaLancamento.objects.exists())
+
+    def test_escore_e_razao_fora_da_escala_ficam_no_limite_do_campo(self):
+        # MAD de meio centavo: o escore de 900.000 passaria de cem milhões
+        rede = criar_rede(quantidade_instituicoes=6)
+        for escola, valor in zip(rede['instituicoes'], ['2000', '2000', '2000', '2000.01', '1999.99', '900000']):
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=rede['dezembro'], item_gasto=rede['itens'][0], valor_unitario=reais(valor),
+            )
+        for escola, valor in zip(rede['instituicoes'], ['999999', '999999', '999999', '999999.01', '999998.99', '0.01']):
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=rede['dezembro'], item_gasto=rede['itens'][1], valor_unitario=reais(valor),
+            )
+
+        detectar_competencia(rede['dezembro'].id)
+
+        extremo = AnomaliaLancamento.objects.get(valor_unitario=reais('900000'))
+        self.assertEqual((extremo.escore, extremo.razao_mediana), (reais('9999999.99'), reais('450')))
+        centavo = AnomaliaLancamento.objects.get(valor_unitario=reais('0.01'))
+        self.assertEqual(centavo.escore, reais('-9999999.99'))
@@ -0,0 +1,74 @@
+import datetime
+
+from django.test import TestCase
+
+from ..arquivamento import arquivar_competencia, competencias_arquivaveis
+from ..calculos import recalcular_dashboards
+from ..models import (
+    Competencia, LancamentoGasto, LancamentoGastoArquivado, DadosAlunos,
+    DashboardCustoAluno, FechamentoCompetencia,
+)
+from .fabricas import criar_rede, reais
+
+HOJE = datetime.date(2026, 10, 17)
+
+
+class ArquivamentoTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede(quantidade_instituicoes=2)
+        self.escolas = self.rede['instituicoes']
+        self.dezembro = self.rede['dezembro']
+        for escola in self.escolas:
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.dezembro, quantidade_alunos=10)
+            for item in self.rede['itens']:
+                LancamentoGasto.objects.create(
+                    instituicao=escola, competencia=self.dezembro, item_gasto=item, valor_unitario=reais('40'),
+                )
+        self.ids = sorted(LancamentoGasto.objects.values_list('id', flat=True))
+        self.alterar_situacao(aberta=False)
+
+    def alterar_situacao(self, aberta):
+        competencia = Competencia.objects.get(pk=self.dezembro.pk)
+        competencia.aberta = aberta
+        with self.captureOnCommitCallbacks(execute=True):
+            competencia.save(update_fields=['aberta'])
+
+    def arquivar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return arquivar_competencia(self.dezembro)
+
+    def totais_dos_dashboards(self):
+        return sorted(DashboardCustoAluno.objects.values_list('total_gastos_operacionais', 'custo_por_aluno'))
+
+    def test_so_competencias_fechadas_com_retrato_e_antigas(self):
+        self.assertEqual(list(competencias_arquivaveis(meses=12, hoje=HOJE)), [self.dezembro])
+        self.assertFalse(competencias_arquivaveis(meses=24, hoje=HOJE).exists())
+
+        self.arquivar()
+        self.assertFalse(competencias_arquivaveis(meses=12, hoje=HOJE).exists())
+
+    def test_move_os_lancamentos_sem_mexer_nos_dashboards(self):
+        antes = self.totais_dos_dashboards()
+        versao = Competencia.objects.get(pk=self.dezembro.pk).versao_dados
+
+        self.assertEqual(self.arquivar(), 4)
+        self.assertFalse(LancamentoGasto.objects.exists())
+        self.assertEqual(sorted(LancamentoGastoArquivado.objects.values_list('id', flat=True)), self.ids)
+        self.assertIsNotNone(FechamentoCompetencia.objects.get().data_arquivamento)
+
+        self.assertEqual(self.totais_dos_dashboards(), antes)
+        self.assertEqual(antes, [(reais('80'), reais('8')), (reais('80'), reais('8'))])
+        self.assertGreater(Competencia.objects.get(pk=self.dezembro.pk).versao_dados, versao)
+        # O recálculo completo também soma o arquivo
+        recalcular_dashboards(competencias=[self.dezembro.id])
+        self.assertEqual(self.totais_dos_dashboards(), antes)
+
+    def test_reabrir_devolve_os_lancamentos_com_os_mesmos_ids(self):
+        self.arquivar()
+        self.alterar_situacao(aberta=True)
+
+        self.assertEqual(sorted(LancamentoGasto.objects.values_list('id', flat=True)), self.ids)
+        self.assertFalse(LancamentoGastoArquivado.objects.exists())
+        self.assertFalse(FechamentoCompetencia.objects.exists())
+        self.assertEqual(LancamentoGasto.objects.get(pk=self.ids[0]).valor_total, reais('40'))
@@ -0,0 +1,306 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from ..calculos import recalcular_chaves, recalcular_dashboards
+from ..models import (
+    Competencia, LancamentoGasto, FolhaPagamento, DadosAlunos, DashboardCustoAluno,
+    ConsolidadoMunicipio, ConsolidadoUF, ConsolidadoTipoInstituicao,
+)
+from ..signals import dashboards_suspensos
+from .fabricas import criar_rede, reais
+
+CAMPOS_DASHBOARD = [
+    'instituicao_id', 'competencia_id', 'total_gastos_operacionais', 'total_folha_pagamento', 'total_geral',
+    'quantidade_alunos', 'custo_por_aluno', 'percentual_folha', 'percentual_operacionais',
+    'custo_por_aluno_anterior', 'variacao_mensal',
+]
+CAMPOS_CONSOLIDADO = [
+    'competencia_id', 'total_gastos_operacionais', 'total_folha_pagamento', 'total_geral',
+    'quantidade_alunos', 'quantidade_instituicoes', 'custo_por_aluno',
+]
+
+
+def estado_calculado():
+    """Dashboards e consolidados gravados, em ordem estável, para comparar dois cálculos"""
+    return {
+        'dashboards': list(DashboardCustoAluno.objects.order_by('instituicao_id', 'competencia_id').values(*CAMPOS_DASHBOARD)),
+        'municipios': list(ConsolidadoMunicipio.objects.order_by('municipio_id', 'competencia_id').values('municipio_id', *CAMPOS_CONSOLIDADO)),
+        'ufs': list(ConsolidadoUF.objects.order_by('uf_id', 'competencia_id').values('uf_id', *CAMPOS_CONSOLIDADO)),
+        'tipos': list(ConsolidadoTipoInstituicao.objects.order_by('tipo', 'competencia_id').values('tipo', *CAMPOS_CONSOLIDADO)),
+    }
+
+
+class DeltaDashboardTest(TransactionTestCase):
+    """
+    Fora de transação cada escrita aplica o delta direto no dashboard e nos
+    consolidados; o resultado tem de ser o mesmo do recálculo completo
+    """
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        self.itens = self.rede['itens']
+
+    def test_deltas_igualam_recalculo_completo(self):
+        dezembro, janeiro = self.rede['dezembro'], self.rede['janeiro']
+        for competencia in (dezembro, janeiro):
+            for indice, escola in enumerate(self.escolas):
+                DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=10 * (indice + 1))
+
+        lancamento = LancamentoGasto.objects.create(
+            instituicao=self.escolas[0], competencia=dezembro, item_gasto=self.itens[0], valor_unitario=reais('300'),
+        )
+        LancamentoGasto.objects.create(
+            instituicao=self.escolas[1], competencia=dezembro, item_gasto=self.itens[0], valor_unitario=reais('120'),
+        )
+        LancamentoGasto.objects.create(
+            instituicao=self.escolas[1], competencia=janeiro, item_gasto=self.itens[1], valor_unitario=reais('90'),
+        )
+        folha = FolhaPagamento.objects.create(
+            instituicao=self.escolas[2], competencia=janeiro, total_salarios=reais('1500'), total_encargos=reais('300'),
+        )
+
+        # Alteração de valor, troca de instituição (recálculo das duas chaves) e remoção
+        lancamento.valor_unitario = reais('450')
+        lancamento.save()
+        lancamento.instituicao = self.escolas[2]
+        lancamento.save()
+        folha.total_encargos = reais('600')
+        folha.save()
+        LancamentoGasto.objects.get(competencia=janeiro).delete()
+        alunos = DadosAlunos.objects.get(instituicao=self.escolas[0], competencia=janeiro)
+        alunos.quantidade_alunos = 25
+        alunos.save()
+
+        incremental = estado_calculado()
+        recalcular_dashboards()
+        self.assertEqual(incremental, estado_calculado())
+        self.assertEqual(len(incremental['dashboards']), 6)
+
+    def test_instancias_vencidas_nao_somam_o_mesmo_delta_duas_vezes(self):
+        dezembro, escola = self.rede['dezembro'], self.escolas[0]
+        DadosAlunos.objects.create(instituicao=escola, competencia=dezembro, quantidade_alunos=10)
+        criado = LancamentoGasto.objects.create(
+            instituicao=escola, competencia=dezembro, item_gasto=self.itens[0], valor_unitario=reais('100'),
+        )
+        # Duas cópias carregadas com 100: a segunda grava sem saber da primeira
+        primeira = LancamentoGasto.objects.get(pk=criado.pk)
+        segunda = LancamentoGasto.objects.get(pk=criado.pk)
+        primeira.valor_unitario = reais('200')
+        primeira.save()
+        segunda.valor_unitario = reais('150')
+        segunda.save()
+
+        dashboard = DashboardCustoAluno.objects.get(instituicao=escola, competencia=dezembro)
+        self.assertEqual(dashboard.total_gastos_operacionais, reais('150'))
+        self.assertEqual(dashboard.custo_por_aluno, reais('15'))
+        incremental = estado_calculado()
+        recalcular_dashboards()
+        self.assertEqual(incremental, estado_calculado())
+
+    def test_remover_alunos_zera_custo_como_o_recalculo(self):
+        dezembro, escola = self.rede['dezembro'], self.escolas[0]
+        alunos = DadosAlunos.objects.create(instituicao=escola, competencia=dezembro, quantidade_alunos=10)
+        LancamentoGasto.objects.create(
+            instituicao=escola, competencia=dezembro, item_gasto=self.itens[0], valor_unitario=reais('100'),
+        )
+        alunos.quantidade_alunos = 0
+        alunos.save()
+
+        dashboard = DashboardCustoAluno.objects.get(instituicao=escola, competencia=dezembro)
+        self.assertEqual(dashboard.custo_por_aluno, 0)
+        self.assertEqual(dashboard.percentual_operacionais, 0)
+        incremental = estado_calculado()
+        recalcular_dashboards()
+        self.assertEqual(incremental, estado_calculado())
+
+    def test_escrita_deixa_competencia_desatualizada_ate_o_recalculo(self):
+        dezembro = self.rede['dezembro']
+        recalcular_dashboards(competencias=[dezembro.id])
+        dezembro.refresh_from_db()
+        self.assertFalse(dezembro.desatualizada)
+
+        DadosAlunos.objects.create(instituicao=self.escolas[0], competencia=dezembro, quantidade_alunos=10)
+        dezembro.refresh_from_db()
+        self.assertTrue(dezembro.desatualizada)
+
+        recalcular_dashboards(competencias=[dezembro.id])
+        dezembro.refresh_from_db()
+        self.assertFalse(dezembro.desatualizada)
+
+    def test_alteracao_em_dezembro_atualiza_variacao_de_janeiro(self):
+        dezembro, janeiro = self.rede['dezembro'], self.rede['janeiro']
+        escola = self.escolas[0]
+        for competencia in (dezembro, janeiro):
+            DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=10)
+        LancamentoGasto.objects.create(instituicao=escola, competencia=janeiro, item_gasto=self.itens[0], valor_unitario=reais('150'))
+        LancamentoGasto.objects.create(instituicao=escola, competencia=dezembro, item_gasto=self.itens[0], valor_unitario=reais('100'))
+
+        dashboard = DashboardCustoAluno.objects.get(instituicao=escola, competencia=janeiro)
+        self.assertEqual(dashboard.custo_por_aluno_anterior, reais('10'))
+        self.assertEqual(dashboard.variacao_mensal, reais('50'))
+
+
+class VariacaoViradaAnoTest(TestCase):
+    """A competência anterior a janeiro é dezembro do ano anterior"""
+
+    def setUp(self):
+        self.rede = criar_rede(quantidade_instituicoes=2)
+
+    def lancar(self, escola, competencia, valor, alunos):
+        DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=alunos)
+        LancamentoGasto.objects.create(
+            instituicao=escola, competencia=competencia, item_gasto=self.rede['itens'][0], valor_unitario=reais(valor),
+        )
+
+    def test_janeiro_compara_com_dezembro_do_ano_anterior(self):
+        escola, outra = self.rede['instituicoes']
+        dezembro, janeiro = self.rede['dezembro'], self.rede['janeiro']
+        self.lancar(escola, dezembro, '200', 10)
+        self.lancar(escola, janeiro, '150', 10)
+        # Sem dezembro: a variação fica vazia em vez de comparar com outra competência
+        self.lancar(outra, janeiro, '100', 10)
+        recalcular_dashboards()
+
+        janeiro_escola = DashboardCustoAluno.objects.get(instituicao=escola, competencia=janeiro)
+        self.assertEqual(janeiro_escola.custo_por_aluno_anterior, reais('20'))
+        self.assertEqual(janeiro_escola.variacao_mensal, reais('-25'))
+
+        janeiro_outra = DashboardCustoAluno.objects.get(instituicao=outra, competencia=janeiro)
+        self.assertIsNone(janeiro_outra.custo_por_aluno_anterior)
+        self.assertIsNone(janeiro_outra.variacao_mensal)
+
+        # Não há novembro/2024
+        dezembro_escola = DashboardCustoAluno.objects.get(instituicao=escola, competencia=dezembro)
+        self.assertIsNone(dezembro_escola.variacao_mensal)
+
+    def test_recalcular_so_dezembro_atualiza_janeiro(self):
+        escola = self.rede['instituicoes'][0]
+        dezembro, janeiro = self.rede['dezembro'], self.rede['janeiro']
+        self.lancar(escola, dezembro, '200', 10)
+        self.lancar(escola, janeiro, '150', 10)
+        recalcular_dashboards()
+
+        LancamentoGasto.objects.filter(competencia=dezembro).update(valor_unitario=reais('100'), valor_total=reais('100'))
+        recalcular_dashboards(competencias=[dezembro.id])
+
+        janeiro_escola = DashboardCustoAluno.objects.get(instituicao=escola, competencia=janeiro)
+        self.assertEqual(janeiro_escola.custo_por_aluno_anterior, reais('10'))
+        self.assertEqual(janeiro_escola.variacao_mensal, reais('50'))
+
+
+    def test_variacao_sobre_centavos_fica_no_limite_do_campo(self):
+        escola = self.rede['instituicoes'][0]
+        # Pelo recálculo das chaves no commit e pelo recálculo completo
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lancar(escola, self.rede['dezembro'], '0.01', 1)
+            self.lancar(escola, self.rede['janeiro'], '900000', 1)
+        janeiro = DashboardCustoAluno.objects.get(instituicao=escola, competencia=self.rede['janeiro'])
+        self.assertEqual(janeiro.variacao_mensal, reais('9999999.99'))
+
+        recalcular_dashboards()
+        janeiro.refresh_from_db()
+        self.assertEqual(janeiro.variacao_mensal, reais('9999999.99'))
+
+
+class DashboardsSuspensosTest(TransactionTestCase):
+    """Escritas em lote acumulam as chaves e recalculam uma única vez, após o commit"""
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.dezembro = self.rede['dezembro']
+
+    def lancar_em_lote(self):
+        for escola in self.rede['instituicoes'][:2]:
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.dezembro, quantidade_alunos=10)
+            for item in self.rede['itens']:
+                LancamentoGasto.objects.create(
+                    instituicao=escola, competencia=self.dezembro, item_gasto=item, valor_unitario=reais('50'),
+                )
+
+    def test_recalcula_cada_chave_uma_vez_apos_o_commit(self):
+        versao = self.dezembro.versao_dados
+        with mock.patch('app_principal.signals.recalcular_chaves', wraps=recalcular_chaves) as recalcular:
+            with transaction.atomic(), dashboards_suspensos() as chaves:
+                self.lancar_em_lote()
+                # Bloco aninhado (ex.: importação chamada por um comando) usa o mesmo acumulador
+                with dashboards_suspensos() as aninhadas:
+                    FolhaPagamento.objects.create(
+                        instituicao=self.rede['instituicoes'][0], competencia=self.dezembro,
+                        total_salarios=reais('400'), total_encargos=reais('100'),
+                    )
+                self.assertIs(aninhadas, chaves)
+                self.assertFalse(DashboardCustoAluno.objects.exists())
+                recalcular.assert_not_called()
+
+        recalcular.assert_called_once()
+        escolas = self.rede['instituicoes']
+        self.assertEqual(recalcular.call_args.args[0], {(escolas[0].id, self.dezembro.id), (escolas[1].id, self.dezembro.id)})
+
+        totais = dict(DashboardCustoAluno.objects.values_list('instituicao_id', 'total_geral'))
+        self.assertEqual(totais, {escolas[0].id: reais('600'), escolas[1].id: reais('100')})
+        self.dezembro.refresh_from_db()
+        self.assertEqual(self.dezembro.versao_dados, versao + 1)
+
+    def test_rollback_descarta_o_recalculo(self):
+        with mock.patch('app_principal.signals.recalcular_chaves') as recalcular:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic(), dashboards_suspensos():
+                    self.lancar_em_lote()
+                    raise RuntimeError
+        recalcular.assert_not_called()
+        self.assertFalse(LancamentoGasto.objects.exists())
+
+    def test_sem_atualizar_ao_final_so_marca_desatualizada(self):
+        recalcular_dashboards(competencias=[self.dezembro.id])
+        with transaction.atomic(), dashboards_suspensos(atualizar_ao_final=False):
+            self.lancar_em_lote()
+
+        self.assertFalse(DashboardCustoAluno.objects.exists())
+        self.dezembro.refresh_from_db()
+        self.assertTrue(self.dezembro.desatualizada)
+
+
+class RecalculoNoCommitTest(TransactionTestCase):
+    """Dentro de transação as escritas recalculam as chaves alteradas uma vez, no commit"""
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.dezembro = self.rede['dezembro']
+        self.escola = self.rede['instituicoes'][0]
+        DadosAlunos.objects.create(instituicao=self.escola, competencia=self.dezembro, quantidade_alunos=10)
+
+    def lancar(self, item, valor):
+        return LancamentoGasto.objects.create(
+            instituicao=self.escola, competencia=self.dezembro, item_gasto=item, valor_unitario=reais(valor),
+        )
+
+    def test_rollback_de_savepoint_nao_perde_o_recalculo(self):
+        with mock.patch('app_principal.signals.recalcular_chaves', wraps=recalcular_chaves) as recalcular:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self.lancar(self.rede['itens'][0], '100')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                # Mesma chave do savepoint desfeito: o recálculo tem de continuar agendado
+                self.lancar(self.rede['itens'][1], '70')
+                recalcular.assert_not_called()
+
+        recalcular.assert_called_once()
+        dashboard = DashboardCustoAluno.objects.get(instituicao=self.escola, competencia=self.dezembro)
+        self.assertEqual(dashboard.total_gastos_operacionais, reais('70'))
+
+    def test_transacao_seguinte_usa_novo_acumulador(self):
+        with transaction.atomic():
+            self.lancar(self.rede['itens'][0], '100')
+        with mock.patch('app_principal.signals.recalcular_chaves') as recalcular:
+            with transaction.atomic():
+                FolhaPagamento.objects.create(
+                    instituicao=self.rede['instituicoes'][1], competencia=self.dezembro,
+                    total_salarios=reais('400'), total_encargos=reais('100'),
+                )
+        recalcular.assert_called_once_with({(self.rede['instituicoes'][1].id, self.dezembro.id)})
@@ -0,0 +1,131 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..models import CustomUser, ComboGasto, ItemCombo, ItemGasto, Instituicao, LancamentoGasto, DadosAlunos, DashboardCustoAluno
+from .fabricas import criar_rede, reais
+
+
+class ComboTestCase(APITestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        self.itens = self.rede['itens']
+        self.combo = ComboGasto.objects.create(nome='Merenda', descricao='Kit mensal', competencia=self.rede['dezembro'])
+        for item in self.itens:
+            ItemCombo.objects.create(combo=self.combo, item_gasto=item, valor_padrao=reais('10'))
+        self.url = reverse('combo-lancamento-list', kwargs={'combo_id': self.combo.id})
+        self.client.force_authenticate(self.rede['responsavel'])
+
+    def lancar_avulso(self, escola, item, valor='99'):
+        return LancamentoGasto.objects.create(
+            instituicao=escola, competencia=self.rede['dezembro'], item_gasto=item, valor_unitario=reais(valor),
+        )
+
+
+class LancamentoEmLoteTest(ComboTestCase):
+
+    def payload(self, instituicoes, **extras):
+        return {
+            'instituicoes': instituicoes,
+            'itens': [{'item_gasto_id': item.id, 'valor_unitario': '12.50'} for item in self.itens],
+            **extras,
+        }
+
+    def test_todas_as_instituicoes_com_resumo_por_escola(self):
+        self.lancar_avulso(self.escolas[0], self.itens[0])
+        for escola in self.escolas:
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.rede['dezembro'], quantidade_alunos=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(self.url, self.payload('todas'), format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        detalhes = resposta.data['detalhes']
+        self.assertEqual(detalhes['total_itens_processados'], 5)
+        resumo = {linha['instituicao_id']: (linha['criados'], linha['ignorados']) for linha in detalhes['instituicoes']}
+        self.assertEqual(resumo, {self.escolas[0].id: (1, 1), self.escolas[1].id: (2, 0), self.escolas[2].id: (2, 0)})
+        # O lançamento avulso não é sobrescrito
+        self.assertEqual(LancamentoGasto.objects.get(instituicao=self.escolas[0], item_gasto=self.itens[0]).valor_unitario, reais('99'))
+        # Um recálculo no commit para as escolas do lote
+        totais = dict(DashboardCustoAluno.objects.values_list('instituicao_id', 'total_gastos_operacionais'))
+        self.assertEqual(totais, {self.escolas[0].id: reais('111.50'), self.escolas[1].id: reais('25'), self.escolas[2].id: reais('25')})
+
+    def test_lista_de_ids_e_itens_fora_do_combo(self):
+        avulso = ItemGasto.objects.create(nome='Fora do combo', categoria=self.itens[0].categoria)
+        payload = self.payload([self.escolas[1].id])
+        payload['itens'].append({'item_gasto_id': avulso.id, 'valor_unitario': '1'})
+
+        resposta = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.data['detalhes']['itens_fora_do_combo'], [avulso.id])
+        self.assertEqual(set(LancamentoGasto.objects.values_list('instituicao_id', flat=True)), {self.escolas[1].id})
+
+    def test_instituicao_de_outro_responsavel_invalida_o_lote(self):
+        outro = CustomUser.objects.create_user(username='outro', password='senha')
+        alheia = Instituicao.objects.create(nome='Alheia', municipio=self.rede['municipios'][0], responsavel=outro)
+
+        resposta = self.client.post(self.url, self.payload([self.escolas[0].id, alheia.id]), format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn(str(alheia.id), str(resposta.data['detalhes']['instituicoes']))
+        self.assertFalse(LancamentoGasto.objects.exists())
+
+    def test_valor_invalido_e_rejeitado_antes_de_gravar(self):
+        payload = self.payload('todas')
+        payload['itens'][1]['valor_unitario'] = '-3'
+        resposta = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(LancamentoGasto.objects.exists())
+
+    def test_instituicao_e_instituicoes_sao_exclusivas(self):
+        resposta = self.client.post(self.url, self.payload('todas', instituicao=self.escolas[0].id), format='json')
+        self.assertEqual(resposta.status_code, 400)
+
+
+class MatrizLancamentosTest(ComboTestCase):
+
+    def test_matriz_instituicao_por_item(self):
+        self.lancar_avulso(self.escolas[0], self.itens[0])
+        self.client.post(self.url, {
+            'instituicao': self.escolas[1].id,
+            'itens': [{'item_gasto_id': self.itens[1].id, 'valor_unitario': '10'}],
+        }, format='json')
+
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        matriz = {linha['instituicao_id']: linha for linha in resposta.data['matriz']}
+        self.assertEqual(list(matriz), [escola.id for escola in self.escolas])
+
+        primeira = matriz[self.escolas[0].id]
+        self.assertEqual((primeira['total_lancados'], primeira['total_pendentes']), (1, 1))
+        situacao = primeira['itens'][0]
+        self.assertEqual((situacao['lancado'], situacao['deste_combo'], situacao['valor_unitario']), (True, False, '99.00'))
+        segunda = matriz[self.escolas[1].id]
+        self.assertEqual([item['deste_combo'] for item in segunda['itens']], [False, True])
+        self.assertEqual(matriz[self.escolas[2].id]['total_lancados'], 0)
+
+        # Nenhum item foi lançado em todas as escolas; a listagem traz só os deste combo
+        por_item = {item['item_gasto_id']: item for item in resposta.data['itens_do_combo']}
+        self.assertEqual([por_item[item.id]['instituicoes_lancadas'] for item in self.itens], [1, 1])
+        self.assertFalse(any(item['ja_lancado'] for item in por_item.values()))
+
+    def consultas_da_listagem(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return len(consultas)
+
+    def test_numero_de_consultas_nao_cresce_com_escolas_e_itens(self):
+        for escola in self.escolas:
+            self.lancar_avulso(escola, self.itens[0])
+        antes = self.consultas_da_listagem()
+
+        for indice in range(3):
+            item = ItemGasto.objects.create(nome=f'Extra {indice}', categoria=self.itens[0].categoria)
+            ItemCombo.objects.create(combo=self.combo, item_gasto=item, valor_padrao=reais('1'))
+            escola = Instituicao.objects.create(
+                nome=f'Nova {indice}', municipio=self.rede['municipios'][0], responsavel=self.rede['responsavel'],
+            )
+            self.lancar_avulso(escola, item)
+        self.assertEqual(self.consultas_da_listagem(), antes)
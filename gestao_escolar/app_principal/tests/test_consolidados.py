@@ -0,0 +1,62 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..calculos import recalcular_dashboards
+from ..models import LancamentoGasto, FolhaPagamento, DadosAlunos, ConsolidadoMunicipio, ConsolidadoUF, ConsolidadoTipoInstituicao
+from .fabricas import criar_rede, reais
+
+
+class ConsolidadosTest(APITestCase):
+    """Escolas 0 e 2 ficam no município de SP, a escola 1 no do RJ"""
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.dezembro, self.janeiro = self.rede['dezembro'], self.rede['janeiro']
+        self.escolas = self.rede['instituicoes']
+        self.escolas[2].tipo = 'SECRETARIA'
+        self.escolas[2].save()
+        for escola, alunos, gastos in zip(self.escolas, [10, 20, 30], ['100', '300', '500']):
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.dezembro, quantidade_alunos=alunos)
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=self.dezembro, item_gasto=self.rede['itens'][0], valor_unitario=reais(gastos),
+            )
+        FolhaPagamento.objects.create(
+            instituicao=self.escolas[0], competencia=self.dezembro, total_salarios=reais('250'), total_encargos=reais('50'),
+        )
+        recalcular_dashboards()
+
+    def test_municipio_soma_as_escolas_e_pondera_pelos_alunos(self):
+        sao_paulo = ConsolidadoMunicipio.objects.get(municipio=self.rede['municipios'][0], competencia=self.dezembro)
+        self.assertEqual(sao_paulo.quantidade_instituicoes, 2)
+        self.assertEqual(sao_paulo.total_gastos_operacionais, reais('600'))
+        self.assertEqual(sao_paulo.total_folha_pagamento, reais('300'))
+        self.assertEqual(sao_paulo.quantidade_alunos, 40)
+        # Média ponderada (900 / 40), não a média dos custos das escolas (40 e 16,67)
+        self.assertEqual(sao_paulo.custo_por_aluno, reais('22.50'))
+
+        rio = ConsolidadoUF.objects.get(uf=self.rede['municipios'][1].uf, competencia=self.dezembro)
+        self.assertEqual((rio.quantidade_instituicoes, rio.total_geral, rio.custo_por_aluno), (1, reais('300'), reais('15')))
+
+    def test_tipo_de_instituicao(self):
+        por_tipo = dict(ConsolidadoTipoInstituicao.objects.filter(competencia=self.dezembro).values_list('tipo', 'total_geral'))
+        self.assertEqual(por_tipo, {'ESCOLA': reais('700'), 'SECRETARIA': reais('500')})
+
+    def test_endpoint_usa_a_ultima_competencia_e_filtra_a_referencia(self):
+        DadosAlunos.objects.create(instituicao=self.escolas[1], competencia=self.janeiro, quantidade_alunos=5)
+        recalcular_dashboards(competencias=[self.janeiro.id])
+        self.client.force_authenticate(self.rede['responsavel'])
+
+        resposta = self.client.get(reverse('consolidados', args=['uf']))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([linha['competencia'] for linha in resposta.data['consolidados']], [self.janeiro.id])
+
+        sao_paulo = self.rede['municipios'][0]
+        resposta = self.client.get(
+            reverse('consolidados', args=['municipio']), {'competencia_id': self.dezembro.id, 'referencia': sao_paulo.id},
+        )
+        [linha] = resposta.data['consolidados']
+        self.assertEqual((linha['municipio_nome'], linha['uf_sigla'], linha['quantidade_alunos']), (sao_paulo.nome, 'SP', 40))
+
+    def test_nivel_invalido(self):
+        self.client.force_authenticate(self.rede['responsavel'])
+        self.assertEqual(self.client.get(reverse('consolidados', args=['estado'])).status_code, 404)
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..calculos import recalcular_dashboards
+from ..models import LancamentoGasto, DadosAlunos, Municipio
+from .fabricas import criar_rede, reais
+
+
+class DashboardApiTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        for escola in self.escolas:
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.rede['dezembro'], quantidade_alunos=10)
+        recalcular_dashboards()
+        self.client.force_authenticate(self.rede['responsavel'])
+        self.url = reverse('dashboard')
+
+
+class RevalidacaoTest(DashboardApiTest):
+
+    def test_etag_igual_responde_304(self):
+        primeira = self.client.get(self.url)
+        self.assertEqual(primeira.status_code, 200)
+        self.assertIn('Last-Modified', primeira)
+        self.assertIn('private', primeira['Cache-Control'])
+
+        revalidada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(revalidada['ETag'], primeira['ETag'])
+
+    def test_etag_depende_dos_parametros(self):
+        primeira = self.client.get(self.url)
+        filtrada = self.client.get(self.url, {'instituicao_id': self.escolas[0].id}, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(filtrada.status_code, 200)
+        self.assertEqual(len(filtrada.data['dashboards']), 1)
+
+    def test_escrita_nos_dados_invalida_a_resposta(self):
+        primeira = self.client.get(self.url)
+        LancamentoGasto.objects.create(
+            instituicao=self.escolas[0], competencia=self.rede['dezembro'], item_gasto=self.rede['itens'][0],
+            valor_unitario=reais('90'),
+        )
+        recalcular_dashboards()
+
+        nova = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(nova.status_code, 200)
+        self.assertNotEqual(nova['ETag'], primeira['ETag'])
+        totais = {linha['instituicao']: linha['total_geral'] for linha in nova.data['dashboards']}
+        self.assertEqual(totais[self.escolas[0].id], '90.00')
+
+    def test_alteracao_de_cadastro_invalida_a_resposta(self):
+        primeira = self.client.get(self.url)
+        municipio = Municipio.objects.get(pk=self.rede['municipios'][0].pk)
+        municipio.nome = 'Outro nome'
+        municipio.save()
+
+        nova = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(nova.status_code, 200)
+        self.assertNotEqual(nova['ETag'], primeira['ETag'])
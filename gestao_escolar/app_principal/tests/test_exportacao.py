@@ -0,0 +1,56 @@
+import csv
+import io
+
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..models import CustomUser, Instituicao, LancamentoGasto, FolhaPagamento
+from .fabricas import criar_rede, reais
+
+
+def ler_csv(resposta):
+    conteudo = b''.join(resposta.streaming_content).decode('utf-8')
+    return list(csv.DictReader(io.StringIO(conteudo.lstrip('\ufeff'))))
+
+
+class ExportacaoCsvTest(APITestCase):
+
+    def setUp(self):
+        self.rede = criar_rede(quantidade_instituicoes=2)
+        self.escolas = self.rede['instituicoes']
+        outro = CustomUser.objects.create_user(username='outro', password='senha')
+        self.alheia = Instituicao.objects.create(nome='Alheia', municipio=self.rede['municipios'][0], responsavel=outro)
+        for competencia in (self.rede['dezembro'], self.rede['janeiro']):
+            for escola in (*self.escolas, self.alheia):
+                LancamentoGasto.objects.create(
+                    instituicao=escola, competencia=competencia, item_gasto=self.rede['itens'][0],
+                    valor_unitario=reais('10.50'), observacao='Linha; com "aspas"',
+                )
+                FolhaPagamento.objects.create(
+                    instituicao=escola, competencia=competencia, total_salarios=reais('100'), total_encargos=reais('20'),
+                )
+
+    def test_lancamentos_do_responsavel_filtrados_pela_competencia(self):
+        self.client.force_authenticate(self.rede['responsavel'])
+        resposta = self.client.get(reverse('exportar', args=['lancamentos']), {'competencia_id': self.rede['janeiro'].id})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment; filename="lancamentos_', resposta['Content-Disposition'])
+        linhas = ler_csv(resposta)
+        self.assertEqual([linha['instituicao'] for linha in linhas], [escola.nome for escola in self.escolas])
+        self.assertEqual({(linha['ano'], linha['mes'], linha['valor_total']) for linha in linhas}, {('2025', '1', '10.50')})
+        self.assertEqual(linhas[0]['observacao'], 'Linha; com "aspas"')
+        self.assertEqual(linhas[0]['combo'], '')
+
+    def test_folha_de_toda_a_rede_por_ano(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='rh', password='senha', cargo='RH'))
+        resposta = self.client.get(reverse('exportar', args=['folha']), {'ano': 2024})
+        linhas = ler_csv(resposta)
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual({linha['valor_total'] for linha in linhas}, {'120.00'})
+
+    def test_tipo_e_filtros_invalidos(self):
+        self.client.force_authenticate(self.rede['responsavel'])
+        self.assertEqual(self.client.get(reverse('exportar', args=['alunos'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('exportar', args=['folha']), {'ano': 'dois mil'}).status_code, 400)
@@ -0,0 +1,78 @@
+from django.test import TestCase
+
+from ..exportacao import filtros_relatorio
+from ..models import (
+    Competencia, ItemGasto, LancamentoGasto, FolhaPagamento, DadosAlunos,
+    FechamentoCompetencia, FechamentoInstituicao, FechamentoCategoria,
+)
+from ..relatorios import gerar_relatorio
+from .fabricas import criar_rede, reais
+
+
+class FechamentoCompetenciaTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        self.dezembro = self.rede['dezembro']
+        for escola in self.escolas:
+            DadosAlunos.objects.create(instituicao=escola, competencia=self.dezembro, quantidade_alunos=10)
+            for item in self.rede['itens']:
+                LancamentoGasto.objects.create(
+                    instituicao=escola, competencia=self.dezembro, item_gasto=item, valor_unitario=reais('50'),
+                )
+        FolhaPagamento.objects.create(
+            instituicao=self.escolas[0], competencia=self.dezembro, total_salarios=reais('900'), total_encargos=reais('100'),
+        )
+
+    def alterar_situacao(self, aberta):
+        competencia = Competencia.objects.get(pk=self.dezembro.pk)
+        competencia.aberta = aberta
+        competencia._usuario_fechamento = self.rede['responsavel']
+        with self.captureOnCommitCallbacks(execute=True):
+            competencia.save(update_fields=['aberta'])
+
+    def total_do_relatorio(self):
+        [totais] = gerar_relatorio(filtros_relatorio(competencia_id=self.dezembro.id))
+        return totais['total_geral']
+
+    def test_fechar_grava_o_retrato_da_rede_instituicoes_e_categorias(self):
+        self.alterar_situacao(aberta=False)
+
+        fechamento = FechamentoCompetencia.objects.get(competencia=self.dezembro)
+        self.assertEqual(fechamento.usuario_fechamento, self.rede['responsavel'])
+        self.assertEqual(
+            (fechamento.total_gastos_operacionais, fechamento.total_folha_pagamento, fechamento.quantidade_alunos),
+            (reais('300'), reais('1000'), 30),
+        )
+        self.assertEqual((fechamento.quantidade_instituicoes, fechamento.quantidade_lancamentos), (3, 6))
+
+        primeira = FechamentoInstituicao.objects.get(instituicao=self.escolas[0])
+        self.assertEqual((primeira.total_geral, primeira.custo_por_aluno), (reais('1100'), reais('110')))
+        self.assertEqual(FechamentoCategoria.objects.filter(fechamento=fechamento).count(), 3)
+
+    def test_relatorio_le_o_retrato_ate_a_reabertura(self):
+        self.alterar_situacao(aberta=False)
+        # Uma alteração direta nos dados brutos não aparece enquanto a competência estiver fechada
+        LancamentoGasto.objects.filter(instituicao=self.escolas[1]).update(
+            valor_unitario=reais('500'), valor_total=reais('500'),
+        )
+        self.assertEqual(self.total_do_relatorio(), reais('1300'))
+
+        self.alterar_situacao(aberta=True)
+        self.assertFalse(FechamentoCompetencia.objects.exists())
+        self.assertFalse(FechamentoInstituicao.objects.exists())
+        self.assertEqual(self.total_do_relatorio(), reais('2200'))
+
+    def test_fechar_de_novo_substitui_o_retrato(self):
+        self.alterar_situacao(aberta=False)
+        self.alterar_situacao(aberta=True)
+        giz = ItemGasto.objects.create(nome='Giz', categoria=self.rede['itens'][0].categoria)
+        LancamentoGasto.objects.create(
+            instituicao=self.escolas[2], competencia=self.dezembro, item_gasto=giz, valor_unitario=reais('25'),
+        )
+        self.alterar_situacao(aberta=False)
+
+        fechamento = FechamentoCompetencia.objects.get()
+        self.assertEqual((fechamento.total_gastos_operacionais, fechamento.quantidade_lancamentos), (reais('325'), 7))
+        self.assertEqual(self.total_do_relatorio(), reais('1325'))
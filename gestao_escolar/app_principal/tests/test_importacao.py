@@ -0,0 +1,153 @@
+import io
+import os
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..importacao import ErroArquivo, importar_alunos, importar_folha
+from ..models import Competencia, CustomUser, FolhaPagamento, DadosAlunos, DashboardCustoAluno
+from .fabricas import criar_rede, reais
+
+
+def arquivo(*linhas, codificacao='utf-8'):
+    return io.BytesIO('\n'.join(linhas).encode(codificacao))
+
+
+class ImportacaoFolhaTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        self.inep = [escola.codigo_inep for escola in self.escolas]
+
+    def test_cria_atualiza_e_relata_cada_linha_com_erro(self):
+        existente = FolhaPagamento.objects.create(
+            instituicao=self.escolas[1], competencia=self.rede['dezembro'], total_salarios=reais('1'), total_encargos=reais('1'),
+        )
+        Competencia.objects.create(ano=2024, mes=11, aberta=False)
+        relatorio = importar_folha(arquivo(
+            'codigo_inep;competencia;total_salarios;total_encargos;observacao',
+            f'{self.inep[0]};2024-12;1.234,56;100,00;Folha de dezembro',
+            f'{self.inep[1]};12/2024;2000.00;300.10;',
+            f'99999999;2024-12;10;1;',
+            f'{self.inep[2]};2024-11;10;1;',
+            f'{self.inep[2]};2024-12;-5;abc;',
+            f'{self.inep[0]};2024-12;10;1;',
+            f'{self.inep[2]};2024-12;123456789012345;1;',
+        ))
+
+        self.assertEqual((relatorio['total_linhas'], relatorio['criadas'], relatorio['atualizadas']), (7, 1, 1))
+        erros = {erro['linha']: ' | '.join(erro['erros']) for erro in relatorio['erros']}
+        self.assertEqual(sorted(erros), [4, 5, 6, 7, 8])
+        self.assertIn('não encontrada', erros[4])
+        self.assertIn('competência fechada', erros[5])
+        self.assertIn('total_salarios não pode ser negativo', erros[6])
+        self.assertIn("total_encargos inválido: 'abc'", erros[6])
+        self.assertIn('mesma instituição e competência da linha 2', erros[7])
+        self.assertIn('excede o limite', erros[8])
+
+        nova = FolhaPagamento.objects.get(instituicao=self.escolas[0])
+        self.assertEqual((nova.total_salarios, nova.valor_total, nova.observacao), (reais('1234.56'), reais('1334.56'), 'Folha de dezembro'))
+        existente.refresh_from_db()
+        self.assertEqual(existente.valor_total, reais('2300.10'))
+
+    def test_recalcula_os_dashboards_uma_vez_no_commit(self):
+        DadosAlunos.objects.create(instituicao=self.escolas[0], competencia=self.rede['dezembro'], quantidade_alunos=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_folha(arquivo('codigo_inep,competencia,total_salarios,total_encargos', f'{self.inep[0]},2024-12,900,100'))
+        dashboard = DashboardCustoAluno.objects.get(instituicao=self.escolas[0])
+        self.assertEqual((dashboard.total_folha_pagamento, dashboard.custo_por_aluno), (reais('1000'), reais('100')))
+
+    def test_arquivo_em_latin1_e_cabecalho_incompleto(self):
+        self.escolas[0].codigo_inep = 'ESCOLA-Ç'
+        self.escolas[0].save()
+        relatorio = importar_folha(arquivo(
+            'codigo_inep;competencia;total_salarios;total_encargos', 'ESCOLA-Ç;2024-12;10;1', codificacao='latin-1',
+        ))
+        self.assertEqual(relatorio['criadas'], 1)
+
+        with self.assertRaisesMessage(ErroArquivo, 'total_encargos'):
+            importar_folha(arquivo('codigo_inep;competencia;total_salarios', '1;2024-12;10'))
+
+
+class ImportacaoFolhaApiTest(APITestCase):
+
+    def test_endpoint_do_rh_devolve_o_relatorio(self):
+        rede = criar_rede(quantidade_instituicoes=1)
+        self.client.force_authenticate(CustomUser.objects.create_user(username='rh', password='senha', cargo='RH'))
+        conteudo = f'codigo_inep,competencia,total_salarios,total_encargos\n{rede["instituicoes"][0].codigo_inep},2025-01,10,1\nx,2025-01,10,1\n'
+        resposta = self.client.post(
+            reverse('rh-folha-pagamento-importar'),
+            {'arquivo': SimpleUploadedFile('folha.csv', conteudo.encode(), content_type='text/csv')},
+            format='multipart',
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((resposta.data['criadas'], resposta.data['com_erro']), (1, 1))
+        self.assertEqual(FolhaPagamento.objects.get().usuario_processamento.username, 'rh')
+
+        self.assertEqual(self.client.post(reverse('rh-folha-pagamento-importar'), {}, format='multipart').status_code, 400)
+
+
+class ImportacaoAlunosTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        self.inep = [escola.codigo_inep for escola in self.escolas]
+
+    def test_upsert_sobre_instituicao_e_competencia(self):
+        DadosAlunos.objects.create(instituicao=self.escolas[0], competencia=self.rede['janeiro'], quantidade_alunos=5)
+        relatorio = importar_alunos(arquivo(
+            'codigo_inep;quantidade_alunos',
+            f'{self.inep[0]};1.250',
+            f'{self.inep[1]};300',
+            f'{self.inep[2]};0',
+        ), competencia=self.rede['janeiro'])
+
+        self.assertEqual((relatorio['criadas'], relatorio['atualizadas'], relatorio['com_erro']), (1, 1, 1))
+        self.assertEqual(relatorio['erros'][0]['linha'], 4)
+        quantidades = dict(DadosAlunos.objects.values_list('instituicao_id', 'quantidade_alunos'))
+        self.assertEqual(quantidades, {self.escolas[0].id: 1250, self.escolas[1].id: 300})
+
+    def test_competencia_por_linha_recalcula_no_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            relatorio = importar_alunos(arquivo(
+                'codigo_inep,quantidade_alunos,competencia',
+                f'{self.inep[0]},10,2024-12',
+                f'{self.inep[0]},20,01/2025',
+                f'{self.inep[1]},30,2023-01',
+            ))
+        self.assertEqual(relatorio['criadas'], 2)
+        self.assertIn('competência não cadastrada', relatorio['erros'][0]['erros'])
+        self.assertEqual(
+            sorted(DashboardCustoAluno.objects.values_list('competencia__mes', 'quantidade_alunos')),
+            [(1, 20), (12, 10)],
+        )
+
+    def test_comando_de_gestao(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv:
+            csv.write(f'codigo_inep;quantidade_alunos\n{self.inep[2]};42\n')
+        self.addCleanup(os.remove, csv.name)
+        saida = io.StringIO()
+
+        call_command('importar_alunos', csv.name, competencia='2024-12', stdout=saida)
+        self.assertIn('1 criada(s)', saida.getvalue())
+        self.assertEqual(DadosAlunos.objects.get().quantidade_alunos, 42)
+
+
+class ImportacaoAlunosAdminTest(TestCase):
+
+    def test_upload_no_admin(self):
+        rede = criar_rede(quantidade_instituicoes=1)
+        self.client.force_login(CustomUser.objects.create_superuser(username='admin', password='senha', cargo='ADMIN'))
+        conteudo = f'codigo_inep;quantidade_alunos\n{rede["instituicoes"][0].codigo_inep};15\n'
+        resposta = self.client.post(reverse('admin_sistema:app_principal_dadosalunos_importar'), {
+            'arquivo': SimpleUploadedFile('censo.csv', conteudo.encode()),
+            'competencia': rede['dezembro'].id,
+        })
+        self.assertRedirects(resposta, reverse('admin_sistema:app_principal_dadosalunos_changelist'))
+        self.assertEqual(DadosAlunos.objects.get().quantidade_alunos, 15)
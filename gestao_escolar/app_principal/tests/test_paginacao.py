@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..calculos import recalcular_dashboards
+from ..models import CustomUser, FolhaPagamento, DadosAlunos
+from .fabricas import criar_rede, reais
+
+
+class PaginacaoCursorTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.rede = criar_rede()
+        for competencia in (self.rede['dezembro'], self.rede['janeiro']):
+            for escola in self.rede['instituicoes']:
+                FolhaPagamento.objects.create(
+                    instituicao=escola, competencia=competencia, total_salarios=reais('100'), total_encargos=reais('10'),
+                )
+                DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=10)
+        self.rh = CustomUser.objects.create_user(username='rh', password='senha', cargo='RH')
+
+    def test_paginas_seguem_o_cursor_sem_repetir_linhas(self):
+        self.client.force_authenticate(self.rh)
+        resposta = self.client.get(reverse('rh-folha-pagamento-list'), {'tamanho': 4, 'fields': 'id,valor_total'})
+        self.assertEqual(resposta.status_code, 200)
+        primeira = resposta.data['results']
+        self.assertEqual(len(primeira), 4)
+        self.assertEqual(set(primeira[0]), {'id', 'valor_total'})
+        self.assertEqual(primeira[0]['valor_total'], '110.00')
+        # O cursor carrega tamanho e fields para a próxima página
+        segunda = self.client.get(resposta.data['next']).data
+
+        self.assertIsNone(segunda['next'])
+        self.assertEqual(set(segunda['results'][0]), {'id', 'valor_total'})
+        ids = [linha['id'] for linha in primeira + segunda['results']]
+        self.assertEqual(ids, sorted(FolhaPagamento.objects.values_list('id', flat=True), reverse=True))
+
+    def test_tamanho_maximo_da_pagina(self):
+        self.client.force_authenticate(self.rh)
+        resposta = self.client.get(reverse('rh-instituicoes-list'), {'tamanho': 100000})
+        self.assertEqual(len(resposta.data['results']), 3)
+
+    def test_dashboard_pagina_e_recorta_campos(self):
+        recalcular_dashboards()
+        self.client.force_authenticate(self.rede['responsavel'])
+        resposta = self.client.get(reverse('dashboard'), {'tamanho': 2, 'fields': 'instituicao,custo_por_aluno'})
+        self.assertEqual(len(resposta.data['dashboards']), 2)
+        self.assertEqual(set(resposta.data['dashboards'][0]), {'instituicao', 'custo_por_aluno'})
+        self.assertEqual(resposta.data['total_instituicoes'], 3)
+
+        restante = self.client.get(resposta.data['next']).data
+        self.assertEqual(len(restante['dashboards']), 1)
+        self.assertEqual(restante['periodo_selecionado'], self.rede['janeiro'].periodo)
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..models import Competencia, CategoriaGasto, ItemGasto, LancamentoGasto, FolhaPagamento, DadosAlunos, UnidadeFederativa
+from ..relatorios import TEMPO_CACHE_RELATORIOS, gerar_relatorio, relatorio_em_cache
+from ..exportacao import filtros_relatorio
+from .fabricas import criar_rede, reais
+
+
+def montar_dados(rede):
+    """Escolas 0 e 2 em SP, escola 1 no RJ; alunos diferentes em cada mês"""
+    escolas, dezembro, janeiro = rede['instituicoes'], rede['dezembro'], rede['janeiro']
+    obras = CategoriaGasto.objects.create(codigo='02', nome='Obras')
+    reforma = ItemGasto.objects.create(nome='Reforma', categoria=obras)
+    for competencia, alunos in ((dezembro, 10), (janeiro, 30)):
+        for escola in escolas:
+            DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=alunos)
+            LancamentoGasto.objects.create(
+                instituicao=escola, competencia=competencia, item_gasto=rede['itens'][0], valor_unitario=reais('100'),
+            )
+    LancamentoGasto.objects.create(instituicao=escolas[0], competencia=janeiro, item_gasto=reforma, valor_unitario=reais('600'))
+    FolhaPagamento.objects.create(
+        instituicao=escolas[1], competencia=dezembro, total_salarios=reais('500'), total_encargos=reais('100'),
+    )
+
+
+class MotorRelatoriosTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        montar_dados(self.rede)
+
+    def test_totais_medem_alunos_pela_media_mensal(self):
+        [totais] = gerar_relatorio(filtros_relatorio())
+        self.assertEqual(totais['total_gastos_operacionais'], reais('1200'))
+        self.assertEqual(totais['total_geral'], reais('1800'))
+        # 30 alunos em dezembro e 90 em janeiro: média de 60, não a soma de 120
+        self.assertEqual(totais['quantidade_alunos'], 60)
+        self.assertEqual(totais['custo_por_aluno'], reais('30'))
+
+    def test_agrupa_por_uf_e_competencia_com_consultas_constantes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            linhas = gerar_relatorio(filtros_relatorio(), ['uf', 'competencia'])
+        # Um GROUP BY por fato (gastos, folha, alunos) nos dados brutos e outro no retrato
+        self.assertEqual(len(consultas), 6)
+
+        por_chave = {(linha['uf'], linha['mes']): linha for linha in linhas}
+        self.assertEqual(list(por_chave), [('RJ', 12), ('RJ', 1), ('SP', 12), ('SP', 1)])
+        self.assertEqual(por_chave[('RJ', 12)]['total_geral'], reais('700'))
+        self.assertEqual(por_chave[('SP', 1)]['total_gastos_operacionais'], reais('800'))
+        self.assertEqual(por_chave[('SP', 1)]['quantidade_alunos'], 60)
+
+    def test_categoria_so_com_medidas_de_gastos(self):
+        linhas = gerar_relatorio(filtros_relatorio(ano=2025), ['categoria'], ['total_gastos_operacionais', 'quantidade_lancamentos'])
+        self.assertEqual(
+            [(linha['categoria'], linha['total_gastos_operacionais'], linha['quantidade_lancamentos']) for linha in linhas],
+            [('01', reais('300'), 3), ('02', reais('600'), 1)],
+        )
+
+
+class RelatoriosApiTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.rede = criar_rede()
+        montar_dados(self.rede)
+        self.client.force_authenticate(self.rede['responsavel'])
+
+    def test_linhas_e_totais_por_dimensao(self):
+        resposta = self.client.post(reverse('relatorios'), {
+            'dimensoes': ['instituicao'], 'medidas': ['total_geral'], 'competencia_id': self.rede['dezembro'].id,
+        }, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([linha['total_geral'] for linha in resposta.data['linhas']], [reais('100'), reais('700'), reais('100')])
+        self.assertEqual(resposta.data['totais'], {'total_geral': reais('900')})
+
+    def test_medida_sem_a_dimensao_pedida_e_rejeitada(self):
+        resposta = self.client.post(reverse('relatorios'), {
+            'dimensoes': ['categoria'], 'medidas': ['total_folha_pagamento'],
+        }, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('medidas', resposta.data)
+
+
+class CacheRelatoriosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.rede = criar_rede()
+        montar_dados(self.rede)
+        self.parametros = {'instituicao_id': None, 'competencia_id': None, 'ano': 2024}
+
+    def consultar(self, escopo='todas'):
+        return relatorio_em_cache(escopo, self.parametros, ['uf'], ['total_geral'], filtros_relatorio(ano=2024))
+
+    def test_segunda_chamada_vem_do_cache(self):
+        primeira = self.consultar()
+        with mock.patch('app_principal.relatorios.gerar_relatorio', wraps=gerar_relatorio) as gerar:
+            self.assertEqual(self.consultar(), primeira)
+            gerar.assert_not_called()
+            # Outro escopo (outro responsável) não compartilha a entrada
+            self.consultar('responsavel:1')
+            gerar.assert_called()
+
+    def test_nova_versao_dos_dados_muda_a_chave(self):
+        self.consultar()
+        LancamentoGasto.objects.create(
+            instituicao=self.rede['instituicoes'][1], competencia=self.rede['dezembro'],
+            item_gasto=self.rede['itens'][1], valor_unitario=reais('50'),
+        )
+        Competencia.registrar_alteracao([self.rede['dezembro'].id])
+
+        rio = self.consultar()['linhas'][0]
+        self.assertEqual((rio['uf'], rio['total_geral']), ('RJ', reais('750')))
+
+    def test_alteracao_de_cadastro_muda_a_chave(self):
+        self.assertEqual([linha['uf'] for linha in self.consultar()['linhas']], ['RJ', 'SP'])
+        uf = UnidadeFederativa.objects.get(sigla='RJ')
+        uf.sigla = 'ES'
+        uf.save()
+        self.assertEqual([linha['uf'] for linha in self.consultar()['linhas']], ['ES', 'SP'])
+
+    def test_so_competencias_fechadas_ficam_sem_prazo(self):
+        with mock.patch('app_principal.relatorios.cache') as cache_mock:
+            cache_mock.get.return_value = None
+            self.consultar()
+            self.assertEqual(cache_mock.set.call_args.args[2], TEMPO_CACHE_RELATORIOS)
+
+            Competencia.objects.filter(ano=2024).update(aberta=False)
+            self.consultar()
+            self.assertIsNone(cache_mock.set.call_args.args[2])
@@ -0,0 +1,60 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..calculos import recalcular_dashboards
+from ..models import CustomUser, LancamentoGasto, DadosAlunos, Instituicao, SerieTemporalCusto
+from .fabricas import criar_rede, reais
+
+
+class SerieTemporalTest(APITestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.escolas = self.rede['instituicoes']
+        for competencia, valores in ((self.rede['dezembro'], ['100', '200', '300']), (self.rede['janeiro'], ['150', '250', '350'])):
+            for escola, valor in zip(self.escolas, valores):
+                DadosAlunos.objects.create(instituicao=escola, competencia=competencia, quantidade_alunos=10)
+                LancamentoGasto.objects.create(
+                    instituicao=escola, competencia=competencia, item_gasto=self.rede['itens'][0], valor_unitario=reais(valor),
+                )
+        recalcular_dashboards()
+        self.client.force_authenticate(self.rede['responsavel'])
+
+    def pontos(self, nivel, **parametros):
+        resposta = self.client.get(reverse('series-temporais', args=[nivel]), parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.data['pontos']
+
+    def test_recalculo_grava_um_ponto_por_nivel_e_periodo(self):
+        rede = SerieTemporalCusto.objects.get(nivel='REDE', periodo=202412)
+        self.assertEqual((rede.quantidade_instituicoes, rede.quantidade_alunos), (3, 30))
+        self.assertEqual(rede.mediana, reais('20'))
+        self.assertEqual(rede.media_ponderada, reais('20'))
+        self.assertEqual(SerieTemporalCusto.objects.filter(nivel='INSTITUICAO', periodo=202501).count(), 3)
+
+    def test_janela_de_meses_e_intervalo(self):
+        self.assertEqual([ponto['periodo'] for ponto in self.pontos('rede')], [202412, 202501])
+        self.assertEqual([ponto['periodo'] for ponto in self.pontos('rede', meses=1)], [202501])
+        self.assertEqual([ponto['periodo'] for ponto in self.pontos('rede', inicio='2024-01', fim='2024-12')], [202412])
+
+        escola = self.escolas[1]
+        [dezembro, janeiro] = self.pontos('instituicao', referencia=escola.id)
+        self.assertEqual((dezembro['mediana'], janeiro['mediana']), ('20.00', '25.00'))
+
+    def test_parametros_invalidos(self):
+        url = reverse('series-temporais', args=['instituicao'])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'referencia': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('series-temporais', args=['rede']), {'fim': '2024-13'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('series-temporais', args=['pais'])).status_code, 404)
+
+    def test_responsavel_so_consulta_as_proprias_referencias(self):
+        outro = CustomUser.objects.create_user(username='outro', password='senha', cargo='RESPONSAVEL')
+        alheia = Instituicao.objects.create(nome='Escola alheia', municipio=self.rede['municipios'][0], responsavel=outro)
+        url = reverse('series-temporais', args=['instituicao'])
+
+        self.assertEqual(self.client.get(url, {'referencia': alheia.id}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'referencia': self.escolas[0].id}).status_code, 200)
+        # O município das próprias escolas pode ser consultado
+        municipio = self.rede['municipios'][0].id
+        self.assertEqual(len(self.pontos('municipio', referencia=municipio)), 2)
@@ -0,0 +1,92 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..models import CustomUser, DadosAlunos, DashboardCustoAluno, Tarefa
+from ..tarefas import EXECUTORES, enfileirar, executar, reservar_proxima
+from .fabricas import criar_rede
+
+
+def executar_reprocessada(tarefa_atual):
+    # Enquanto este worker executava, a tarefa foi dada como abandonada e reservada de novo
+    Tarefa.objects.filter(pk=tarefa_atual.pk).update(data_inicio=timezone.now() + timedelta(seconds=1), worker='outro')
+    return {'ok': True}
+
+
+class FilaTarefasTest(APITestCase):
+
+    def setUp(self):
+        self.rede = criar_rede()
+        self.dezembro = self.rede['dezembro']
+        DadosAlunos.objects.create(instituicao=self.rede['instituicoes'][0], competencia=self.dezembro, quantidade_alunos=10)
+
+    def test_worker_executa_a_tarefa_agendada_pela_api(self):
+        self.client.force_authenticate(self.rede['responsavel'])
+        resposta = self.client.post(reverse('calcular-custo-aluno'), {'competencia_id': self.dezembro.id})
+        self.assertEqual(resposta.status_code, 202)
+        # Pedido repetido antes do worker começar reaproveita a tarefa
+        repetida = self.client.post(reverse('calcular-custo-aluno'), {'competencia_id': self.dezembro.id})
+        self.assertEqual(repetida.data['tarefa_id'], resposta.data['tarefa_id'])
+
+        reservada = reservar_proxima('worker-1')
+        self.assertEqual(reservada.pk, resposta.data['tarefa_id'])
+        self.assertIsNone(reservar_proxima('worker-2'))
+        self.assertTrue(executar(reservada))
+
+        status = self.client.get(reverse('tarefa-status', args=[reservada.pk])).data
+        self.assertEqual(status['status'], 'CONCLUIDA')
+        self.assertEqual(status['progresso'], 100)
+        self.assertEqual(status['resultado'], {'competencias': 1, 'criados': 1, 'atualizados': 0})
+        self.assertTrue(DashboardCustoAluno.objects.filter(competencia=self.dezembro).exists())
+
+    def test_tarefa_abandonada_volta_para_a_fila(self):
+        abandonada = enfileirar('recalcular_dashboards', competencias=[self.dezembro.id])
+        Tarefa.objects.filter(pk=abandonada.pk).update(
+            status='EXECUTANDO', worker='morto', data_inicio=timezone.now() - timedelta(hours=2),
+        )
+        self.assertIsNone(reservar_proxima('worker-1', reprocessar_apos=timedelta(hours=3)))
+
+        reservada = reservar_proxima('worker-1', reprocessar_apos=timedelta(hours=1))
+        self.assertEqual(reservada.pk, abandonada.pk)
+        self.assertEqual(reservada.worker, 'worker-1')
+
+    def test_worker_que_perdeu_a_reserva_nao_grava_o_desfecho(self):
+        with mock.patch.dict(EXECUTORES, teste_reprocessada=executar_reprocessada):
+            enfileirar('teste_reprocessada')
+            reservada = reservar_proxima('worker-1')
+            with self.assertLogs('app_principal.tarefas', 'WARNING'):
+                self.assertFalse(executar(reservada))
+        reservada.refresh_from_db()
+        self.assertEqual(reservada.status, 'EXECUTANDO')
+        self.assertEqual(reservada.worker, 'outro')
+        self.assertIsNone(reservada.resultado)
+
+    def test_erro_fica_registrado_na_tarefa(self):
+        enfileirar('recalcular_dashboards', competencias=[self.dezembro.id])
+        reservada = reservar_proxima('worker-1')
+        Tarefa.objects.filter(pk=reservada.pk).update(tipo='removido')
+        reservada.tipo = 'removido'
+
+        with self.assertLogs('app_principal.tarefas', 'ERROR'):
+            self.assertFalse(executar(reservada))
+        reservada.refresh_from_db()
+        self.assertEqual(reservada.status, 'ERRO')
+        self.assertIn('Tipo de tarefa desconhecido', reservada.erro)
+
+    def test_usuario_so_consulta_as_proprias_tarefas(self):
+        outro = CustomUser.objects.create_user(username='outro', password='senha', cargo='RESPONSAVEL')
+        rh = CustomUser.objects.create_user(username='rh', password='senha', cargo='RH')
+        propria = enfileirar('recalcular_dashboards', usuario=self.rede['responsavel'])
+
+        self.client.force_authenticate(outro)
+        self.assertEqual(self.client.get(reverse('tarefa-status', args=[propria.pk])).status_code, 404)
+        self.client.force_authenticate(rh)
+        self.assertEqual(self.client.get(reverse('tarefa-status', args=[propria.pk])).status_code, 200)
+
+    def test_tipo_desconhecido_nao_entra_na_fila(self):
+        self.assertNotIn('inexistente', EXECUTORES)
+        with self.assertRaises(ValueError):
+            enfileirar('inexistente')
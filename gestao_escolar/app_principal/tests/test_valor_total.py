@@ -0,0 +1,82 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from ..models import LancamentoGasto, LancamentoGastoArquivado, FolhaPagamento
+from .fabricas import criar_rede, reais
+
+
+class RestricoesValorTotalTest(TestCase):
+
+    def setUp(self):
+        self.rede = criar_rede(quantidade_instituicoes=1)
+        self.escola = self.rede['instituicoes'][0]
+
+    def test_save_calcula_o_valor_gravado(self):
+        lancamento = LancamentoGasto.objects.create(
+            instituicao=self.escola, competencia=self.rede['dezembro'], item_gasto=self.rede['itens'][0],
+            valor_unitario=reais('12.30'),
+        )
+        folha = FolhaPagamento.objects.create(
+            instituicao=self.escola, competencia=self.rede['dezembro'],
+            total_salarios=reais('1000.10'), total_encargos=reais('0.20'),
+        )
+        self.assertEqual(LancamentoGasto.objects.get().valor_total, lancamento.valor_unitario)
+        self.assertEqual(FolhaPagamento.objects.get(pk=folha.pk).valor_total, reais('1000.30'))
+
+    def test_update_divergente_e_recusado_pelo_banco(self):
+        LancamentoGasto.objects.create(
+            instituicao=self.escola, competencia=self.rede['dezembro'], item_gasto=self.rede['itens'][0],
+            valor_unitario=reais('10'),
+        )
+        FolhaPagamento.objects.create(
+            instituicao=self.escola, competencia=self.rede['dezembro'], total_salarios=reais('100'), total_encargos=reais('10'),
+        )
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LancamentoGasto.objects.update(valor_unitario=reais('20'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FolhaPagamento.objects.update(total_encargos=reais('11'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LancamentoGastoArquivado.objects.create(
+                id=1, instituicao=self.escola, competencia=self.rede['dezembro'], item_gasto=self.rede['itens'][0],
+                valor_unitario=reais('5'), valor_total=reais('6'),
+            )
+
+        # Atualizações que mantêm os dois campos juntos passam
+        LancamentoGasto.objects.update(valor_unitario=reais('20'), valor_total=reais('20'))
+        self.assertEqual(LancamentoGasto.objects.get().valor_total, reais('20'))
+
+
+class PreenchimentoValorTotalTest(TransactionTestCase):
+    """Migra de volta para antes do campo, grava linhas e confere o preenchimento da 0014"""
+
+    antes = [('app_principal', '0013_indices_consultas')]
+    depois = [('app_principal', '0014_valor_total')]
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_linhas_existentes_recebem_o_valor_calculado(self):
+        rede = criar_rede(quantidade_instituicoes=1)
+        apps = self.migrar(self.antes)
+        instituicao_id, competencia_id = rede['instituicoes'][0].id, rede['dezembro'].id
+        apps.get_model('app_principal', 'LancamentoGasto').objects.create(
+            instituicao_id=instituicao_id, competencia_id=competencia_id, item_gasto_id=rede['itens'][0].id,
+            valor_unitario=reais('7.77'),
+        )
+        apps.get_model('app_principal', 'FolhaPagamento').objects.create(
+            instituicao_id=instituicao_id, competencia_id=competencia_id,
+            total_salarios=reais('0.10'), total_encargos=reais('0.20'),
+        )
+
+        apps = self.migrar(self.depois)
+        self.assertEqual(apps.get_model('app_principal', 'LancamentoGasto').objects.get().valor_total, reais('7.77'))
+        self.assertEqual(apps.get_model('app_principal', 'FolhaPagamento').objects.get().valor_total, reais('0.30'))
@@ -28,6 +28,9 @@ router.register(r'rh/folha-pagamento', views.RHFolhaPagamentoViewSet, basename='
 
 router.register(r'responsavel/combos/(?P<combo_id>\d+)/lancamento', views.ComboLancamentoViewSet, basename='combo-lancamento')
 
+# Auditoria
+router.register(r'anomalias', views.AnomaliaLancamentoViewSet, basename='anomalias')
+
 urlpatterns = [
     # Redireciona raiz para admin
     path('', redirect_to_admin),
@@ -42,7 +45,11 @@ urlpatterns = [
     path('api/solicitar-cadastro/', views.SolicitacaoCadastroView.as_view(), name='solicitar-cadastro'),
     path('api/dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('api/relatorios/', views.RelatoriosView.as_view(), name='relatorios'),
+    path('api/exportar/<str:tipo>/', views.ExportacaoView.as_view(), name='exportar'),
+    path('api/consolidados/<str:nivel>/', views.ConsolidadoView.as_view(), name='consolidados'),
+    path('api/series-temporais/<str:nivel>/', views.SerieTemporalView.as_view(), name='series-temporais'),
     path('api/calcular-custo-aluno/', views.CalcularCustoAlunoView.as_view(), name='calcular-custo-aluno'),
+    path('api/tarefas/<int:tarefa_id>/', views.TarefaStatusView.as_view(), name='tarefa-status'),
     
     # Login do REST Framework
     path('api-auth/', include('rest_framework.urls')),
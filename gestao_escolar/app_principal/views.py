@@ -1,14 +1,29 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, Subquery
 from django.http import JsonResponse
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
 from django.contrib.auth import login, logout
 from .models import *
 from .serializers import *
+from .exportacao import EXPORTACOES, filtros_relatorio, resposta_csv
+from .importacao import ErroArquivo, importar_folha
+from .paginacao import PaginacaoCursor
+from .relatorios import relatorio_em_cache
+from .tarefas import enfileirar
+import hashlib
 import json
 
+# Segundos que uma resposta do dashboard fica em cache. A chave já inclui a
+# versão dos dados; o prazo só limita a vida de entradas órfãs.
+TEMPO_CACHE_DASHBOARD = 60 * 60
+
 # ========== PERMISSÕES PERSONALIZADAS ==========
 class IsResponsavel(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -96,7 +111,8 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
     def create(self, request, combo_id=None):
         """
         POST /api/responsavel/combos/2/lancamento/
-        Cria lançamentos em lote para todos os itens do combo
+        Cria lançamentos em lote para todos os itens do combo.
+        Aceita 'instituicao' (um id) ou 'instituicoes' (lista de ids ou "todas").
         """
         try:
             combo = ComboGasto.objects.get(id=combo_id, ativo=True)
@@ -129,7 +145,9 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
                     'detalhes': {
                         'combo': result['combo'],
                         'competencia': result['competencia'],
-                        'total_itens_processados': result['total_criado']
+                        'total_itens_processados': result['total_criado'],
+                        'instituicoes': result['resumo_instituicoes'],
+                        'itens_fora_do_combo': result['itens_fora_do_combo']
                     },
                     'lancamentos': lancamentos_serializer.data
                 }, status=status.HTTP_201_CREATED)
@@ -175,7 +193,8 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
         return Response({
             'success': True,
             'message': 'Use este payload para criar os lançamentos',
-            'instrucoes': 'Envie um POST com os dados abaixo. Ajuste quantidades e valores conforme necessário.',
+            'instrucoes': 'Envie um POST com os dados abaixo. Ajuste quantidades e valores conforme necessário. '
+                          'Para lançar em várias instituições, troque "instituicao" por "instituicoes": [ids] ou "todas".',
             'combo_info': {
                 'id': combo.id,
                 'nome': combo.nome,
@@ -192,28 +211,64 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
     def list(self, request, combo_id=None):
         """
         GET /api/responsavel/combos/2/lancamento/
-        Lista lançamentos existentes e informações do combo
+        Lista lançamentos existentes, informações do combo e a matriz
+        instituição × item com a situação de cada lançamento
         """
         try:
-            combo = ComboGasto.objects.get(id=combo_id, ativo=True)
+            combo = ComboGasto.objects.select_related('competencia').get(id=combo_id, ativo=True)
             
             # Lançamentos existentes
-            lancamentos = LancamentoGasto.objects.filter(
+            lancamentos = list(LancamentoGasto.objects.filter(
                 combo_origem_id=combo_id,
                 instituicao__responsavel=request.user
-            ).select_related('instituicao', 'competencia', 'item_gasto')
+            ).select_related('instituicao', 'competencia', 'item_gasto__categoria', 'usuario_lancamento', 'combo_origem'))
             
             # Itens do combo
-            itens_combo = combo.itens.select_related('item_gasto', 'item_gasto__categoria').all()
+            itens_combo = list(combo.itens.select_related('item_gasto', 'item_gasto__categoria'))
             
             # Instituições do usuário
-            instituicoes = Instituicao.objects.filter(responsavel=request.user)
+            instituicoes = list(Instituicao.objects.filter(responsavel=request.user).order_by('nome'))
+            
+            # Todos os pares (instituição, item) já lançados na competência, em uma consulta.
+            # Vale qualquer origem: é o que impede um novo lançamento do item.
+            lancados = {
+                (linha['instituicao_id'], linha['item_gasto_id']): linha
+                for linha in LancamentoGasto.objects.filter(
+                    competencia_id=combo.competencia_id,
+                    instituicao__in=instituicoes,
+                    item_gasto_id__in=[item.item_gasto_id for item in itens_combo]
+                ).values('instituicao_id', 'item_gasto_id', 'id', 'valor_unitario', 'combo_origem_id')
+            }
+            
+            matriz = []
+            for instituicao in instituicoes:
+                situacao_itens = []
+                for item in itens_combo:
+                    lancado = lancados.get((instituicao.id, item.item_gasto_id))
+                    situacao_itens.append({
+                        'item_gasto_id': item.item_gasto_id,
+                        'lancado': lancado is not None,
+                        'lancamento_id': lancado['id'] if lancado else None,
+                        'valor_unitario': str(lancado['valor_unitario']) if lancado else None,
+                        'deste_combo': lancado is not None and lancado['combo_origem_id'] == combo.id,
+                    })
+                total_lancados = sum(1 for situacao in situacao_itens if situacao['lancado'])
+                matriz.append({
+                    'instituicao_id': instituicao.id,
+                    'instituicao_nome': instituicao.nome,
+                    'itens': situacao_itens,
+                    'total_lancados': total_lancados,
+                    'total_pendentes': len(itens_combo) - total_lancados,
+                })
             
             # Preparar dados para criação
             itens_para_lancar = []
             for item in itens_combo:
-                # Verificar se já existe lançamento para cada instituição
-                lancamento_existente = lancamentos.filter(item_gasto=item.item_gasto).first()
+                lancados_item = [
+                    lancados[(instituicao.id, item.item_gasto_id)]
+                    for instituicao in instituicoes
+                    if (instituicao.id, item.item_gasto_id) in lancados
+                ]
                 
                 itens_para_lancar.append({
                     'item_gasto_id': item.item_gasto.id,
@@ -223,8 +278,10 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
                     'valor_padrao': str(item.valor_padrao),
                     'quantidade_sugerida': 1,
                     'valor_unitario_sugerido': str(item.valor_padrao),
-                    'ja_lancado': lancamento_existente is not None,
-                    'lancamento_existente_id': lancamento_existente.id if lancamento_existente else None
+                    # Lançado em todas as instituições do usuário
+                    'ja_lancado': bool(instituicoes) and len(lancados_item) == len(instituicoes),
+                    'instituicoes_lancadas': len(lancados_item),
+                    'lancamento_existente_id': lancados_item[0]['id'] if len(instituicoes) == 1 and lancados_item else None
                 })
             
             return Response({
@@ -240,11 +297,12 @@ class ComboLancamentoViewSet(viewsets.ViewSet):
                     for inst in instituicoes
                 ],
                 'itens_do_combo': itens_para_lancar,
+                'matriz': matriz,
                 'lancamentos_existentes': LancamentoGastoSerializer(lancamentos, many=True).data,
                 'estatisticas': {
-                    'total_itens_combo': itens_combo.count(),
-                    'total_lancamentos_existentes': lancamentos.count(),
-                    'total_para_lancar': len([item for item in itens_para_lancar if not item['ja_lancado']])
+                    'total_itens_combo': len(itens_combo),
+                    'total_lancamentos_existentes': len(lancamentos),
+                    'total_para_lancar': sum(linha['total_pendentes'] for linha in matriz)
                 }
             })
             
@@ -261,6 +319,7 @@ class ResponsavelItemGastoViewSet(viewsets.ReadOnlyModelViewSet):
 
 class ResponsavelDadosAlunosViewSet(viewsets.ModelViewSet):
     permission_classes = [IsResponsavel]
+    pagination_class = PaginacaoCursor
     
     def get_serializer_class(self):
         if self.action in ['create', 'update']:
@@ -278,6 +337,7 @@ class ResponsavelDadosAlunosViewSet(viewsets.ModelViewSet):
 # ========== VIEWS PARA RH ==========
 class RHInstituicaoViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsRH]
+    pagination_class = PaginacaoCursor
     queryset = Instituicao.objects.all()
     serializer_class = InstituicaoSerializer
 
@@ -288,6 +348,7 @@ class RHCompetenciaViewSet(viewsets.ReadOnlyModelViewSet):
 
 class RHFolhaPagamentoViewSet(viewsets.ModelViewSet):
     permission_classes = [IsRH]
+    pagination_class = PaginacaoCursor
     
     def get_serializer_class(self):
         if self.action in ['create', 'update']:
@@ -299,95 +360,291 @@ class RHFolhaPagamentoViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(usuario_processamento=self.request.user)
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """
+        POST /api/rh/folha-pagamento/importar/ (multipart, campo 'arquivo')
+        Importa a folha de várias instituições a partir de um CSV com as colunas
+        codigo_inep, competencia (AAAA-MM), total_salarios, total_encargos e observacao
+        """
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo:
+            return Response({'error': "Envie o CSV no campo 'arquivo'"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            relatorio = importar_folha(arquivo, usuario=request.user)
+        except ErroArquivo as erro:
+            return Response({'error': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(relatorio)
+
+# ========== VIEWS PARA AUDITORIA ==========
+class AnomaliaLancamentoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    GET /api/anomalias/?competencia_id=&item_gasto_id=&instituicao_id=&situacao=
+    Lançamentos com valor fora da distribuição do item na competência,
+    gravados pela detecção em lote (manage.py detectar_anomalias)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaginacaoCursor
+    serializer_class = AnomaliaLancamentoSerializer
+
+    def get_queryset(self):
+        anomalias = AnomaliaLancamento.objects.select_related('instituicao', 'item_gasto', 'competencia')
+        if self.request.user.cargo == 'RESPONSAVEL':
+            anomalias = anomalias.filter(instituicao__responsavel=self.request.user)
+        # Filtros inválidos respondem 400 (ValidationError) antes de chegar à consulta
+        parametros = {campo: valor for campo, valor in self.request.query_params.items() if valor}
+        filtros = FiltroAnomaliasSerializer(data=parametros)
+        filtros.is_valid(raise_exception=True)
+        return anomalias.filter(**filtros.validated_data)
 
 # ========== VIEWS PARA DASHBOARD E RELATÓRIOS ==========
 class DashboardView(APIView):
     permission_classes = [IsResponsavelOrRH]
     
     def get(self, request):
+        """
+        GET /api/dashboard/?instituicao_id=&competencia_id=&cursor=&tamanho=&fields=
+        Respostas em cache por escopo do usuário, parâmetros e versão dos dados,
+        com ETag/Last-Modified para o cliente revalidar com 304
+        """
         user = request.user
         instituicao_id = request.query_params.get('instituicao_id')
         competencia_id = request.query_params.get('competencia_id')
         
         # Filtros baseados no usuário
         if user.cargo == 'RESPONSAVEL':
-            instituicoes = Instituicao.objects.filter(responsavel=user)
+            ids_permitidos = list(Instituicao.objects.filter(responsavel=user).values_list('id', flat=True))
+            escopo = 'responsavel:' + ','.join(map(str, sorted(ids_permitidos)))
         else:  # RH
-            instituicoes = Instituicao.objects.all()
+            ids_permitidos = None
+            escopo = 'rh'
         
+        versao, ultima_modificacao = Competencia.versao_geral()
+        parametros = urlencode(sorted(request.query_params.lists()), doseq=True)
+        chave_cache = f'dashboard_api:{escopo}:{parametros}:{versao}'
+        etag = quote_etag(hashlib.md5(chave_cache.encode()).hexdigest())
+        ultima_modificacao = int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+        
+        nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+        if nao_modificado is None:
+            dados = cache.get(chave_cache)
+            if dados is None:
+                dados = self.montar_dashboard(request, ids_permitidos, instituicao_id, competencia_id)
+                cache.set(chave_cache, dados, TEMPO_CACHE_DASHBOARD)
+            resposta = Response(dados)
+        else:
+            resposta = nao_modificado
+        
+        resposta['ETag'] = etag
+        if ultima_modificacao:
+            resposta['Last-Modified'] = http_date(ultima_modificacao)
+        # O cliente guarda a cópia, mas sempre revalida; a resposta depende do usuário
+        patch_cache_control(resposta, private=True, no_cache=True)
+        patch_vary_headers(resposta, ['Cookie', 'Authorization'])
+        return resposta
+    
+    def montar_dashboard(self, request, ids_permitidos, instituicao_id, competencia_id):
+        instituicoes = Instituicao.objects.all()
+        if ids_permitidos is not None:
+            instituicoes = instituicoes.filter(id__in=ids_permitidos)
         if instituicao_id:
             instituicoes = instituicoes.filter(id=instituicao_id)
         
         # Buscar dados do dashboard
-        dashboards = DashboardCustoAluno.objects.filter(
-            instituicao__in=instituicoes
-        )
+        dashboards = DashboardCustoAluno.objects.filter(instituicao__in=instituicoes)
         
         if competencia_id:
             dashboards = dashboards.filter(competencia_id=competencia_id)
         else:
-            # Última competência com dados
-            ultima_competencia = Competencia.objects.filter(
-                dashboardcustoaluno__in=dashboards
-            ).order_by('-ano', '-mes').first()
-            
-            if ultima_competencia:
-                dashboards = dashboards.filter(competencia=ultima_competencia)
+            # Última competência com dados, resolvida na mesma consulta
+            dashboards = dashboards.filter(
+                competencia_id=Subquery(
+                    dashboards.order_by('-competencia__ano', '-competencia__mes').values('competencia_id')[:1]
+                )
+            )
         
-        serializer = DashboardCustoAlunoSerializer(dashboards, many=True)
+        dashboards = dashboards.select_related('instituicao__municipio__uf', 'competencia')
+        paginacao = PaginacaoCursor()
+        pagina = paginacao.paginate_queryset(dashboards, request, view=self)
         
-        return Response({
-            'dashboards': serializer.data,
+        return {
+            'dashboards': DashboardCustoAlunoSerializer(pagina, many=True, context={'request': request}).data,
+            'next': paginacao.get_next_link(),
+            'previous': paginacao.get_previous_link(),
             'total_instituicoes': instituicoes.count(),
-            'periodo_selecionado': dashboards.first().competencia.periodo if dashboards.exists() else 'N/A'
-        })
+            'periodo_selecionado': pagina[0].competencia.periodo if pagina else 'N/A'
+        }
 
 class RelatoriosView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
+        """
+        POST /api/relatorios/ {instituicao_id, competencia_id, ano, dimensoes, medidas}
+        Sem dimensões retorna os totais; com dimensões (instituicao, municipio,
+        uf, tipo, ano, competencia, categoria, item_gasto) retorna uma linha
+        por combinação, com um GROUP BY por tabela envolvida.
+        """
         serializer = RelatorioCustoSerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
             
-            # Calcular totais baseado nos filtros
-            filtros = Q()
+            parametros = {campo: data.get(campo) for campo in ('instituicao_id', 'competencia_id', 'ano')}
+            filtros = filtros_relatorio(**parametros)
+            escopo = 'todas'
+            if request.user.cargo == 'RESPONSAVEL':
+                filtros &= Q(instituicao__responsavel=request.user)
+                escopo = f'responsavel:{request.user.id}'
             
-            if data.get('instituicao_id'):
-                filtros &= Q(instituicao_id=data['instituicao_id'])
-            if data.get('competencia_id'):
-                filtros &= Q(competencia_id=data['competencia_id'])
-            if data.get('ano'):
-                filtros &= Q(competencia__ano=data['ano'])
-            
-            # Gastos operacionais
-            gastos_operacionais = LancamentoGasto.objects.filter(filtros).aggregate(
-                total=Sum('valor_total')
-            )['total'] or 0
-            
-            # Folha de pagamento
-            folha_pagamento = FolhaPagamento.objects.filter(filtros).aggregate(
-                total=Sum('valor_total')
-            )['total'] or 0
-            
-            # Dados de alunos (média)
-            dados_alunos = DadosAlunos.objects.filter(filtros).aggregate(
-                media=Sum('quantidade_alunos') / Count('id')
-            )['media'] or 0
-            
-            total_geral = gastos_operacionais + folha_pagamento
-            custo_por_aluno = total_geral / dados_alunos if dados_alunos > 0 else 0
+            relatorio = relatorio_em_cache(escopo, parametros, data['dimensoes'], data['medidas'], filtros)
+            if not data['dimensoes']:
+                return Response(relatorio['totais'])
             
             return Response({
-                'total_gastos_operacionais': gastos_operacionais,
-                'total_folha_pagamento': folha_pagamento,
-                'total_geral': total_geral,
-                'quantidade_alunos': dados_alunos,
-                'custo_por_aluno': custo_por_aluno
+                'dimensoes': data['dimensoes'],
+                'medidas': data['medidas'],
+                'linhas': relatorio['linhas'],
+                'totais': relatorio['totais'],
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ExportacaoView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, tipo):
+        """
+        GET /api/exportar/<lancamentos|folha|dashboards>/?instituicao_id=&competencia_id=&ano=
+        Exporta em CSV, enviando as linhas à medida que são lidas do banco.
+        Em lançamentos, incluir_arquivados=1 acrescenta os lançamentos arquivados (auditoria).
+        """
+        if tipo not in EXPORTACOES:
+            return Response({'error': 'Tipo inválido. Use lancamentos, folha ou dashboards.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Mesmos filtros do relatório de custos
+        serializer = RelatorioCustoSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        
+        filtros = filtros_relatorio(data.get('instituicao_id'), data.get('competencia_id'), data.get('ano'))
+        if request.user.cargo == 'RESPONSAVEL':
+            filtros &= Q(instituicao__responsavel=request.user)
+        
+        modelo, _ = EXPORTACOES[tipo]
+        adicionais = []
+        if tipo == 'lancamentos' and request.query_params.get('incluir_arquivados') in ('1', 'true'):
+            adicionais.append(LancamentoGastoArquivado.objects.filter(filtros))
+        
+        return resposta_csv(tipo, modelo.objects.filter(filtros), adicionais)
+
+class ConsolidadoView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    # nível -> (modelo, serializer, campo de referência, relações carregadas junto)
+    NIVEIS = {
+        'municipio': (ConsolidadoMunicipio, ConsolidadoMunicipioSerializer, 'municipio_id', ['competencia', 'municipio__uf']),
+        'uf': (ConsolidadoUF, ConsolidadoUFSerializer, 'uf_id', ['competencia', 'uf']),
+        'tipo': (ConsolidadoTipoInstituicao, ConsolidadoTipoInstituicaoSerializer, 'tipo', ['competencia']),
+    }
+    
+    def get(self, request, nivel):
+        """
+        GET /api/consolidados/<municipio|uf|tipo>/?competencia_id=&referencia=
+        Custo por aluno consolidado por município, UF ou tipo de instituição
+        """
+        if nivel not in self.NIVEIS:
+            return Response({'error': 'Nível inválido. Use municipio, uf ou tipo.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        modelo, serializer_class, campo_referencia, relacionados = self.NIVEIS[nivel]
+        consolidados = modelo.objects.select_related(*relacionados)
+        
+        competencia_id = request.query_params.get('competencia_id')
+        if competencia_id:
+            consolidados = consolidados.filter(competencia_id=competencia_id)
+        else:
+            # Última competência com dados consolidados
+            consolidados = consolidados.filter(
+                competencia_id=modelo.objects.order_by('-competencia__ano', '-competencia__mes').values('competencia_id')[:1]
+            )
+        
+        referencia = request.query_params.get('referencia')
+        if referencia:
+            consolidados = consolidados.filter(**{campo_referencia: referencia})
+        
+        return Response({
+            'nivel': nivel,
+            'consolidados': serializer_class(consolidados, many=True).data
+        })
+
+class SerieTemporalView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    NIVEIS = {'rede': 'REDE', 'municipio': 'MUNICIPIO', 'instituicao': 'INSTITUICAO'}
+
+    @staticmethod
+    def _periodo(valor):
+        """Converte 'AAAA-MM' no período numérico da série"""
+        ano, mes = (int(parte) for parte in valor.split('-'))
+        if not 1 <= mes <= 12:
+            raise ValueError(valor)
+        return SerieTemporalCusto.periodo_de(ano, mes)
+
+    def get(self, request, nivel):
+        """
+        GET /api/series-temporais/<rede|municipio|instituicao>/?referencia=&inicio=AAAA-MM&fim=AAAA-MM&meses=24
+        Série mensal do custo por aluno em uma janela de períodos.
+        Sem início/fim, retorna os últimos `meses` (padrão 24) com dados.
+        Responsáveis só consultam as próprias instituições e os seus municípios.
+        """
+        if nivel not in self.NIVEIS:
+            return Response({'error': 'Nível inválido. Use rede, municipio ou instituicao.'}, status=status.HTTP_404_NOT_FOUND)
+
+        referencia = 0
+        if nivel != 'rede':
+            try:
+                referencia = int(request.query_params.get('referencia', ''))
+            except ValueError:
+                return Response({'error': 'referencia é obrigatória para este nível e deve ser inteira'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if request.user.cargo == 'RESPONSAVEL':
+                instituicoes = Instituicao.objects.filter(responsavel=request.user)
+                campo = 'id' if nivel == 'instituicao' else 'municipio_id'
+                if not instituicoes.filter(**{campo: referencia}).exists():
+                    return Response({'error': 'Referência não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+        serie = SerieTemporalCusto.objects.filter(nivel=self.NIVEIS[nivel], referencia_id=referencia)
+
+        try:
+            meses = int(request.query_params.get('meses', 24))
+            inicio = request.query_params.get('inicio')
+            fim = request.query_params.get('fim')
+            fim = self._periodo(fim) if fim else serie.order_by('-periodo').values_list('periodo', flat=True).first()
+            inicio = self._periodo(inicio) if inicio else None
+        except ValueError:
+            return Response({'error': 'Use inicio/fim no formato AAAA-MM e meses inteiro'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if fim is None:
+            return Response({'nivel': nivel, 'referencia': referencia, 'pontos': []})
+
+        if inicio is None:
+            ano, mes = divmod(fim, 100)
+            for _ in range(max(meses, 1) - 1):
+                ano, mes = Competencia.mes_anterior(ano, mes)
+            inicio = SerieTemporalCusto.periodo_de(ano, mes)
+
+        # Leitura de intervalo sobre o índice (nível, referência, período)
+        pontos = serie.filter(periodo__gte=inicio, periodo__lte=fim).order_by('periodo')
+
+        return Response({
+            'nivel': nivel,
+            'referencia': referencia,
+            'pontos': SerieTemporalCustoSerializer(pontos, many=True).data
+        })
+
 # ========== VIEW PARA CÁLCULO AUTOMÁTICO ==========
 class CalcularCustoAlunoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -403,61 +660,38 @@ class CalcularCustoAlunoView(APIView):
         
         try:
             competencia = Competencia.objects.get(id=competencia_id)
-            instituicoes = Instituicao.objects.all()
-            
-            resultados = []
-            
-            for instituicao in instituicoes:
-                # Gastos operacionais da instituição na competência
-                gastos_operacionais = LancamentoGasto.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or 0
-                
-                # Folha de pagamento da instituição na competência
-                folha_pagamento = FolhaPagamento.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).aggregate(total=Sum('valor_total'))['total'] or 0
-                
-                # Dados de alunos da instituição na competência
-                dados_alunos = DadosAlunos.objects.filter(
-                    instituicao=instituicao,
-                    competencia=competencia
-                ).first()
-                
-                if dados_alunos:
-                    quantidade_alunos = dados_alunos.quantidade_alunos
-                    total_geral = gastos_operacionais + folha_pagamento
-                    custo_por_aluno = total_geral / quantidade_alunos if quantidade_alunos > 0 else 0
-                    
-                    # Criar ou atualizar dashboard
-                    dashboard, created = DashboardCustoAluno.objects.update_or_create(
-                        instituicao=instituicao,
-                        competencia=competencia,
-                        defaults={
-                            'total_gastos_operacionais': gastos_operacionais,
-                            'total_folha_pagamento': folha_pagamento,
-                            'quantidade_alunos': quantidade_alunos,
-                            'custo_por_aluno': custo_por_aluno
-                        }
-                    )
-                    
-                    resultados.append({
-                        'instituicao': instituicao.nome,
-                        'competencia': competencia.periodo,
-                        'total_gastos_operacionais': gastos_operacionais,
-                        'total_folha_pagamento': folha_pagamento,
-                        'total_geral': total_geral,
-                        'quantidade_alunos': quantidade_alunos,
-                        'custo_por_aluno': custo_por_aluno,
-                        'status': 'Atualizado' if not created else 'Criado'
-                    })
-            
-            return Response({
-                'message': f'Cálculo concluído para {len(resultados)} instituições',
-                'resultados': resultados
-            })
-            
         except Competencia.DoesNotExist:
-            return Response({'error': 'Competência não encontrada'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'error': 'Competência não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # O cálculo roda no worker (manage.py processar_tarefas), fora da requisição
+        tarefa = enfileirar(
+            'recalcular_dashboards',
+            usuario=request.user,
+            unica=True,
+            competencias=[competencia.id]
+        )
+        
+        return Response({
+            'message': f'Cálculo agendado para a competência {competencia.periodo}',
+            'tarefa_id': tarefa.id,
+            'status_url': reverse('tarefa-status', args=[tarefa.id], request=request)
+        }, status=status.HTTP_202_ACCEPTED)
+
+class TarefaStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, tarefa_id):
+        """
+        GET /api/tarefas/<id>/
+        Consulta status, progresso e resultado de uma tarefa em segundo plano.
+        Cada usuário só vê as próprias tarefas; administradores e RH veem todas.
+        """
+        tarefas = Tarefa.objects.all()
+        if not (request.user.is_staff or request.user.cargo in ['ADMIN', 'RH']):
+            tarefas = tarefas.filter(usuario=request.user)
+        try:
+            tarefa = tarefas.get(id=tarefa_id)
+        except Tarefa.DoesNotExist:
+            return Response({'error': 'Tarefa não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response(TarefaSerializer(tarefa).data)
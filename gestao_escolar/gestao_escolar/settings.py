@@ -63,6 +63,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Espera pelo lock de escrita em vez de falhar quando vários workers gravam ao mesmo tempo
+        "OPTIONS": {"timeout": 20},
     }
 }
 